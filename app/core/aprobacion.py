@@ -0,0 +1,45 @@
+import asyncio
+from contextvars import ContextVar
+from typing import Optional
+
+from langchain_core.runnables.config import run_in_executor
+from langchain_core.tools import StructuredTool
+
+
+class ConsultaRechazada(Exception):
+    """El guardián clasificó la consulta como maliciosa."""
+
+
+# Veredicto del guardián para la petición en curso (True = segura). Lo fija el
+# endpoint antes de lanzar el agente; las tareas que crea el agente lo heredan.
+veredicto_guardian: ContextVar[Optional[asyncio.Future]] = ContextVar("veredicto_guardian", default=None)
+
+async def esperar_aprobacion() -> None:
+    """
+    Bloquea hasta que el guardián apruebe la consulta en curso. Lo llaman las
+    herramientas envueltas con `tras_aprobacion`, las que tienen efectos
+    (alta, edición y baja de clientes) y el guardado del historial. Sin
+    veredicto pendiente (guardián ya resuelto o no aplicable) vuelve enseguida.
+    """
+    veredicto = veredicto_guardian.get()
+    if veredicto is None:
+        return
+    if not await asyncio.shield(veredicto):
+        raise ConsultaRechazada("La consulta fue clasificada como maliciosa.")
+
+
+def tras_aprobacion(herramienta: StructuredTool) -> StructuredTool:
+    """
+    Copia de la herramienta que espera la aprobación del guardián antes de
+    ejecutarse. Conserva nombre, descripción y argumentos, así que para el
+    modelo y para los eventos de streaming es la misma herramienta.
+    """
+    original_async, original_sync = herramienta.coroutine, herramienta.func
+
+    async def ejecutar(*args, **kwargs):
+        await esperar_aprobacion()
+        if original_async is not None:
+            return await original_async(*args, **kwargs)
+        return await run_in_executor(None, original_sync, *args, **kwargs)
+
+    return herramienta.model_copy(update={"coroutine": ejecutar})
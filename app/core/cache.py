@@ -0,0 +1,139 @@
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+
+def normalizar_texto(texto: str) -> str:
+    """Minúsculas, sin tildes, sin signos de puntuación y con espacios colapsados."""
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    texto = re.sub(r"[^\w\s]", " ", texto)
+    return " ".join(texto.split())
+
+
+class CacheLRU:
+    """
+    Cache en memoria acotada por número de entradas, con expulsión LRU,
+    caducidad opcional (ttl en segundos) y persistencia opcional en disco.
+    Con `max_peso` también se acota la suma de `peso(valor)` de las entradas
+    (p. ej. bytes de audio con `peso=len`).
+
+    La persistencia es para caches de vectores (clave de texto -> secuencia
+    de floats de la misma longitud): se guardan como arrays en un `.npz` y se
+    leen con `allow_pickle=False`, así que cargar el archivo nunca ejecuta código.
+    """
+
+    def __init__(
+        self,
+        max_items: int,
+        ttl: Optional[float] = None,
+        ruta: Optional[str] = None,
+        max_peso: Optional[int] = None,
+        peso: Callable[[Any], int] = len,
+    ):
+        self.max_items = max_items
+        self.ttl = ttl
+        self.ruta = ruta
+        self.max_peso = max_peso
+        self.peso = peso
+        self._datos: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._peso_total = 0
+        self._lock = threading.Lock()
+        self.metricas = {"aciertos": 0, "fallos": 0, "expulsiones": 0}
+        if ruta:
+            self.cargar()
+
+    def get(self, clave: Hashable, default=None):
+        with self._lock:
+            entrada = self._datos.get(clave)
+            if entrada is not None and (self.ttl is None or time.monotonic() - entrada[0] <= self.ttl):
+                self._datos.move_to_end(clave)
+                self.metricas["aciertos"] += 1
+                return entrada[1]
+            if entrada is not None:
+                self._quitar(clave)
+                self.metricas["expulsiones"] += 1
+            self.metricas["fallos"] += 1
+            return default
+
+    def set(self, clave: Hashable, valor: Any) -> None:
+        with self._lock:
+            if self.max_peso is not None and self.peso(valor) > self.max_peso:
+                return
+            self._quitar(clave)
+            self._datos[clave] = (time.monotonic(), valor)
+            if self.max_peso is not None:
+                self._peso_total += self.peso(valor)
+            while len(self._datos) > self.max_items or (self.max_peso is not None and self._peso_total > self.max_peso):
+                self._quitar(next(iter(self._datos)))
+                self.metricas["expulsiones"] += 1
+
+    def _quitar(self, clave: Hashable) -> None:
+        entrada = self._datos.pop(clave, None)
+        if entrada is not None and self.max_peso is not None:
+            self._peso_total -= self.peso(entrada[1])
+
+    def pop(self, clave: Hashable) -> None:
+        with self._lock:
+            self._quitar(clave)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._datos.clear()
+            self._peso_total = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._datos)
+
+    def items(self) -> list:
+        """(clave, valor) de las entradas vigentes, sin contarlas como accesos."""
+        ahora = time.monotonic()
+        with self._lock:
+            return [
+                (clave, valor)
+                for clave, (marca, valor) in self._datos.items()
+                if self.ttl is None or ahora - marca <= self.ttl
+            ]
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            estadisticas = {**self.metricas, "entradas": len(self._datos)}
+            if self.max_peso is not None:
+                estadisticas["peso"] = self._peso_total
+            return estadisticas
+
+    def guardar(self) -> None:
+        """Escribe las entradas en `ruta` (no hace nada si no hay ruta)."""
+        if not self.ruta:
+            return
+        with self._lock:
+            # La marca de tiempo monotónica no sirve entre procesos: se guarda solo el valor.
+            claves = [clave for clave in self._datos]
+            valores = [valor for _, valor in self._datos.values()]
+        temporal = f"{self.ruta}.tmp"
+        with open(temporal, "wb") as f:
+            np.savez(f, claves=np.asarray(claves, dtype=str), valores=np.asarray(valores, dtype=np.float32))
+        os.replace(temporal, self.ruta)
+
+    def cargar(self) -> None:
+        if not self.ruta or not os.path.exists(self.ruta):
+            return
+        try:
+            with np.load(self.ruta, allow_pickle=False) as datos:
+                claves = datos["claves"].tolist()
+                valores = datos["valores"].tolist()
+        except Exception as e:
+            log.warning("No se pudo cargar la cache desde %s: %s", self.ruta, e)
+            return
+        for clave, valor in list(zip(claves, valores))[-self.max_items:]:
+            self.set(clave, tuple(valor))
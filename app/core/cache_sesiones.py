@@ -0,0 +1,238 @@
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List
+
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage
+
+from app.core.aprobacion import esperar_aprobacion
+from app.core.cache import CacheLRU
+from app.core.config import (
+    HISTORIAL_VENTANA,
+    SESION_CACHE_MAX,
+    SESION_CACHE_TTL,
+    SESION_FLUSH_INTERVALO,
+)
+from app.core.ejecutores import pool_red
+from app.core.memory import (
+    SupabaseChatMessageHistory,
+    con_id,
+    guardar_mensajes_en_lote,
+    guardar_resumen,
+    leer_resumen,
+)
+from app.core.trazas import tramo
+
+log = logging.getLogger(__name__)
+
+
+class CacheSesiones:
+    """
+    Cache LRU/TTL de historiales delante de Supabase con escritura diferida.
+
+    Las lecturas de una sesión caliente se sirven desde memoria. Los mensajes
+    nuevos se añaden a la cache y a una cola de pendientes que una tarea en
+    segundo plano vuelca a Supabase en un único insert por ciclo. El resumen
+    de los mensajes antiguos de cada sesión se cachea junto a ella.
+    """
+
+    def __init__(
+        self,
+        max_sesiones: int = SESION_CACHE_MAX,
+        ttl: float = SESION_CACHE_TTL,
+        ventana: int = HISTORIAL_VENTANA,
+        intervalo_flush: float = SESION_FLUSH_INTERVALO,
+        client=None,
+    ):
+        self.max_sesiones = max_sesiones
+        self.ttl = ttl
+        self.ventana = ventana
+        self.intervalo_flush = intervalo_flush
+        self.client = client
+
+        self._sesiones: "OrderedDict[str, tuple[float, List[BaseMessage]]]" = OrderedDict()
+        self._pendientes: Dict[str, List[BaseMessage]] = {}
+        self._lock = threading.Lock()
+        # Serializa lecturas de Supabase y volcados para que una carga no
+        # se pierda los mensajes que están en pleno insert.
+        self._lock_flush = threading.Lock()
+        self._tarea_flush = None
+        self._resumenes = CacheLRU(max_sesiones, ttl=ttl)
+        self.metricas = {"aciertos": 0, "fallos": 0, "expulsiones": 0, "flushes": 0, "mensajes_volcados": 0}
+
+    def historial(self, session_id: str) -> "HistorialEnCache":
+        return HistorialEnCache(session_id, self)
+
+    def backend(self, session_id: str) -> SupabaseChatMessageHistory:
+        return SupabaseChatMessageHistory(session_id, ventana=self.ventana, client=self.client)
+
+    def obtener_cacheado(self, session_id: str):
+        """Devuelve los mensajes cacheados de la sesión o None si no están (o caducaron)."""
+        with self._lock:
+            entrada = self._sesiones.get(session_id)
+            if entrada is not None and time.monotonic() - entrada[0] <= self.ttl:
+                self._sesiones.move_to_end(session_id)
+                self.metricas["aciertos"] += 1
+                return list(entrada[1])
+            if entrada is not None:
+                del self._sesiones[session_id]
+                self.metricas["expulsiones"] += 1
+            self.metricas["fallos"] += 1
+            return None
+
+    def cargar(self, session_id: str) -> List[BaseMessage]:
+        """Lee la sesión de Supabase y la guarda en la cache."""
+        with self._lock_flush:
+            mensajes = self.backend(session_id).messages
+            with self._lock:
+                # Lo que aún no se volcó no está en Supabase: se añade al final.
+                mensajes = (mensajes + self._pendientes.get(session_id, []))[-self.ventana:]
+                self._guardar(session_id, mensajes)
+        return list(mensajes)
+
+    def agregar(self, session_id: str, mensajes: List[BaseMessage]) -> None:
+        with self._lock:
+            entrada = self._sesiones.get(session_id)
+            if entrada is not None:
+                self._guardar(session_id, (entrada[1] + mensajes)[-self.ventana:])
+            self._pendientes.setdefault(session_id, []).extend(mensajes)
+
+    def olvidar(self, session_id: str, borrar_backend: bool = False) -> None:
+        """
+        Descarta la sesión de la cache y sus mensajes pendientes; con
+        `borrar_backend`, también sus filas en Supabase. Se hace con el lock de
+        volcado para que un flush en curso no reinserte mensajes después del borrado.
+        """
+        with self._lock_flush:
+            with self._lock:
+                self._sesiones.pop(session_id, None)
+                self._pendientes.pop(session_id, None)
+            self._resumenes.pop(session_id)
+            if borrar_backend:
+                self.backend(session_id).clear()
+
+    def resumen_cacheado(self, session_id: str):
+        return self._resumenes.get(session_id)
+
+    def obtener_resumen(self, session_id: str) -> dict:
+        """
+        {"resumen": texto, "hasta": id del último mensaje resumido, "hasta_fila":
+        id de su fila}; vacío si la sesión no tiene.
+        """
+        estado = self._resumenes.get(session_id)
+        if estado is None:
+            estado = {"resumen": "", "hasta": None, "hasta_fila": None}
+            estado.update(leer_resumen(session_id, client=self.client) or {})
+            self._resumenes.set(session_id, estado)
+        return estado
+
+    def actualizar_resumen(self, session_id: str, resumen: str, hasta: str, hasta_fila: int = None) -> None:
+        guardar_resumen(session_id, resumen, hasta, hasta_fila, client=self.client)
+        self._resumenes.set(session_id, {"resumen": resumen, "hasta": hasta, "hasta_fila": hasta_fila})
+
+    def _guardar(self, session_id: str, mensajes: List[BaseMessage]) -> None:
+        self._sesiones[session_id] = (time.monotonic(), mensajes)
+        self._sesiones.move_to_end(session_id)
+        while len(self._sesiones) > self.max_sesiones:
+            self._sesiones.popitem(last=False)
+            self.metricas["expulsiones"] += 1
+
+    def flush(self) -> int:
+        """Vuelca los mensajes pendientes a Supabase. Devuelve cuántos se escribieron."""
+        with self._lock_flush:
+            with self._lock:
+                pendientes, self._pendientes = self._pendientes, {}
+            if not pendientes:
+                return 0
+
+            try:
+                with tramo("historial", "volcado", sesiones=len(pendientes)):
+                    guardar_mensajes_en_lote(pendientes, client=self.client)
+            except Exception as e:
+                log.warning("Error al volcar el historial a Supabase, se reintentará: %s", e)
+                with self._lock:
+                    for session_id, mensajes in pendientes.items():
+                        self._pendientes[session_id] = mensajes + self._pendientes.get(session_id, [])
+                return 0
+
+        total = sum(len(mensajes) for mensajes in pendientes.values())
+        with self._lock:
+            self.metricas["flushes"] += 1
+            self.metricas["mensajes_volcados"] += total
+        return total
+
+    async def _bucle_flush(self) -> None:
+        while True:
+            await asyncio.sleep(self.intervalo_flush)
+            await asyncio.get_running_loop().run_in_executor(pool_red, self.flush)
+
+    def iniciar(self) -> None:
+        """Arranca la tarea de volcado periódico (llamar dentro del event loop)."""
+        if self._tarea_flush is None:
+            self._tarea_flush = asyncio.create_task(self._bucle_flush())
+
+    async def detener(self) -> None:
+        """Cancela la tarea periódica y vuelca lo pendiente antes de salir."""
+        if self._tarea_flush is not None:
+            self._tarea_flush.cancel()
+            try:
+                await self._tarea_flush
+            except asyncio.CancelledError:
+                pass
+            self._tarea_flush = None
+        await asyncio.get_running_loop().run_in_executor(pool_red, self.flush)
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {
+                **self.metricas,
+                "sesiones": len(self._sesiones),
+                "pendientes": sum(len(m) for m in self._pendientes.values()),
+            }
+
+
+class HistorialEnCache(BaseChatMessageHistory):
+    """Vista de una sesión a través de `CacheSesiones`."""
+
+    def __init__(self, session_id: str, cache: CacheSesiones):
+        self.session_id = session_id
+        self.cache = cache
+
+    @property
+    def messages(self) -> List[BaseMessage]:
+        mensajes = self.cache.obtener_cacheado(self.session_id)
+        if mensajes is None:
+            mensajes = self.cache.cargar(self.session_id)
+        return mensajes
+
+    async def aget_messages(self) -> List[BaseMessage]:
+        with tramo("historial", "carga") as atributos:
+            mensajes = self.cache.obtener_cacheado(self.session_id)
+            atributos["cache"] = mensajes is not None
+            if mensajes is None:
+                mensajes = await pool_red.ejecutar(self.cache.cargar, self.session_id)
+        return mensajes
+
+    async def aobtener_resumen(self) -> dict:
+        estado = self.cache.resumen_cacheado(self.session_id)
+        if estado is None:
+            estado = await pool_red.ejecutar(self.cache.obtener_resumen, self.session_id)
+        return estado
+
+    def add_messages(self, messages: List[BaseMessage]) -> None:
+        self.cache.agregar(self.session_id, [con_id(mensaje) for mensaje in messages])
+
+    async def aadd_messages(self, messages: List[BaseMessage]) -> None:
+        # Con el guardián en paralelo, el turno solo se guarda si la consulta se aprueba.
+        await esperar_aprobacion()
+        with tramo("historial", "guardado"):
+            self.add_messages(messages)
+
+    def clear(self) -> None:
+        self.cache.olvidar(self.session_id, borrar_backend=True)
+
+
+cache_sesiones = CacheSesiones()
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+import random
+from typing import Optional
+
+import httpx
+
+from app.core.config import (
+    CRM_MAX_CONCURRENCIA,
+    CRM_MAX_CONEXIONES,
+    CRM_REINTENTOS,
+    CRM_TIMEOUT,
+)
+
+log = logging.getLogger(__name__)
+
+METODOS_IDEMPOTENTES = {"GET", "HEAD", "PUT", "DELETE"}
+ESTADOS_REINTENTABLES = {502, 503, 504}
+
+
+class ClienteHTTP:
+    """
+    Cliente HTTP asíncrono compartido con pool de conexiones keep-alive.
+
+    Limita las peticiones simultáneas con un semáforo y reintenta con backoff
+    exponencial (y jitter) los métodos idempotentes cuando falla la conexión o
+    el servidor responde 502/503/504. POST nunca se reintenta.
+    """
+
+    def __init__(
+        self,
+        timeout: float = CRM_TIMEOUT,
+        max_conexiones: int = CRM_MAX_CONEXIONES,
+        max_concurrencia: int = CRM_MAX_CONCURRENCIA,
+        reintentos: int = CRM_REINTENTOS,
+        backoff: float = 0.2,
+    ):
+        self.timeout = timeout
+        self.max_conexiones = max_conexiones
+        self.reintentos = reintentos
+        self.backoff = backoff
+        self._semaforo = asyncio.Semaphore(max_concurrencia)
+        self._cliente: Optional[httpx.AsyncClient] = None
+
+    def _obtener_cliente(self) -> httpx.AsyncClient:
+        if self._cliente is None:
+            self._cliente = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.timeout),
+                limits=httpx.Limits(
+                    max_connections=self.max_conexiones,
+                    max_keepalive_connections=self.max_conexiones,
+                ),
+            )
+        return self._cliente
+
+    async def request(self, metodo: str, url: str, **kwargs) -> httpx.Response:
+        metodo = metodo.upper()
+        intentos = 1 + (self.reintentos if metodo in METODOS_IDEMPOTENTES else 0)
+
+        for intento in range(intentos):
+            ultimo = intento == intentos - 1
+            try:
+                async with self._semaforo:
+                    response = await self._obtener_cliente().request(metodo, url, **kwargs)
+                if response.status_code not in ESTADOS_REINTENTABLES or ultimo:
+                    return response
+            except httpx.TransportError:
+                if ultimo:
+                    raise
+            espera = self.backoff * (2 ** intento) * (1 + random.random())
+            log.warning("%s %s falló, reintento %d en %.2fs", metodo, url, intento + 1, espera)
+            await asyncio.sleep(espera)
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    async def put(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("PUT", url, **kwargs)
+
+    async def delete(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("DELETE", url, **kwargs)
+
+    async def cerrar(self) -> None:
+        if self._cliente is not None:
+            await self._cliente.aclose()
+            self._cliente = None
+
+
+cliente_crm = ClienteHTTP()
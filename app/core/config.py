@@ -9,3 +9,106 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 URL_CLIENTS = os.getenv("URL_CLIENTS")
 DATABASE_URL = os.getenv("DATABASE_URL")
+
+HISTORIAL_VENTANA = int(os.getenv("HISTORIAL_VENTANA", "50"))
+HISTORIAL_MAX_TOKENS = int(os.getenv("HISTORIAL_MAX_TOKENS", "2000"))
+HISTORIAL_RESUMEN_MIN_MENSAJES = int(os.getenv("HISTORIAL_RESUMEN_MIN_MENSAJES", "6"))
+HISTORIAL_RESUMEN_MAX_TOKENS = int(os.getenv("HISTORIAL_RESUMEN_MAX_TOKENS", "300"))
+HISTORIAL_RESUMEN_MODELO = os.getenv("HISTORIAL_RESUMEN_MODELO", "gemini-2.5-flash")
+HISTORIAL_TURNOS_RECUPERADOS = int(os.getenv("HISTORIAL_TURNOS_RECUPERADOS", "2"))
+HISTORIAL_MENSAJES_ARCHIVO = int(os.getenv("HISTORIAL_MENSAJES_ARCHIVO", "200"))
+HISTORIAL_SIMILITUD_MINIMA = float(os.getenv("HISTORIAL_SIMILITUD_MINIMA", "0.5"))
+
+SESION_CACHE_MAX = int(os.getenv("SESION_CACHE_MAX", "1000"))
+SESION_CACHE_TTL = float(os.getenv("SESION_CACHE_TTL", "900"))
+SESION_FLUSH_INTERVALO = float(os.getenv("SESION_FLUSH_INTERVALO", "2"))
+
+CACHE_EMBEDDINGS_MAX = int(os.getenv("CACHE_EMBEDDINGS_MAX", "10000"))
+CACHE_EMBEDDINGS_RUTA = os.getenv("CACHE_EMBEDDINGS_RUTA")
+CACHE_BUSQUEDAS_MAX = int(os.getenv("CACHE_BUSQUEDAS_MAX", "2000"))
+CACHE_BUSQUEDAS_TTL = float(os.getenv("CACHE_BUSQUEDAS_TTL", "3600"))
+CACHE_RESPUESTAS = os.getenv("CACHE_RESPUESTAS", "false").lower() == "true"
+CACHE_RESPUESTAS_UMBRAL = float(os.getenv("CACHE_RESPUESTAS_UMBRAL", "0.95"))
+CACHE_RESPUESTAS_MAX = int(os.getenv("CACHE_RESPUESTAS_MAX", "1000"))
+CACHE_RESPUESTAS_TTL = float(os.getenv("CACHE_RESPUESTAS_TTL", "3600"))
+
+INFERENCIA_MAX_LOTE = int(os.getenv("INFERENCIA_MAX_LOTE", "64"))
+INFERENCIA_MAX_ESPERA_MS = float(os.getenv("INFERENCIA_MAX_ESPERA_MS", "5"))
+INFERENCIA_TRABAJADORES = int(os.getenv("INFERENCIA_TRABAJADORES", "1"))
+
+RECUPERADOR = os.getenv("RECUPERADOR", "supabase")
+INDICE_LOCAL_RUTA = os.getenv("INDICE_LOCAL_RUTA", "/code/.cache/indice")
+INDICE_IVF_LISTAS = int(os.getenv("INDICE_IVF_LISTAS", "0"))
+INDICE_IVF_NPROBE = int(os.getenv("INDICE_IVF_NPROBE", "8"))
+INDICE_VERSION_TTL = float(os.getenv("INDICE_VERSION_TTL", "2"))
+DOCUMENTOS_VERSION_TTL = float(os.getenv("DOCUMENTOS_VERSION_TTL", "5"))
+
+SQL_ESQUEMA_TTL = float(os.getenv("SQL_ESQUEMA_TTL", "300"))
+SQL_TIMEOUT_MS = int(os.getenv("SQL_TIMEOUT_MS", "5000"))
+SQL_MAX_FILAS = int(os.getenv("SQL_MAX_FILAS", "200"))
+SQL_COSTE_MAXIMO = float(os.getenv("SQL_COSTE_MAXIMO", "1000000"))
+SQL_TAMANOS_TTL = float(os.getenv("SQL_TAMANOS_TTL", "60"))
+SQL_POOL_TAMANO = int(os.getenv("SQL_POOL_TAMANO", "5"))
+SQL_POOL_EXTRA = int(os.getenv("SQL_POOL_EXTRA", "5"))
+SQL_POOL_ESPERA = float(os.getenv("SQL_POOL_ESPERA", "10"))
+SQL_POOL_RECICLAR = int(os.getenv("SQL_POOL_RECICLAR", "1800"))
+
+CACHE_SQL_MAX = int(os.getenv("CACHE_SQL_MAX", "500"))
+
+CRM_TIMEOUT = float(os.getenv("CRM_TIMEOUT", "10"))
+CRM_MAX_CONEXIONES = int(os.getenv("CRM_MAX_CONEXIONES", "20"))
+CRM_MAX_CONCURRENCIA = int(os.getenv("CRM_MAX_CONCURRENCIA", "10"))
+CRM_REINTENTOS = int(os.getenv("CRM_REINTENTOS", "3"))
+CRM_CACHE_MAX = int(os.getenv("CRM_CACHE_MAX", "1000"))
+CRM_CACHE_TTL = float(os.getenv("CRM_CACHE_TTL", "60"))
+
+GUARDIAN_ESPECULATIVO = os.getenv("GUARDIAN_ESPECULATIVO", "true").lower() == "true"
+PREFILTRO_UMBRAL = float(os.getenv("PREFILTRO_UMBRAL", "0.9"))
+
+TTS_MAX_CONCURRENCIA = int(os.getenv("TTS_MAX_CONCURRENCIA", "4"))
+TTS_MAX_CARACTERES_FRASE = int(os.getenv("TTS_MAX_CARACTERES_FRASE", "300"))
+TTS_CACHE_MAX = int(os.getenv("TTS_CACHE_MAX", "200"))
+TTS_CACHE_MAX_MB = float(os.getenv("TTS_CACHE_MAX_MB", "16"))
+TTS_CACHE_MAX_CARACTERES = int(os.getenv("TTS_CACHE_MAX_CARACTERES", "120"))
+
+MEDIOS_TTL = float(os.getenv("MEDIOS_TTL", "600"))
+MEDIOS_MAX_BYTES = int(os.getenv("MEDIOS_MAX_BYTES", str(200 * 1024 * 1024)))
+MEDIOS_MAX_BYTES_ARCHIVO = int(os.getenv("MEDIOS_MAX_BYTES_ARCHIVO", str(25 * 1024 * 1024)))
+MEDIOS_AUDIO_INLINE_MAX = int(os.getenv("MEDIOS_AUDIO_INLINE_MAX", str(15 * 1024 * 1024)))
+MEDIOS_IMAGEN_UMBRAL_BYTES = int(os.getenv("MEDIOS_IMAGEN_UMBRAL_BYTES", str(1024 * 1024)))
+MEDIOS_IMAGEN_MAX_LADO = int(os.getenv("MEDIOS_IMAGEN_MAX_LADO", "1568"))
+
+EJECUTOR_CPU_TRABAJADORES = int(os.getenv("EJECUTOR_CPU_TRABAJADORES", str(os.cpu_count() or 2)))
+EJECUTOR_CPU_COLA = int(os.getenv("EJECUTOR_CPU_COLA", "64"))
+EJECUTOR_RED_TRABAJADORES = int(os.getenv("EJECUTOR_RED_TRABAJADORES", "32"))
+EJECUTOR_RED_COLA = int(os.getenv("EJECUTOR_RED_COLA", "256"))
+EJECUTOR_DISCO_TRABAJADORES = int(os.getenv("EJECUTOR_DISCO_TRABAJADORES", "4"))
+EJECUTOR_DISCO_COLA = int(os.getenv("EJECUTOR_DISCO_COLA", "64"))
+EJECUTOR_INGESTA_TRABAJADORES = int(os.getenv("EJECUTOR_INGESTA_TRABAJADORES", "2"))
+EJECUTOR_INGESTA_COLA = int(os.getenv("EJECUTOR_INGESTA_COLA", "4"))
+AGENTE_MAX_CONCURRENCIA = int(os.getenv("AGENTE_MAX_CONCURRENCIA", "64"))
+LOTE_MAX_PETICIONES = int(os.getenv("LOTE_MAX_PETICIONES", "500"))
+LOTE_CONCURRENCIA = int(os.getenv("LOTE_CONCURRENCIA", "8"))
+LOTE_GUARDIAN_TAMANO = int(os.getenv("LOTE_GUARDIAN_TAMANO", "25"))
+
+PRECARGAR_RECURSOS = os.getenv("PRECARGAR_RECURSOS", "true").lower() == "true"
+MODELOS_BACKEND = os.getenv("MODELOS_BACKEND", "torch")
+MODELOS_ONNX_RUTA = os.getenv("MODELOS_ONNX_RUTA", "/code/.cache/onnx")
+ONNX_CUANTIZACION = os.getenv("ONNX_CUANTIZACION", "avx2")
+
+INGESTA_TAMANO_FRAGMENTO = int(os.getenv("INGESTA_TAMANO_FRAGMENTO", "1000"))
+INGESTA_SOLAPAMIENTO = int(os.getenv("INGESTA_SOLAPAMIENTO", "150"))
+INGESTA_LOTE_EMBEDDINGS = int(os.getenv("INGESTA_LOTE_EMBEDDINGS", "64"))
+INGESTA_TAMANO_PAGINA = int(os.getenv("INGESTA_TAMANO_PAGINA", "200"))
+
+BUSQUEDA_HIBRIDA = os.getenv("BUSQUEDA_HIBRIDA", "true").lower() == "true"
+BUSQUEDA_CANDIDATOS = int(os.getenv("BUSQUEDA_CANDIDATOS", "10"))
+BUSQUEDA_K_FINAL = int(os.getenv("BUSQUEDA_K_FINAL", "3"))
+BUSQUEDA_RRF_K = int(os.getenv("BUSQUEDA_RRF_K", "60"))
+RERANK_UMBRAL = float(os.getenv("RERANK_UMBRAL", "0.1"))
+RERANK_CACHE_MAX = int(os.getenv("RERANK_CACHE_MAX", "20000"))
+
+LOG_NIVEL = os.getenv("LOG_NIVEL", "INFO").upper()
+PERFILADO_HABILITADO = os.getenv("PERFILADO_HABILITADO", "false").lower() == "true"
+PERFILADO_INTERVALO_MS = float(os.getenv("PERFILADO_INTERVALO_MS", "5"))
+PERFILES_RUTA = os.getenv("PERFILES_RUTA", "/code/.cache/perfiles")
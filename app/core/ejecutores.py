@@ -0,0 +1,167 @@
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, TypeVar
+
+from app.core.config import (
+    EJECUTOR_CPU_COLA,
+    EJECUTOR_CPU_TRABAJADORES,
+    EJECUTOR_DISCO_COLA,
+    EJECUTOR_DISCO_TRABAJADORES,
+    EJECUTOR_INGESTA_COLA,
+    EJECUTOR_INGESTA_TRABAJADORES,
+    EJECUTOR_RED_COLA,
+    EJECUTOR_RED_TRABAJADORES,
+)
+
+T = TypeVar("T")
+
+
+class PoolSaturado(Exception):
+    def __init__(self, nombre: str):
+        super().__init__(f"El pool '{nombre}' está saturado.")
+        self.nombre = nombre
+
+
+def _percentil(valores, p: float) -> float:
+    if not valores:
+        return 0.0
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+class EjecutorAcotado(ThreadPoolExecutor):
+    """
+    Pool de hilos con nombre que mide cuánto espera cada tarea en cola y
+    cuánto tarda en ejecutarse.
+
+    `ejecutar` es la forma de usarlo desde código async: rechaza con
+    `PoolSaturado` cuando ya hay `max_cola` tareas esperando trabajador, en
+    lugar de dejar que la cola crezca sin límite. `submit` (lo que usan
+    `run_in_executor` y LangChain para las herramientas síncronas) nunca
+    rechaza, pero sus tareas cuentan igual para la saturación.
+    """
+
+    def __init__(self, nombre: str, trabajadores: int, max_cola: int):
+        super().__init__(trabajadores, thread_name_prefix=nombre)
+        self.nombre = nombre
+        self.trabajadores = trabajadores
+        self.max_cola = max_cola
+        self._lock = threading.Lock()
+        self._pendientes = 0
+        self._en_curso = 0
+        self._esperas_ms = deque(maxlen=1000)
+        self._ejecuciones_ms = deque(maxlen=1000)
+        self.metricas = {"completadas": 0, "rechazadas": 0, "errores": 0}
+
+    @property
+    def en_cola(self) -> int:
+        return max(0, self._pendientes - self._en_curso)
+
+    @property
+    def saturado(self) -> bool:
+        return self.en_cola >= self.max_cola
+
+    def submit(self, fn: Callable[..., T], /, *args, **kwargs) -> "Future[T]":
+        encolada = time.perf_counter()
+
+        def medir():
+            inicio = time.perf_counter()
+            with self._lock:
+                self._en_curso += 1
+                self._esperas_ms.append((inicio - encolada) * 1000)
+            try:
+                return fn(*args, **kwargs)
+            except BaseException:
+                with self._lock:
+                    self.metricas["errores"] += 1
+                raise
+            finally:
+                with self._lock:
+                    self._en_curso -= 1
+                    self.metricas["completadas"] += 1
+                    self._ejecuciones_ms.append((time.perf_counter() - inicio) * 1000)
+
+        with self._lock:
+            self._pendientes += 1
+        try:
+            futuro = super().submit(medir)
+        except BaseException:
+            self._terminada()
+            raise
+        # También descuenta las tareas canceladas antes de empezar.
+        futuro.add_done_callback(lambda _: self._terminada())
+        return futuro
+
+    def _terminada(self) -> None:
+        with self._lock:
+            self._pendientes -= 1
+
+    async def ejecutar(self, fn: Callable[..., T], *args, **kwargs) -> T:
+        """Como `asyncio.to_thread` (copia el contexto), pero en este pool y con límite de cola."""
+        with self._lock:
+            if self.en_cola >= self.max_cola:
+                self.metricas["rechazadas"] += 1
+                raise PoolSaturado(self.nombre)
+        contexto = contextvars.copy_context()
+        llamada = functools.partial(contexto.run, fn, *args, **kwargs)
+        return await asyncio.get_running_loop().run_in_executor(self, llamada)
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            esperas = list(self._esperas_ms)
+            ejecuciones = list(self._ejecuciones_ms)
+            return {
+                **self.metricas,
+                "trabajadores": self.trabajadores,
+                "en_curso": self._en_curso,
+                "en_cola": self.en_cola,
+                "max_cola": self.max_cola,
+                "espera_ms_p50": _percentil(esperas, 50),
+                "espera_ms_p95": _percentil(esperas, 95),
+                "ejecucion_ms_p50": _percentil(ejecuciones, 50),
+                "ejecucion_ms_p95": _percentil(ejecuciones, 95),
+            }
+
+
+# Trabajo de CPU fuera del planificador de inferencia (prefiltro, imágenes...).
+pool_cpu = EjecutorAcotado("cpu", EJECUTOR_CPU_TRABAJADORES, EJECUTOR_CPU_COLA)
+# Llamadas de red bloqueantes: supabase-py, SQLAlchemy, SDKs síncronos de Gemini.
+# Es también el executor por defecto del loop (ver `instalar_ejecutores`).
+pool_red = EjecutorAcotado("red", EJECUTOR_RED_TRABAJADORES, EJECUTOR_RED_COLA)
+# Lecturas y escrituras de archivos (caches persistidas, índice local).
+pool_disco = EjecutorAcotado("disco", EJECUTOR_DISCO_TRABAJADORES, EJECUTOR_DISCO_COLA)
+
+# Ingestas de /documentos: son largas y bloquean un hilo durante minutos, así
+# que van aparte para no ocupar `pool_red` ni hacer que el chat responda 503.
+pool_ingesta = EjecutorAcotado("ingesta", EJECUTOR_INGESTA_TRABAJADORES, EJECUTOR_INGESTA_COLA)
+
+# Pools que usa el chat; su saturación es la que rechaza peticiones nuevas.
+POOLS_ADMISION = (pool_cpu, pool_red, pool_disco)
+POOLS = (*POOLS_ADMISION, pool_ingesta)
+
+
+def instalar_ejecutores(loop: asyncio.AbstractEventLoop) -> None:
+    """
+    Usa `pool_red` como executor por defecto del loop, que es donde LangChain
+    ejecuta las herramientas síncronas y donde caen los `asyncio.to_thread`.
+    """
+    loop.set_default_executor(pool_red)
+
+
+def pool_saturado():
+    """El primer pool del chat saturado, o None si todos tienen hueco."""
+    return next((pool for pool in POOLS_ADMISION if pool.saturado), None)
+
+
+def estadisticas_pools() -> dict:
+    return {pool.nombre: pool.estadisticas() for pool in POOLS}
+
+
+def cerrar_ejecutores() -> None:
+    for pool in POOLS:
+        pool.shutdown(wait=False, cancel_futures=True)
@@ -1,8 +1,43 @@
-from sentence_transformers import SentenceTransformer
+from app.core.cache import CacheLRU, normalizar_texto
+from app.core.config import CACHE_EMBEDDINGS_MAX, CACHE_EMBEDDINGS_RUTA
+from app.core.inferencia import PlanificadorLotes
+from app.core.modelos import cargar_modelo_embeddings
+from app.core.recursos import recursos
+from app.core.trazas import tramo
 
-model = SentenceTransformer(
-    "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+modelo_embeddings = recursos.registrar("embeddings", cargar_modelo_embeddings)
+
+# Las llamadas concurrentes a encode se agrupan en un solo forward por lote.
+planificador_embeddings = PlanificadorLotes(
+    lambda textos: modelo_embeddings.obtener().encode(textos, batch_size=len(textos)).tolist(),
+    nombre="embeddings",
 )
 
+# Texto normalizado -> embedding. Se puede persistir en disco con CACHE_EMBEDDINGS_RUTA.
+cache_embeddings = CacheLRU(CACHE_EMBEDDINGS_MAX, ruta=CACHE_EMBEDDINGS_RUTA)
+
 def generar_embedding(texto: str) -> list[float]:
-    return model.encode(texto).tolist()
\ No newline at end of file
+    clave = normalizar_texto(texto)
+    vector = cache_embeddings.get(clave)
+    if vector is None:
+        with tramo("embedding"):
+            vector = tuple(planificador_embeddings.enviar(texto).result())
+        cache_embeddings.set(clave, vector)
+    return list(vector)
+
+def generar_embeddings(textos: list[str]) -> list[list[float]]:
+    """Embeddings de varios textos en un solo envío al planificador (sin cache)."""
+    with tramo("embedding", textos=len(textos)):
+        return planificador_embeddings.enviar_muchos(textos).result()
+
+def generar_embeddings_cacheados(textos: list[str]) -> list[list[float]]:
+    """Como `generar_embeddings`, pero solo envía al planificador los que no están en la cache."""
+    claves = [normalizar_texto(texto) for texto in textos]
+    vectores = [cache_embeddings.get(clave) for clave in claves]
+    faltan = [posicion for posicion, vector in enumerate(vectores) if vector is None]
+    if faltan:
+        nuevos = generar_embeddings([textos[posicion] for posicion in faltan])
+        for posicion, vector in zip(faltan, nuevos):
+            vectores[posicion] = tuple(vector)
+            cache_embeddings.set(claves[posicion], vectores[posicion])
+    return [list(vector) for vector in vectores]
@@ -0,0 +1,129 @@
+import json
+import os
+from collections import Counter, defaultdict
+from typing import List, Optional
+
+import numpy as np
+
+from app.core.cache import normalizar_texto
+from app.core.indice_vectorial import archivos_indice, leer_generacion
+
+ARCHIVO_LEXICO = "lexico.npz"
+# Solo en índices escritos antes de guardar el vocabulario dentro de `ARCHIVO_LEXICO`.
+ARCHIVO_VOCABULARIO = "vocabulario.json"
+
+# Parámetros habituales de BM25: saturación de la frecuencia y peso de la longitud.
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenizar(texto: str) -> List[str]:
+    return normalizar_texto(texto).split()
+
+
+class IndiceLexico:
+    """
+    Índice invertido BM25 guardado junto al índice vectorial y sobre los
+    mismos documentos: el `documentos.json` de la generación con la que se
+    construyó, que queda anotada en el propio archivo. Vocabulario, listas y
+    generación van en un solo npz que se publica de un rename, así que un
+    lector nunca mezcla partes de dos construcciones.
+
+    Las listas de cada término están concatenadas en dos arrays (documento y
+    frecuencia) con un array de offsets, así que una consulta solo recorre
+    las listas de sus términos y acumula los puntajes con NumPy.
+    """
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        datos = np.load(os.path.join(ruta, ARCHIVO_LEXICO))
+        if "vocabulario" in datos:
+            vocabulario = datos["vocabulario"].tolist()
+            self.generacion = str(datos["generacion"]) or None
+        else:
+            with open(os.path.join(ruta, ARCHIVO_VOCABULARIO), encoding="utf-8") as f:
+                vocabulario = json.load(f)
+            self.generacion = leer_generacion(ruta)
+        self.vocabulario = {termino: i for i, termino in enumerate(vocabulario)}
+        with open(archivos_indice(ruta, self.generacion)["documentos"], encoding="utf-8") as f:
+            self.documentos = json.load(f)
+        self.offsets = datos["offsets"]
+        self.docs = datos["docs"]
+        self.frecuencias = datos["frecuencias"]
+        longitudes = datos["longitudes"]
+        if len(longitudes) != len(self.documentos):
+            raise ValueError("El índice léxico no corresponde a documentos.json; reconstrúyelo.")
+
+        n = len(longitudes)
+        df = np.diff(self.offsets).astype(np.float32)
+        self.idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        media = float(longitudes.mean()) if n else 1.0
+        # Parte del denominador de BM25 que solo depende del documento.
+        self.normalizacion = (BM25_K1 * (1 - BM25_B + BM25_B * longitudes / (media or 1))).astype(np.float32)
+
+    @classmethod
+    def construir(cls, ruta: str, documentos: List[dict], generacion: Optional[str] = None) -> "IndiceLexico":
+        """
+        Escribe el índice de `documentos` en `ruta`. Deben ser los mismos y en
+        el mismo orden que los del índice vectorial de `generacion` (por
+        defecto, la vigente), que escribe su `documentos.json`.
+        """
+        generacion = generacion or leer_generacion(ruta)
+        listas = defaultdict(list)
+        longitudes = np.zeros(len(documentos), dtype=np.float32)
+        for numero, documento in enumerate(documentos):
+            terminos = tokenizar(documento["texto"])
+            longitudes[numero] = len(terminos)
+            for termino, frecuencia in Counter(terminos).items():
+                listas[termino].append((numero, frecuencia))
+
+        vocabulario = sorted(listas)
+        offsets = np.zeros(len(vocabulario) + 1, dtype=np.int64)
+        docs, frecuencias = [], []
+        for i, termino in enumerate(vocabulario):
+            for numero, frecuencia in listas[termino]:
+                docs.append(numero)
+                frecuencias.append(frecuencia)
+            offsets[i + 1] = len(docs)
+
+        os.makedirs(ruta, exist_ok=True)
+        # El rename publica todo a la vez y su fecha de modificación marca el índice como nuevo.
+        temporal = os.path.join(ruta, f"tmp_{ARCHIVO_LEXICO}")
+        with open(temporal, "wb") as f:
+            np.savez(
+                f,
+                vocabulario=np.asarray(vocabulario, dtype=str),
+                generacion=np.asarray(generacion or ""),
+                offsets=offsets,
+                docs=np.asarray(docs, dtype=np.int32),
+                frecuencias=np.asarray(frecuencias, dtype=np.float32),
+                longitudes=longitudes,
+            )
+        os.replace(temporal, os.path.join(ruta, ARCHIVO_LEXICO))
+        if os.path.exists(os.path.join(ruta, ARCHIVO_VOCABULARIO)):
+            os.remove(os.path.join(ruta, ARCHIVO_VOCABULARIO))
+        return cls(ruta)
+
+    def __len__(self) -> int:
+        return len(self.documentos)
+
+    def buscar(self, consulta: str, top_k: int) -> List[dict]:
+        indices = {self.vocabulario[t] for t in tokenizar(consulta) if t in self.vocabulario}
+        if not indices or not len(self.documentos):
+            return []
+
+        puntajes = np.zeros(len(self.documentos), dtype=np.float32)
+        for i in indices:
+            inicio, fin = self.offsets[i], self.offsets[i + 1]
+            docs = self.docs[inicio:fin]
+            frecuencias = self.frecuencias[inicio:fin]
+            # Cada documento aparece una sola vez por lista, así que `+=` con índices es seguro.
+            puntajes[docs] += self.idf[i] * frecuencias * (BM25_K1 + 1) / (frecuencias + self.normalizacion[docs])
+
+        candidatos = np.flatnonzero(puntajes)
+        k = min(top_k, len(candidatos))
+        if k <= 0:
+            return []
+        mejores = candidatos[np.argpartition(-puntajes[candidatos], k - 1)[:k]]
+        mejores = mejores[np.argsort(-puntajes[mejores])]
+        return [{**self.documentos[int(i)], "bm25": float(puntajes[i])} for i in mejores]
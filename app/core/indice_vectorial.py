@@ -0,0 +1,174 @@
+import glob
+import json
+import os
+import uuid
+from typing import List, Optional
+
+import numpy as np
+
+ARCHIVO_EMBEDDINGS = "embeddings.npy"
+ARCHIVO_DOCUMENTOS = "documentos.json"
+ARCHIVO_IVF = "ivf.npz"
+# Apunta a la generación vigente; se sustituye con un rename atómico al final de cada construcción.
+ARCHIVO_MANIFIESTO = "indice.json"
+
+
+def _nombre(archivo: str, generacion: Optional[str]) -> str:
+    base, extension = os.path.splitext(archivo)
+    return f"{base}-{generacion}{extension}" if generacion else archivo
+
+
+def leer_generacion(ruta: str) -> Optional[str]:
+    """Generación vigente del índice en `ruta`; None si no hay manifiesto (índices anteriores a él)."""
+    try:
+        with open(os.path.join(ruta, ARCHIVO_MANIFIESTO), encoding="utf-8") as f:
+            return json.load(f)["generacion"]
+    except FileNotFoundError:
+        return None
+
+
+def archivos_indice(ruta: str, generacion: Optional[str] = None) -> dict:
+    """Rutas de los archivos de la generación indicada o, por defecto, de la vigente."""
+    generacion = generacion or leer_generacion(ruta)
+    return {
+        clave: os.path.join(ruta, _nombre(archivo, generacion))
+        for clave, archivo in (
+            ("embeddings", ARCHIVO_EMBEDDINGS),
+            ("documentos", ARCHIVO_DOCUMENTOS),
+            ("ivf", ARCHIVO_IVF),
+        )
+    }
+
+
+def normalizar_filas(matriz: np.ndarray) -> np.ndarray:
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    normas[normas == 0] = 1
+    return (matriz / normas).astype(np.float32)
+
+
+def _kmeans_esferico(matriz: np.ndarray, k: int, iteraciones: int = 10, semilla: int = 0):
+    """K-means sobre vectores normalizados usando similitud coseno."""
+    rng = np.random.default_rng(semilla)
+    centroides = matriz[rng.choice(len(matriz), k, replace=False)].copy()
+    for _ in range(iteraciones):
+        asignacion = np.argmax(matriz @ centroides.T, axis=1)
+        for j in range(k):
+            miembros = matriz[asignacion == j]
+            if len(miembros):
+                centroides[j] = miembros.mean(axis=0)
+        centroides = normalizar_filas(centroides)
+    return centroides, np.argmax(matriz @ centroides.T, axis=1)
+
+
+class IndiceVectorial:
+    """
+    Índice local de embeddings normalizados guardado en disco.
+
+    La matriz se abre con memory-map, así varios procesos comparten las mismas
+    páginas y el arranque no copia nada. En modo exacto el top-k es un producto
+    matricial contra toda la matriz; si el índice se construyó con listas IVF,
+    la búsqueda solo recorre las `nprobe` listas más cercanas a la consulta.
+
+    Cada construcción escribe sus archivos con el nombre de una generación
+    nueva y después cambia `indice.json` de un solo rename, así que un lector
+    nunca mezcla archivos de dos construcciones.
+    """
+
+    def __init__(self, ruta: str):
+        self.ruta = ruta
+        self.generacion = leer_generacion(ruta)
+        archivos = archivos_indice(ruta, self.generacion)
+        self.embeddings = np.load(archivos["embeddings"], mmap_mode="r")
+        with open(archivos["documentos"], encoding="utf-8") as f:
+            self.documentos = json.load(f)
+        if len(self.embeddings) != len(self.documentos):
+            raise ValueError(f"El índice de {ruta} está incompleto; reconstrúyelo.")
+
+        self.centroides = None
+        if os.path.exists(archivos["ivf"]):
+            ivf = np.load(archivos["ivf"])
+            self.centroides = ivf["centroides"]
+            self.orden = ivf["orden"]
+            self.offsets = ivf["offsets"]
+
+    @classmethod
+    def construir(
+        cls,
+        ruta: str,
+        embeddings,
+        documentos: List[dict],
+        listas_ivf: int = 0,
+    ) -> "IndiceVectorial":
+        """
+        Escribe un índice nuevo en `ruta`. `documentos` son dicts con `id`,
+        `texto` y `metadatos`, en el mismo orden que `embeddings`.
+        Con `listas_ivf > 0` también se construyen las listas para búsqueda aproximada.
+        """
+        matriz = normalizar_filas(np.asarray(embeddings, dtype=np.float32))
+        if len(matriz) != len(documentos):
+            raise ValueError("El número de embeddings y de documentos no coincide.")
+
+        os.makedirs(ruta, exist_ok=True)
+        anterior = leer_generacion(ruta)
+        generacion = uuid.uuid4().hex[:12]
+        archivos = archivos_indice(ruta, generacion)
+        if listas_ivf and len(matriz) > listas_ivf:
+            centroides, asignacion = _kmeans_esferico(matriz, listas_ivf)
+            orden = np.argsort(asignacion, kind="stable")
+            offsets = np.searchsorted(asignacion[orden], np.arange(listas_ivf + 1))
+            with open(archivos["ivf"], "wb") as f:
+                np.savez(f, centroides=centroides, orden=orden, offsets=offsets)
+        with open(archivos["documentos"], "w", encoding="utf-8") as f:
+            json.dump(documentos, f, ensure_ascii=False)
+        with open(archivos["embeddings"], "wb") as f:
+            np.save(f, matriz)
+
+        temporal = os.path.join(ruta, f"tmp_{ARCHIVO_MANIFIESTO}")
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump({"generacion": generacion, "documentos": len(documentos)}, f)
+        os.replace(temporal, os.path.join(ruta, ARCHIVO_MANIFIESTO))
+
+        # La generación anterior se conserva por si algún lector la está abriendo ahora.
+        cls._borrar_generaciones(ruta, conservar={generacion, anterior})
+        return cls(ruta)
+
+    @staticmethod
+    def _borrar_generaciones(ruta: str, conservar: set) -> None:
+        archivos = (ARCHIVO_EMBEDDINGS, ARCHIVO_DOCUMENTOS, ARCHIVO_IVF)
+        vigentes = {os.path.join(ruta, _nombre(archivo, generacion)) for generacion in conservar for archivo in archivos}
+        for archivo in archivos:
+            base, extension = os.path.splitext(archivo)
+            candidatos = glob.glob(os.path.join(ruta, f"{base}-*{extension}")) + [os.path.join(ruta, archivo)]
+            for candidato in candidatos:
+                if candidato not in vigentes and os.path.exists(candidato):
+                    os.remove(candidato)
+
+    def __len__(self) -> int:
+        return len(self.documentos)
+
+    def buscar(self, vector, top_k: int, nprobe: Optional[int] = None) -> List[dict]:
+        if not len(self.documentos):
+            return []
+        consulta = np.asarray(vector, dtype=np.float32)
+        consulta /= np.linalg.norm(consulta) or 1
+
+        if self.centroides is not None and nprobe:
+            listas = np.argsort(self.centroides @ consulta)[::-1][:nprobe]
+            # Ordenados para leer el memory-map de forma secuencial.
+            candidatos = np.sort(np.concatenate([self.orden[self.offsets[j]:self.offsets[j + 1]] for j in listas]))
+            puntajes = self.embeddings[candidatos] @ consulta
+        else:
+            candidatos = None
+            puntajes = self.embeddings @ consulta
+
+        k = min(top_k, len(puntajes))
+        if k <= 0:
+            return []
+        mejores = np.argpartition(-puntajes, k - 1)[:k]
+        mejores = mejores[np.argsort(-puntajes[mejores])]
+
+        resultados = []
+        for posicion in mejores:
+            indice = int(candidatos[posicion]) if candidatos is not None else int(posicion)
+            resultados.append({**self.documentos[indice], "similitud": float(puntajes[posicion])})
+        return resultados
@@ -0,0 +1,157 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError, ThreadPoolExecutor
+from typing import Any, Callable, List, Sequence
+
+from app.core.config import INFERENCIA_MAX_ESPERA_MS, INFERENCIA_MAX_LOTE, INFERENCIA_TRABAJADORES
+
+log = logging.getLogger(__name__)
+
+
+def _resolver(futuro: Future, resultado: Any = None, error: BaseException = None) -> None:
+    """Fija el resultado o el error del futuro, salvo que ya esté resuelto o lo hayan cancelado."""
+    if futuro.done():
+        return
+    try:
+        if error is not None:
+            futuro.set_exception(error)
+        else:
+            futuro.set_result(resultado)
+    except InvalidStateError:
+        # Cancelado entre la comprobación y la asignación.
+        pass
+
+
+class PlanificadorLotes:
+    """
+    Agrupa llamadas concurrentes a un modelo en lotes.
+
+    Cada llamada deja sus entradas en una cola y recibe un `Future`. Un hilo
+    despachador junta lo que llegue hasta `max_lote` entradas o hasta que pasen
+    `max_espera_ms` desde la primera, y ejecuta `funcion_lote` con todas ellas
+    en un pool dedicado. Mientras los trabajadores están ocupados el
+    despachador no arma lotes nuevos, así las peticiones se acumulan y el
+    siguiente lote sale más lleno.
+    """
+
+    def __init__(
+        self,
+        funcion_lote: Callable[[List[Any]], Sequence[Any]],
+        max_lote: int = INFERENCIA_MAX_LOTE,
+        max_espera_ms: float = INFERENCIA_MAX_ESPERA_MS,
+        trabajadores: int = INFERENCIA_TRABAJADORES,
+        nombre: str = "inferencia",
+    ):
+        self.funcion_lote = funcion_lote
+        self.max_lote = max_lote
+        self.max_espera = max_espera_ms / 1000
+        self.nombre = nombre
+        self._cola: "queue.Queue[tuple[list, Future]]" = queue.Queue()
+        self._libres = threading.Semaphore(trabajadores)
+        self._pool = ThreadPoolExecutor(trabajadores, thread_name_prefix=nombre)
+        self._hilo = None
+        self._lock = threading.Lock()
+        self.metricas = {"lotes": 0, "entradas": 0, "max_lote_visto": 0}
+
+    def enviar_muchos(self, entradas: Sequence[Any]) -> Future:
+        """Encola varias entradas; el `Future` devuelve la lista de salidas en el mismo orden."""
+        futuro = Future()
+        if not entradas:
+            futuro.set_result([])
+            return futuro
+        self._arrancar()
+        self._cola.put((list(entradas), futuro))
+        return futuro
+
+    def enviar(self, entrada: Any) -> Future:
+        """Encola una sola entrada; el `Future` devuelve su salida."""
+        futuro = Future()
+
+        def _desempaquetar(lote: Future):
+            if lote.cancelled():
+                futuro.cancel()
+            elif lote.exception() is not None:
+                _resolver(futuro, error=lote.exception())
+            else:
+                _resolver(futuro, lote.result()[0])
+
+        self.enviar_muchos([entrada]).add_done_callback(_desempaquetar)
+        return futuro
+
+    def estadisticas(self) -> dict:
+        lotes = self.metricas["lotes"]
+        return {
+            **self.metricas,
+            "tamano_medio": self.metricas["entradas"] / lotes if lotes else 0,
+            "en_cola": self._cola.qsize(),
+        }
+
+    def _arrancar(self) -> None:
+        if self._hilo is not None:
+            return
+        with self._lock:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._despachar, name=f"{self.nombre}-despachador", daemon=True)
+                self._hilo.start()
+
+    def _despachar(self) -> None:
+        while True:
+            lote = [self._cola.get()]
+            reservado = False
+            try:
+                self._libres.acquire()
+                reservado = True
+                total = len(lote[0][0])
+                limite = time.monotonic() + self.max_espera
+
+                while total < self.max_lote:
+                    try:
+                        # Lo que ya está en cola entra sin esperar; después, hasta el límite.
+                        pedido = self._cola.get(timeout=max(0.0, limite - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    lote.append(pedido)
+                    total += len(pedido[0])
+
+                self._pool.submit(self._ejecutar, lote)
+            except Exception as e:
+                # Si el hilo muriera, todo `enviar` posterior esperaría para siempre:
+                # se falla este lote y se sigue despachando.
+                log.exception("Error al despachar un lote de '%s'", self.nombre)
+                if reservado:
+                    self._libres.release()
+                for _, futuro in lote:
+                    _resolver(futuro, error=e)
+
+    def _ejecutar(self, lote: List[tuple]) -> None:
+        try:
+            # Lo que se canceló mientras esperaba en cola no llega al modelo.
+            lote = [(entradas, futuro) for entradas, futuro in lote if not futuro.cancelled()]
+            if not lote:
+                return
+            entradas = [entrada for entradas, _ in lote for entrada in entradas]
+            try:
+                salidas = list(self.funcion_lote(entradas))
+                if len(salidas) != len(entradas):
+                    raise ValueError(
+                        f"'{self.nombre}' devolvió {len(salidas)} salidas para {len(entradas)} entradas"
+                    )
+            except Exception as e:
+                for _, futuro in lote:
+                    _resolver(futuro, error=e)
+                return
+
+            with self._lock:
+                self.metricas["lotes"] += 1
+                self.metricas["entradas"] += len(entradas)
+                self.metricas["max_lote_visto"] = max(self.metricas["max_lote_visto"], len(entradas))
+
+            inicio = 0
+            for entradas_pedido, futuro in lote:
+                fin = inicio + len(entradas_pedido)
+                _resolver(futuro, salidas[inicio:fin])
+                inicio = fin
+        finally:
+            self._libres.release()
@@ -0,0 +1,31 @@
+import logging
+
+from app.core.config import LOG_NIVEL
+from app.core.trazas import id_peticion
+
+FORMATO = "%(asctime)s %(levelname)s [%(id_peticion)s] %(name)s: %(message)s"
+
+
+class FiltroIdPeticion(logging.Filter):
+    """Añade a cada registro el id de la petición en curso ("-" fuera de una petición)."""
+
+    def filter(self, registro: logging.LogRecord) -> bool:
+        registro.id_peticion = id_peticion.get()
+        return True
+
+
+def configurar_logs(nivel: str = LOG_NIVEL) -> None:
+    """
+    Logs del paquete `app` con el nivel de LOG_NIVEL. Los mensajes por debajo
+    del nivel se descartan antes de formatearse, y lo que cuesta construir
+    (entradas y salidas de herramientas, tramos) se protege con `isEnabledFor`.
+    """
+    logger = logging.getLogger("app")
+    if any(isinstance(filtro, FiltroIdPeticion) for h in logger.handlers for filtro in h.filters):
+        return
+    manejador = logging.StreamHandler()
+    manejador.setFormatter(logging.Formatter(FORMATO))
+    manejador.addFilter(FiltroIdPeticion())
+    logger.addHandler(manejador)
+    logger.setLevel(nivel)
+    logger.propagate = False
@@ -0,0 +1,209 @@
+import base64
+import binascii
+import io
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Optional
+
+import filetype
+from PIL import Image, ImageOps
+
+from app.core.config import (
+    MEDIOS_IMAGEN_MAX_LADO,
+    MEDIOS_IMAGEN_UMBRAL_BYTES,
+    MEDIOS_MAX_BYTES,
+    MEDIOS_MAX_BYTES_ARCHIVO,
+    MEDIOS_TTL,
+)
+
+log = logging.getLogger(__name__)
+
+
+class MedioDemasiadoGrande(ValueError):
+    pass
+
+
+def _tamano_base64(datos_base64: str) -> int:
+    return len(datos_base64) * 3 // 4 - datos_base64[-2:].count("=")
+
+
+# `filetype` devuelve algunos tipos con nombres que Gemini no acepta.
+MIMES_GEMINI = {
+    "audio/x-wav": "audio/wav",
+    "audio/x-flac": "audio/flac",
+    "audio/x-aiff": "audio/aiff",
+    "audio/mpeg": "audio/mp3",
+}
+
+
+def _detectar_mime(cabecera: bytes, por_defecto: str) -> str:
+    tipo = filetype.guess(cabecera)
+    if tipo is None:
+        return por_defecto
+    return MIMES_GEMINI.get(tipo.mime, tipo.mime)
+
+
+class Medio:
+    """
+    Un adjunto en memoria. Guarda la forma en la que llegó (bytes o base64) y
+    calcula la otra solo si alguien la pide, una única vez.
+    """
+
+    def __init__(self, mime: str, datos: Optional[bytes] = None, datos_base64: Optional[str] = None):
+        self.mime = mime
+        self._datos = datos
+        self._base64 = datos_base64
+        self.tamano = len(datos) if datos is not None else _tamano_base64(datos_base64)
+
+    @property
+    def datos(self) -> bytes:
+        if self._datos is None:
+            self._datos = base64.b64decode(self._base64)
+        return self._datos
+
+    @property
+    def base64(self) -> str:
+        if self._base64 is None:
+            self._base64 = base64.b64encode(self._datos).decode("ascii")
+        return self._base64
+
+    @property
+    def data_url(self) -> str:
+        return f"data:{self.mime};base64,{self.base64}"
+
+
+def reducir_imagen(datos: bytes, max_lado: int = MEDIOS_IMAGEN_MAX_LADO) -> Optional[tuple]:
+    """
+    Reescala la imagen para que su lado mayor no pase de `max_lado` y la
+    recomprime (JPEG, o PNG si tiene transparencia). Devuelve (bytes, mime),
+    o None si el resultado no es más pequeño que el original.
+    """
+    with Image.open(io.BytesIO(datos)) as imagen:
+        escala = min(1.0, max_lado / max(imagen.size))
+        # En JPEG decodifica directamente a 1/2, 1/4 o 1/8 de resolución (escalado en DCT).
+        imagen.draft("RGB", (int(imagen.width * escala), int(imagen.height * escala)))
+        imagen.thumbnail((max_lado, max_lado))
+        imagen = ImageOps.exif_transpose(imagen)
+        salida = io.BytesIO()
+        tiene_alfa = imagen.mode in ("RGBA", "LA") or (imagen.mode == "P" and "transparency" in imagen.info)
+        if tiene_alfa:
+            imagen.save(salida, format="PNG", optimize=True)
+            mime = "image/png"
+        else:
+            imagen.convert("RGB").save(salida, format="JPEG", quality=85, optimize=True)
+            mime = "image/jpeg"
+    reducida = salida.getvalue()
+    if len(reducida) >= len(datos):
+        return None
+    return reducida, mime
+
+
+class AlmacenMedios:
+    """
+    Adjuntos de las peticiones (imágenes y audios) en memoria, identificados
+    por un id opaco que se pasa al agente en lugar de una ruta en disco. Las
+    herramientas resuelven el id directamente, sin escribir ni releer archivos.
+
+    Acotado por tamaño de cada adjunto y por bytes totales (expulsa los más
+    antiguos); las entradas caducan tras `ttl` segundos si nadie las libera.
+    """
+
+    def __init__(
+        self,
+        ttl: float = MEDIOS_TTL,
+        max_bytes: int = MEDIOS_MAX_BYTES,
+        max_bytes_archivo: int = MEDIOS_MAX_BYTES_ARCHIVO,
+    ):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.max_bytes_archivo = max_bytes_archivo
+        self._medios: "OrderedDict[str, tuple[float, Medio]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.metricas = {"guardados": 0, "liberados": 0, "expulsiones": 0, "imagenes_reducidas": 0}
+
+    def _purgar(self) -> None:
+        ahora = time.monotonic()
+        while self._medios:
+            id_medio, (creado, medio) = next(iter(self._medios.items()))
+            if ahora - creado <= self.ttl and self._bytes <= self.max_bytes:
+                break
+            del self._medios[id_medio]
+            self._bytes -= medio.tamano
+            self.metricas["expulsiones"] += 1
+
+    def guardar(self, medio: Medio) -> str:
+        if medio.tamano > self.max_bytes_archivo:
+            raise MedioDemasiadoGrande(
+                f"El adjunto ocupa {medio.tamano} bytes y el máximo es {self.max_bytes_archivo}."
+            )
+        id_medio = f"medio_{uuid.uuid4().hex}"
+        with self._lock:
+            self._medios[id_medio] = (time.monotonic(), medio)
+            self._bytes += medio.tamano
+            self.metricas["guardados"] += 1
+            self._purgar()
+        return id_medio
+
+    def guardar_audio(self, audio_base64: str) -> str:
+        """Decodifica el audio una sola vez; la transcripción necesita los bytes."""
+        if _tamano_base64(audio_base64) > self.max_bytes_archivo:
+            raise MedioDemasiadoGrande(f"El audio supera el máximo de {self.max_bytes_archivo} bytes.")
+        datos = base64.b64decode(audio_base64)
+        return self.guardar(Medio(_detectar_mime(datos[:262], "audio/wav"), datos=datos))
+
+    def guardar_imagen(self, imagen_base64: str) -> str:
+        """
+        Las imágenes pequeñas se guardan tal cual llegan en base64, listas para
+        la herramienta de visión. Las que superan MEDIOS_IMAGEN_UMBRAL_BYTES se
+        reducen y recomprimen antes de guardarlas.
+        """
+        tamano = _tamano_base64(imagen_base64)
+        if tamano > self.max_bytes_archivo:
+            raise MedioDemasiadoGrande(f"La imagen supera el máximo de {self.max_bytes_archivo} bytes.")
+
+        if tamano <= MEDIOS_IMAGEN_UMBRAL_BYTES:
+            try:
+                cabecera = base64.b64decode(imagen_base64[:352])
+            except (binascii.Error, ValueError):
+                cabecera = b""
+            return self.guardar(Medio(_detectar_mime(cabecera, "image/jpeg"), datos_base64=imagen_base64))
+
+        datos = base64.b64decode(imagen_base64)
+        try:
+            reducida = reducir_imagen(datos)
+        except Exception as e:
+            log.warning("No se pudo reducir la imagen, se usa la original: %s", e)
+            reducida = None
+        if reducida is None:
+            return self.guardar(Medio(_detectar_mime(datos[:262], "image/jpeg"), datos=datos))
+
+        datos_reducidos, mime = reducida
+        with self._lock:
+            self.metricas["imagenes_reducidas"] += 1
+        log.debug("Imagen reducida de %d a %d bytes", len(datos), len(datos_reducidos))
+        return self.guardar(Medio(mime, datos=datos_reducidos))
+
+    def obtener(self, id_medio: str) -> Optional[Medio]:
+        with self._lock:
+            self._purgar()
+            entrada = self._medios.get(id_medio.strip())
+        return entrada[1] if entrada is not None else None
+
+    def liberar(self, *ids: str) -> None:
+        with self._lock:
+            for id_medio in ids:
+                entrada = self._medios.pop(id_medio, None)
+                if entrada is not None:
+                    self._bytes -= entrada[1].tamano
+                    self.metricas["liberados"] += 1
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            return {**self.metricas, "medios": len(self._medios), "bytes": self._bytes}
+
+
+almacen_medios = AlmacenMedios()
@@ -1,34 +1,180 @@
+import logging
+import uuid
 from langchain_core.chat_history import BaseChatMessageHistory
 from langchain_core.messages import BaseMessage, messages_from_dict, messages_to_dict
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
+from app.core.config import HISTORIAL_VENTANA
 from app.core.supabase_client import supabase
 
+log = logging.getLogger(__name__)
+
+TABLA_MENSAJES = "mensajes_chat"
+TABLA_HISTORIAL_LEGADO = "historial_chat"
+TABLA_RESUMENES = "resumenes_chat"
+
+def con_id(mensaje: BaseMessage) -> BaseMessage:
+    """Copia del mensaje con un id estable (se guarda dentro del JSON), para poder referenciarlo desde el resumen."""
+    return mensaje if mensaje.id else mensaje.model_copy(update={"id": uuid.uuid4().hex})
+
+def _con_filas(filas: List[dict]) -> List[Tuple[int, BaseMessage]]:
+    mensajes = messages_from_dict([fila["mensaje"] for fila in filas])
+    for mensaje, fila in zip(mensajes, filas):
+        # Mensajes guardados antes de que tuvieran id: se usa el de la fila.
+        if not mensaje.id:
+            mensaje.id = f"fila-{fila['id']}"
+    return [(fila["id"], mensaje) for fila, mensaje in zip(filas, mensajes)]
+
 class SupabaseChatMessageHistory(BaseChatMessageHistory):
-    def __init__(self, session_id: str):
+    """Historial de chat con una fila por mensaje en la tabla `mensajes_chat`.
+
+    Cada turno se guarda con un único insert y la lectura solo trae los
+    últimos `ventana` mensajes, así el coste por turno no crece con la sesión.
+    """
+
+    def __init__(self, session_id: str, ventana: int = HISTORIAL_VENTANA, client=None):
         self.session_id = session_id
+        self.ventana = ventana
+        self.client = client or supabase
 
     @property
     def messages(self) -> List[BaseMessage]:
-        """Retrieve messages from Supabase"""
-        response = supabase.table("historial_chat").select("historial").eq("session_id", self.session_id).execute()
-        if not response.data:
-            return []
+        """Retrieve the last messages of the session from Supabase"""
+        response = (
+            self.client.table(TABLA_MENSAJES)
+            .select("id, mensaje")
+            .eq("session_id", self.session_id)
+            .order("id", desc=True)
+            .limit(self.ventana)
+            .execute()
+        )
+        return [mensaje for _, mensaje in _con_filas(list(reversed(response.data or [])))]
 
-        items = response.data[0].get("historial", [])
-        return messages_from_dict(items)
+    def mensajes_posteriores(self, fila: int, limite: int) -> List[Tuple[int, BaseMessage]]:
+        """Hasta `limite` mensajes guardados después de la fila `fila`, en orden, con el id de su fila."""
+        response = (
+            self.client.table(TABLA_MENSAJES)
+            .select("id, mensaje")
+            .eq("session_id", self.session_id)
+            .gt("id", fila)
+            .order("id")
+            .limit(limite)
+            .execute()
+        )
+        return _con_filas(response.data or [])
+
+    def mensajes_hasta(self, fila: int, limite: int) -> List[Tuple[int, BaseMessage]]:
+        """Los últimos `limite` mensajes hasta la fila `fila` incluida, en orden, con el id de su fila."""
+        response = (
+            self.client.table(TABLA_MENSAJES)
+            .select("id, mensaje")
+            .eq("session_id", self.session_id)
+            .lte("id", fila)
+            .order("id", desc=True)
+            .limit(limite)
+            .execute()
+        )
+        return _con_filas(list(reversed(response.data or [])))
 
     def add_messages(self, messages: List[BaseMessage]) -> None:
-        """Save messages to Supabase"""
-        existing_messages = self.messages
-        updated_history = messages_to_dict(existing_messages + messages)
-
-        supabase.table("historial_chat").upsert({
-             "session_id": self.session_id,
-             "historial": updated_history,
-             "updated_at": "now()"
-         }).execute()
- 
+        """Append messages to Supabase with a single insert"""
+        if not messages:
+            return
+
+        filas = [
+            {"session_id": self.session_id, "mensaje": mensaje}
+            for mensaje in messages_to_dict([con_id(m) for m in messages])
+        ]
+        self.client.table(TABLA_MENSAJES).insert(filas).execute()
+
     def clear(self) -> None:
         """Clear messages from Supabase"""
-        supabase.table("historial_chat").delete().eq("session_id", self.session_id).execute()
\ No newline at end of file
+        self.client.table(TABLA_MENSAJES).delete().eq("session_id", self.session_id).execute()
+        self.client.table(TABLA_RESUMENES).delete().eq("session_id", self.session_id).execute()
+
+
+def guardar_mensajes_en_lote(mensajes_por_sesion: Dict[str, List[BaseMessage]], client=None) -> None:
+    """Inserta los mensajes de varias sesiones en `mensajes_chat` con un solo insert."""
+    filas = [
+        {"session_id": session_id, "mensaje": mensaje}
+        for session_id, mensajes in mensajes_por_sesion.items()
+        for mensaje in messages_to_dict(mensajes)
+    ]
+    if filas:
+        (client or supabase).table(TABLA_MENSAJES).insert(filas).execute()
+
+
+def leer_resumen(session_id: str, client=None) -> Optional[dict]:
+    """
+    Resumen de los mensajes antiguos de la sesión: {"resumen", "hasta",
+    "hasta_fila"} o None si no hay. `hasta_fila` es None en los resúmenes
+    guardados antes de que existiera la columna.
+    """
+    response = (
+        (client or supabase).table(TABLA_RESUMENES)
+        .select("resumen, hasta, hasta_fila")
+        .eq("session_id", session_id)
+        .limit(1)
+        .execute()
+    )
+    return response.data[0] if response.data else None
+
+
+def guardar_resumen(session_id: str, resumen: str, hasta: str, hasta_fila: Optional[int] = None, client=None) -> None:
+    """
+    Sustituye el resumen de la sesión; `hasta` es el id del último mensaje
+    que incluye y `hasta_fila` el id de su fila en `mensajes_chat`.
+    """
+    (client or supabase).table(TABLA_RESUMENES).upsert(
+        {"session_id": session_id, "resumen": resumen, "hasta": hasta, "hasta_fila": hasta_fila}
+    ).execute()
+
+
+def migrar_historial_chat(client=None, tamano_pagina: int = 100) -> int:
+    """
+    Copia los blobs de `historial_chat` a `mensajes_chat`, una fila por mensaje.
+    Las sesiones que ya tienen mensajes en la tabla nueva se omiten, así que se
+    puede ejecutar varias veces sin duplicar nada. Devuelve las sesiones migradas.
+    """
+    client = client or supabase
+    migradas = 0
+    inicio = 0
+
+    while True:
+        response = (
+            client.table(TABLA_HISTORIAL_LEGADO)
+            .select("session_id, historial")
+            .order("session_id")
+            .range(inicio, inicio + tamano_pagina - 1)
+            .execute()
+        )
+        filas = response.data or []
+
+        for fila in filas:
+            session_id = fila["session_id"]
+            historial = fila.get("historial") or []
+            if not historial:
+                continue
+
+            existentes = (
+                client.table(TABLA_MENSAJES)
+                .select("id")
+                .eq("session_id", session_id)
+                .limit(1)
+                .execute()
+            )
+            if existentes.data:
+                log.info("Sesión '%s' ya migrada, se omite", session_id)
+                continue
+
+            client.table(TABLA_MENSAJES).insert(
+                [{"session_id": session_id, "mensaje": mensaje} for mensaje in historial]
+            ).execute()
+            migradas += 1
+            log.info("Sesión '%s' migrada con %d mensajes", session_id, len(historial))
+
+        if len(filas) < tamano_pagina:
+            break
+        inicio += tamano_pagina
+
+    return migradas
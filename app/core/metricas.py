@@ -0,0 +1,152 @@
+import threading
+from bisect import bisect_left
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple
+
+# Cubos en segundos: de una búsqueda en cache a una respuesta larga del agente.
+CUBOS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _etiquetas(nombres: Sequence[str], valores: Sequence, extra: str = "") -> str:
+    pares = [f'{nombre}="{_escapar(valor)}"' for nombre, valor in zip(nombres, valores)]
+    if extra:
+        pares.append(extra)
+    return "{" + ",".join(pares) + "}" if pares else ""
+
+
+def _numero(valor: float) -> str:
+    if valor == float("inf"):
+        return "+Inf"
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+    """Contador monótono con etiquetas, en el formato de texto de Prometheus."""
+
+    tipo = "counter"
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._series: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def incrementar(self, valor: float = 1, **etiquetas) -> None:
+        clave = tuple(etiquetas.get(nombre, "") for nombre in self.etiquetas)
+        with self._lock:
+            self._series[clave] = self._series.get(clave, 0) + valor
+
+    def lineas(self) -> Iterator[str]:
+        with self._lock:
+            series = list(self._series.items())
+        for clave, valor in series:
+            yield f"{self.nombre}{_etiquetas(self.etiquetas, clave)} {_numero(valor)}"
+
+
+class Histograma:
+    """Histograma acumulativo con etiquetas; `observar` es O(log cubos) bajo un lock."""
+
+    tipo = "histogram"
+
+    def __init__(
+        self,
+        nombre: str,
+        ayuda: str,
+        etiquetas: Sequence[str] = (),
+        cubos: Sequence[float] = CUBOS_SEGUNDOS,
+    ):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self.cubos = tuple(cubos)
+        # Por serie: cuentas por cubo (sin acumular, la última es +Inf), suma y total.
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observar(self, valor: float, **etiquetas) -> None:
+        clave = tuple(etiquetas.get(nombre, "") for nombre in self.etiquetas)
+        posicion = bisect_left(self.cubos, valor)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = [[0] * (len(self.cubos) + 1), 0.0, 0]
+            serie[0][posicion] += 1
+            serie[1] += valor
+            serie[2] += 1
+
+    def lineas(self) -> Iterator[str]:
+        with self._lock:
+            series = [(clave, (list(cuentas), suma, total)) for clave, (cuentas, suma, total) in self._series.items()]
+        for clave, (cuentas, suma, total) in series:
+            acumulado = 0
+            for limite, cuenta in zip(self.cubos + (float("inf"),), cuentas):
+                acumulado += cuenta
+                le = f'le="{_numero(limite)}"'
+                yield f"{self.nombre}_bucket{_etiquetas(self.etiquetas, clave, le)} {acumulado}"
+            yield f"{self.nombre}_sum{_etiquetas(self.etiquetas, clave)} {_numero(suma)}"
+            yield f"{self.nombre}_count{_etiquetas(self.etiquetas, clave)} {total}"
+
+
+def _aplanar(datos: dict, prefijo: str = "") -> Iterator[Tuple[str, float]]:
+    for clave, valor in datos.items():
+        nombre = f"{prefijo}_{clave}" if prefijo else str(clave)
+        if isinstance(valor, dict):
+            yield from _aplanar(valor, nombre)
+        elif isinstance(valor, bool):
+            yield nombre, int(valor)
+        elif isinstance(valor, (int, float)):
+            yield nombre, valor
+
+
+class RegistroMetricas:
+    """
+    Métricas propias (contadores e histogramas) más colectores que, al pedir
+    /metrics, convierten las `estadisticas()` que ya exponen pools, caches y
+    planificadores en series `<prefijo>_<campo>{nombre="..."}`.
+    """
+
+    def __init__(self):
+        self._metricas: List = []
+        self._colectores: List[Tuple[str, str, Callable[[], Dict[str, dict]]]] = []
+
+    def contador(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()) -> Contador:
+        metrica = Contador(nombre, ayuda, etiquetas)
+        self._metricas.append(metrica)
+        return metrica
+
+    def histograma(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (), cubos=CUBOS_SEGUNDOS) -> Histograma:
+        metrica = Histograma(nombre, ayuda, etiquetas, cubos)
+        self._metricas.append(metrica)
+        return metrica
+
+    def registrar_colector(self, prefijo: str, ayuda: str, funcion: Callable[[], Dict[str, dict]]) -> None:
+        """`funcion` devuelve {nombre: estadisticas}; cada campo numérico es un gauge."""
+        self._colectores.append((prefijo, ayuda, funcion))
+
+    def exponer(self) -> str:
+        lineas = []
+        for metrica in self._metricas:
+            lineas.append(f"# HELP {metrica.nombre} {metrica.ayuda}")
+            lineas.append(f"# TYPE {metrica.nombre} {metrica.tipo}")
+            lineas.extend(metrica.lineas())
+
+        for prefijo, ayuda, funcion in self._colectores:
+            familias: Dict[str, List[str]] = {}
+            for nombre, estadisticas in funcion().items():
+                for campo, valor in _aplanar(estadisticas):
+                    metrica = f"{prefijo}_{campo}"
+                    familias.setdefault(metrica, []).append(
+                        f"{metrica}{_etiquetas(('nombre',), (nombre,))} {_numero(valor)}"
+                    )
+            for metrica, series in familias.items():
+                lineas.append(f"# HELP {metrica} {ayuda}")
+                lineas.append(f"# TYPE {metrica} gauge")
+                lineas.extend(series)
+        return "\n".join(lineas) + "\n"
+
+
+metricas = RegistroMetricas()
@@ -0,0 +1,41 @@
+import logging
+import os
+
+from app.core.config import MODELOS_BACKEND, MODELOS_ONNX_RUTA, ONNX_CUANTIZACION
+
+log = logging.getLogger(__name__)
+
+# sentence_transformers (y con él torch) se importa dentro de las funciones:
+# es lo más lento de importar y no hace falta hasta cargar los modelos.
+
+MODELO_EMBEDDINGS = "sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2"
+MODELO_RERANK = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+def archivo_onnx() -> str:
+    return f"onnx/model_qint8_{ONNX_CUANTIZACION}.onnx"
+
+
+def ruta_onnx(nombre: str) -> str:
+    return os.path.join(MODELOS_ONNX_RUTA, nombre.replace("/", "__"))
+
+
+def _cargar(clase, nombre: str):
+    if MODELOS_BACKEND == "onnx":
+        ruta = ruta_onnx(nombre)
+        if os.path.exists(os.path.join(ruta, archivo_onnx())):
+            return clase(ruta, backend="onnx", model_kwargs={"file_name": archivo_onnx()})
+        log.warning("No hay versión ONNX de %s en %s; se carga con torch (ver scripts/exportar_onnx.py).", nombre, ruta)
+    return clase(nombre)
+
+
+def cargar_modelo_embeddings():
+    from sentence_transformers import SentenceTransformer
+
+    return _cargar(SentenceTransformer, MODELO_EMBEDDINGS)
+
+
+def cargar_modelo_rerank():
+    from sentence_transformers.cross_encoder import CrossEncoder
+
+    return _cargar(CrossEncoder, MODELO_RERANK)
@@ -0,0 +1,67 @@
+import logging
+import os
+import sys
+import threading
+from collections import Counter
+
+from app.core.config import PERFILADO_INTERVALO_MS, PERFILES_RUTA
+
+log = logging.getLogger(__name__)
+
+
+def _marco(frame) -> str:
+    codigo = frame.f_code
+    return f"{codigo.co_name} ({os.path.basename(codigo.co_filename)}:{codigo.co_firstlineno})"
+
+
+class Perfilador:
+    """
+    Perfilador por muestreo: cada `intervalo_ms` un hilo aparte toma la pila
+    de todos los hilos del proceso (`sys._current_frames`), así que el código
+    perfilado no paga nada por función. Al detenerse escribe las pilas en
+    formato "collapsed" (una línea `hilo;marco;...;marco cuenta`), que leen
+    flamegraph.pl y speedscope.
+
+    Muestrea el proceso entero mientras dura la petición: si hay otras en
+    curso, también aparecen.
+    """
+
+    def __init__(self, nombre: str, intervalo_ms: float = PERFILADO_INTERVALO_MS, ruta: str = PERFILES_RUTA):
+        self.nombre = nombre
+        self.intervalo = intervalo_ms / 1000
+        self.ruta = os.path.join(ruta, f"{nombre}.txt")
+        self.pilas: Counter = Counter()
+        self.muestras = 0
+        self._parar = threading.Event()
+        self._hilo = threading.Thread(target=self._muestrear, name=f"perfilador-{nombre}", daemon=True)
+
+    def iniciar(self) -> None:
+        self._hilo.start()
+
+    def _muestrear(self) -> None:
+        propio = threading.get_ident()
+        while not self._parar.wait(self.intervalo):
+            nombres = {hilo.ident: hilo.name for hilo in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == propio:
+                    continue
+                marcos = []
+                while frame is not None:
+                    marcos.append(_marco(frame))
+                    frame = frame.f_back
+                marcos.append(nombres.get(ident, str(ident)))
+                self.pilas[";".join(reversed(marcos))] += 1
+            self.muestras += 1
+
+    def detener(self) -> None:
+        self._parar.set()
+        self._hilo.join()
+        try:
+            os.makedirs(os.path.dirname(self.ruta), exist_ok=True)
+            with open(self.ruta, "w", encoding="utf-8") as f:
+                for pila, cuenta in self.pilas.most_common():
+                    f.write(f"{pila} {cuenta}\n")
+        except OSError as e:
+            log.warning("No se pudo guardar el perfil en %s: %s", self.ruta, e)
+            return
+        log.info("Perfil de %d muestras guardado en %s", self.muestras, self.ruta)
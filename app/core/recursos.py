@@ -0,0 +1,117 @@
+import asyncio
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Generic, Optional, TypeVar
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class Recurso(Generic[T]):
+    """
+    Un recurso caro (modelo, cliente, conexión) que se construye la primera
+    vez que se pide, una sola vez aunque lo pidan varios hilos a la vez.
+
+    Si la construcción falla, el error queda registrado y se vuelve a intentar
+    en la siguiente petición: una caída de la base de datos no impide
+    arrancar, solo deja el recurso sin cargar hasta que vuelva.
+    """
+
+    def __init__(self, nombre: str, fabrica: Callable[[], T], critico: bool = True):
+        self.nombre = nombre
+        self.fabrica = fabrica
+        self.critico = critico
+        self._valor: Optional[T] = None
+        self._cargado = False
+        self._lock = threading.Lock()
+        self.error: Optional[str] = None
+        self.segundos_carga: Optional[float] = None
+
+    @property
+    def cargado(self) -> bool:
+        return self._cargado
+
+    def obtener(self) -> T:
+        if self._cargado:
+            return self._valor
+        with self._lock:
+            if not self._cargado:
+                inicio = time.perf_counter()
+                try:
+                    self._valor = self.fabrica()
+                except Exception as e:
+                    self.error = f"{type(e).__name__}: {e}"
+                    raise
+                self.segundos_carga = time.perf_counter() - inicio
+                self.error = None
+                self._cargado = True
+                log.info("Recurso '%s' cargado en %.2fs", self.nombre, self.segundos_carga)
+        return self._valor
+
+    def estado(self) -> dict:
+        return {
+            "cargado": self._cargado,
+            "critico": self.critico,
+            "segundos_carga": self.segundos_carga,
+            "error": self.error,
+        }
+
+
+class Perezoso:
+    """
+    Se comporta como el objeto del recurso y lo carga al primer acceso a un
+    atributo, para que los módulos puedan seguir exponiendo `supabase`, `db`...
+    sin construirlos al importarse.
+    """
+
+    def __init__(self, recurso: Recurso):
+        object.__setattr__(self, "_recurso", recurso)
+
+    def __getattr__(self, nombre: str) -> Any:
+        return getattr(self._recurso.obtener(), nombre)
+
+    def __setattr__(self, nombre: str, valor: Any) -> None:
+        setattr(self._recurso.obtener(), nombre, valor)
+
+    def __repr__(self) -> str:
+        estado = "cargado" if self._recurso.cargado else "sin cargar"
+        return f"<Perezoso {self._recurso.nombre} ({estado})>"
+
+
+class RegistroRecursos:
+    """Registro de los recursos de la aplicación, para precargarlos al arrancar y para la sonda de readiness."""
+
+    def __init__(self):
+        self._recursos: Dict[str, Recurso] = {}
+
+    def registrar(self, nombre: str, fabrica: Callable[[], T], critico: bool = True) -> Recurso[T]:
+        recurso = Recurso(nombre, fabrica, critico)
+        self._recursos[nombre] = recurso
+        return recurso
+
+    def __getitem__(self, nombre: str) -> Recurso:
+        return self._recursos[nombre]
+
+    async def calentar(self, executor=None) -> None:
+        """Carga en paralelo, en hilos, los recursos que aún no estén cargados. Los fallos solo se registran."""
+        loop = asyncio.get_running_loop()
+
+        async def cargar(recurso: Recurso):
+            try:
+                await loop.run_in_executor(executor, recurso.obtener)
+            except Exception as e:
+                log.warning("No se pudo cargar el recurso '%s': %s", recurso.nombre, e)
+
+        await asyncio.gather(*(cargar(r) for r in self._recursos.values() if not r.cargado))
+
+    @property
+    def listo(self) -> bool:
+        return all(r.cargado for r in self._recursos.values() if r.critico)
+
+    def estado(self) -> dict:
+        return {nombre: recurso.estado() for nombre, recurso in self._recursos.items()}
+
+
+recursos = RegistroRecursos()
@@ -1,4 +1,339 @@
+import hashlib
+import json
+import logging
+import math
+import re
+import threading
+import time
+
 from langchain_community.utilities import SQLDatabase
-from app.core.config import DATABASE_URL
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy.exc import DBAPIError, SQLAlchemyError
+
+from app.core.config import (
+    DATABASE_URL,
+    SQL_COSTE_MAXIMO,
+    SQL_MAX_FILAS,
+    SQL_POOL_ESPERA,
+    SQL_POOL_EXTRA,
+    SQL_POOL_RECICLAR,
+    SQL_POOL_TAMANO,
+    SQL_TAMANOS_TTL,
+    SQL_TIMEOUT_MS,
+)
+from app.core.recursos import Perezoso, recursos
+from app.core.trazas import tramo
+
+log = logging.getLogger(__name__)
+
+# Un solo engine (y su pool de conexiones) para todas las instancias de SQLDatabase.
+# pool_pre_ping descarta las conexiones que Postgres (o el pooler de Supabase) cerró por inactividad.
+engine = create_engine(
+    DATABASE_URL,
+    pool_size=SQL_POOL_TAMANO,
+    max_overflow=SQL_POOL_EXTRA,
+    pool_timeout=SQL_POOL_ESPERA,
+    pool_recycle=SQL_POOL_RECICLAR,
+    pool_pre_ping=True,
+)
+
+metricas_sql = {
+    "consultas": 0,
+    "rechazadas": 0,
+    "coste_excedido": 0,
+    "tiempo_excedido": 0,
+    "truncadas": 0,
+    "errores": 0,
+    "conexiones_abiertas": 0,
+}
+_lock_metricas = threading.Lock()
+
+
+def _contar(clave: str) -> None:
+    with _lock_metricas:
+        metricas_sql[clave] += 1
+
+
+@event.listens_for(engine, "connect")
+def _al_conectar(conexion_dbapi, registro) -> None:
+    _contar("conexiones_abiertas")
+
+
+def estadisticas_sql() -> dict:
+    """Contadores de la capa de ejecución y ocupación del pool de conexiones."""
+    pool = engine.pool
+    with _lock_metricas:
+        estadisticas = dict(metricas_sql)
+    if hasattr(pool, "checkedout"):
+        estadisticas.update(
+            pool_tamano=pool.size(),
+            pool_en_uso=pool.checkedout(),
+            pool_libres=pool.checkedin(),
+            pool_desbordadas=max(0, pool.overflow()),
+        )
+    return estadisticas
+
+
+class ConsultaSQLRechazada(SQLAlchemyError):
+    """
+    La consulta no es de solo lectura, es demasiado cara o tardó más de lo
+    permitido. Hereda de SQLAlchemyError para que `run_no_throw` la devuelva
+    al agente SQL como "Error: ..." y pueda reescribir la consulta.
+    """
+
+
+COMENTARIOS_INICIALES = re.compile(r"^\s*(?:--[^\n]*\n|/\*.*?\*/|\s)*", re.DOTALL)
+LITERALES = re.compile(r"'(?:[^']|'')*'")
+# `FROM ventas v`, `JOIN clientes AS c`, `, productos p`: alias -> tabla, para leer el plan de SQLite.
+TABLAS_CON_ALIAS = re.compile(
+    r"(?:\bfrom|\bjoin|,)\s+\"?(\w+)\"?(?:\s+(?:as\s+)?(?!(?:on|from|where|join|inner|left|right|full|cross|group|order|limit|using|natural)\b)(\w+))?",
+    re.IGNORECASE,
+)
+
+
+def validar_solo_lectura(sql: str) -> str:
+    """
+    Devuelve la consulta sin comentarios iniciales ni `;` final si es una sola
+    sentencia SELECT/WITH; si no, lanza ConsultaSQLRechazada. Es una primera
+    barrera: la transacción de solo lectura impide escribir aunque algo pase.
+    """
+    sql = COMENTARIOS_INICIALES.sub("", sql).strip().rstrip(";").strip()
+    if not re.match(r"(select|with)\b", sql, flags=re.IGNORECASE):
+        raise ConsultaSQLRechazada("Solo se permiten consultas de lectura (SELECT o WITH).")
+    if ";" in LITERALES.sub("", sql):
+        raise ConsultaSQLRechazada("Solo se permite una sentencia por consulta.")
+    return sql
+
+
+class SQLDatabaseAcotada(SQLDatabase):
+    """
+    SQLDatabase que ejecuta la SQL generada por el agente con límites:
+
+    - solo una sentencia SELECT/WITH, en una transacción de solo lectura;
+    - `timeout_ms` por sentencia (statement_timeout en Postgres, un
+      progress handler en SQLite);
+    - como mucho `max_filas` filas: la consulta se envuelve en un LIMIT y el
+      resultado avisa al modelo de que está truncado;
+    - antes de ejecutarla, su coste estimado con EXPLAIN no puede superar
+      `coste_maximo` (unidades del planificador de Postgres; en SQLite, filas
+      recorridas según EXPLAIN QUERY PLAN y el tamaño de cada tabla).
+
+    `timeout_ms` o `coste_maximo` a 0 desactivan ese límite. En otros motores
+    solo se aplican la validación y el límite de filas.
+    """
+
+    def __init__(
+        self,
+        engine,
+        max_filas: int = SQL_MAX_FILAS,
+        timeout_ms: int = SQL_TIMEOUT_MS,
+        coste_maximo: float = SQL_COSTE_MAXIMO,
+        ttl_tamanos: float = SQL_TAMANOS_TTL,
+        **kwargs,
+    ):
+        super().__init__(engine, **kwargs)
+        self.max_filas = max_filas
+        self.timeout_ms = timeout_ms
+        self.coste_maximo = coste_maximo
+        self.ttl_tamanos = ttl_tamanos
+        # Tabla -> (caducidad, filas). Para estimar el coste basta un tamaño aproximado.
+        self._tamanos = {}
+        self._lock_tamanos = threading.Lock()
+        # `run` necesita saber si el `_execute` de su mismo hilo truncó el resultado.
+        self._local = threading.local()
+
+    def run(self, command, fetch="all", include_columns=False, **kwargs):
+        self._local.truncado = False
+        resultado = super().run(command, fetch, include_columns, **kwargs)
+        if self._local.truncado and isinstance(resultado, str):
+            resultado += (
+                f"\n(Resultado truncado: se muestran las primeras {self.max_filas} filas. "
+                "Usa filtros, agregaciones o un LIMIT para obtener una respuesta completa.)"
+            )
+        return resultado
+
+    def _execute(self, command, fetch="all", *, parameters=None, execution_options=None):
+        if not isinstance(command, str):
+            raise ConsultaSQLRechazada("Solo se ejecuta SQL en texto.")
+        if fetch not in ("all", "one"):
+            raise ValueError("SQLDatabaseAcotada solo admite fetch='all' o 'one'.")
+        _contar("consultas")
+        try:
+            sql = validar_solo_lectura(command)
+        except ConsultaSQLRechazada:
+            _contar("rechazadas")
+            raise
+        # El salto de línea evita que un comentario `--` final se coma el paréntesis.
+        acotada = f"SELECT * FROM ({sql}\n) AS consulta_acotada LIMIT {self.max_filas + 1}"
+
+        with tramo("sql") as atributos, self._engine.connect() as conexion:
+            with conexion.begin():
+                restaurar = self._preparar(conexion)
+                inicio = time.monotonic()
+                try:
+                    self._comprobar_coste(conexion, sql, acotada, parameters or {}, atributos)
+                    filas = conexion.execute(text(acotada), parameters or {}, execution_options=execution_options or {})
+                    filas = [fila._asdict() for fila in filas.fetchmany(self.max_filas + 1)]
+                except DBAPIError as e:
+                    if self.timeout_ms and (
+                        getattr(e.orig, "pgcode", None) == "57014" or "interrupted" in str(e.orig)
+                    ):
+                        _contar("tiempo_excedido")
+                        raise ConsultaSQLRechazada(
+                            f"La consulta superó el tiempo máximo de {self.timeout_ms} ms. "
+                            "Simplifícala o añade filtros."
+                        ) from None
+                    _contar("errores")
+                    raise
+                finally:
+                    restaurar()
+                atributos.update(filas=len(filas), ms=round((time.monotonic() - inicio) * 1000))
+
+        if len(filas) > self.max_filas:
+            filas = filas[:self.max_filas]
+            self._local.truncado = True
+            _contar("truncadas")
+        return filas[:1] if fetch == "one" else filas
+
+    def _preparar(self, conexion):
+        """Solo lectura y tiempo máximo para la transacción; devuelve cómo deshacerlo en la conexión."""
+        if self.dialect == "postgresql":
+            conexion.exec_driver_sql("SET TRANSACTION READ ONLY")
+            if self.timeout_ms:
+                conexion.exec_driver_sql(f"SET LOCAL statement_timeout = {int(self.timeout_ms)}")
+            # SET LOCAL y el modo de la transacción terminan con ella.
+            return lambda: None
+
+        if self.dialect == "sqlite":
+            nativa = conexion.connection.dbapi_connection
+            conexion.exec_driver_sql("PRAGMA query_only = ON")
+            if self.timeout_ms:
+                limite = time.monotonic() + self.timeout_ms / 1000
+                nativa.set_progress_handler(lambda: time.monotonic() > limite, 10_000)
+
+            def restaurar():
+                nativa.set_progress_handler(None, 0)
+                nativa.execute("PRAGMA query_only = OFF")
+
+            return restaurar
+
+        return lambda: None
+
+    def _comprobar_coste(self, conexion, sql: str, acotada: str, parametros: dict, atributos: dict) -> None:
+        if not self.coste_maximo:
+            return
+        if self.dialect == "postgresql":
+            plan = conexion.execute(text(f"EXPLAIN (FORMAT JSON) {acotada}"), parametros).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            coste = plan[0]["Plan"]["Total Cost"]
+        elif self.dialect == "sqlite":
+            coste = self._coste_sqlite(conexion, sql, parametros)
+        else:
+            return
+        atributos["coste"] = round(coste)
+        if coste > self.coste_maximo:
+            _contar("coste_excedido")
+            log.warning("Consulta SQL rechazada por coste %.0f > %.0f: %s", coste, self.coste_maximo, sql)
+            raise ConsultaSQLRechazada(
+                f"La consulta es demasiado costosa (coste estimado {coste:.0f}, máximo {self.coste_maximo:.0f}). "
+                "Evita productos cartesianos y añade condiciones de JOIN o filtros."
+            )
+
+    def _tamanos_tablas(self, conexion, tablas: set) -> dict:
+        """
+        Filas de cada una de `tablas` que exista (las CTE y funciones se
+        ignoran). Cada `count(*)` se reutiliza durante `ttl_tamanos` segundos.
+        """
+        existentes = {tabla.lower(): tabla for tabla in self.get_usable_table_names()}
+        ahora = time.monotonic()
+        tamanos = {}
+        for tabla in tablas:
+            nombre = existentes.get(tabla.lower())
+            if nombre is None:
+                continue
+            with self._lock_tamanos:
+                entrada = self._tamanos.get(nombre)
+            if entrada is None or entrada[0] <= ahora:
+                filas = conexion.exec_driver_sql(f'SELECT count(*) FROM "{nombre}"').scalar()
+                entrada = (ahora + self.ttl_tamanos, filas)
+                with self._lock_tamanos:
+                    self._tamanos[nombre] = entrada
+            tamanos[tabla] = entrada[1]
+        return tamanos
+
+    def _coste_sqlite(self, conexion, sql: str, parametros: dict) -> float:
+        """
+        Filas recorridas si cada bucle anidado del plan multiplica por las
+        filas de su tabla: un SCAN cuenta la tabla entera, un SEARCH por
+        índice cuenta su logaritmo. Las tablas que no se reconocen (CTE,
+        subconsultas) cuentan como la más grande.
+        """
+        alias = {}
+        for tabla, nombre in TABLAS_CON_ALIAS.findall(sql):
+            alias[tabla.lower()] = tabla
+            if nombre:
+                alias[nombre.lower()] = tabla
+        tamanos = self._tamanos_tablas(conexion, set(alias.values()))
+        mayor = max(tamanos.values(), default=1)
+
+        coste = 1.0
+        for *_, detalle in conexion.execute(text(f"EXPLAIN QUERY PLAN {sql}"), parametros):
+            partes = detalle.split()
+            if len(partes) < 2 or partes[0] not in ("SCAN", "SEARCH") or partes[1] == "CONSTANT":
+                continue
+            filas = tamanos.get(alias.get(partes[1].lower()), mayor) or 1
+            coste *= filas if partes[0] == "SCAN" else max(1.0, math.log2(filas))
+        return coste
+
+CONSULTA_FIRMA_POSTGRES = text("""
+    SELECT md5(string_agg(table_name || '.' || column_name || ':' || data_type, ','
+                          ORDER BY table_name, ordinal_position))
+    FROM information_schema.columns
+    WHERE table_schema = current_schema()
+""")
+
+CONSULTA_CAMBIOS_POSTGRES = text("""
+    SELECT relname, n_tup_ins + n_tup_upd + n_tup_del
+    FROM pg_stat_user_tables
+    WHERE relname = ANY(:tablas)
+""")
+
+def crear_db() -> SQLDatabaseAcotada:
+    """Refleja el esquema actual y devuelve un SQLDatabaseAcotada sobre el engine compartido."""
+    return SQLDatabaseAcotada(engine)
+
+def firma_esquema() -> str:
+    """Huella barata de tablas y columnas; cambia cuando hay DDL."""
+    if engine.dialect.name == "postgresql":
+        with engine.connect() as conexion:
+            return conexion.execute(CONSULTA_FIRMA_POSTGRES).scalar() or ""
+
+    inspector = inspect(engine)
+    partes = [
+        f"{tabla}.{columna['name']}:{columna['type']}"
+        for tabla in sorted(inspector.get_table_names())
+        for columna in inspector.get_columns(tabla)
+    ]
+    return hashlib.md5(",".join(partes).encode("utf-8")).hexdigest()
+
+def firma_tablas(tablas: list[str]) -> tuple:
+    """
+    Señal barata de cambios en los datos de cada tabla. En Postgres usa los
+    contadores de filas insertadas/actualizadas/borradas de pg_stat_user_tables;
+    en otros motores, el número de filas.
+    """
+    tablas = sorted(tablas)
+    with engine.connect() as conexion:
+        if engine.dialect.name == "postgresql":
+            cambios = dict(conexion.execute(CONSULTA_CAMBIOS_POSTGRES, {"tablas": tablas}).all())
+            return tuple(cambios.get(tabla) for tabla in tablas)
+        return tuple(
+            conexion.execute(text(f'SELECT count(*) FROM "{tabla}"')).scalar()
+            for tabla in tablas
+        )
 
-db = SQLDatabase.from_uri(DATABASE_URL)
+# Reflejar el esquema necesita la base de datos: se hace al primer uso, no al importar.
+# No es crítico, sin base de datos el resto del agente sigue funcionando.
+recurso_sql = recursos.registrar("sql", crear_db, critico=False)
+db = Perezoso(recurso_sql)
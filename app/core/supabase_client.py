@@ -1,5 +1,7 @@
 from supabase import create_client
 
 from app.core.config import SUPABASE_KEY, SUPABASE_URL
+from app.core.recursos import Perezoso, recursos
 
-supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+# El cliente se crea al primer uso (o en el precalentamiento del arranque).
+supabase = Perezoso(recursos.registrar("supabase", lambda: create_client(SUPABASE_URL, SUPABASE_KEY)))
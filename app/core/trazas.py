@@ -0,0 +1,265 @@
+import logging
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from app.core.config import PERFILADO_HABILITADO
+from app.core.metricas import metricas
+
+log = logging.getLogger(__name__)
+
+# Sondas y scraping: su resumen por petición solo se escribe con nivel DEBUG.
+RUTAS_SILENCIOSAS = ("/metrics", "/salud/vivo", "/salud/listo")
+
+# El id del cliente se reenvía en cabeceras y da nombre al archivo del perfil.
+ID_VALIDO = re.compile(r"[\w.-]{1,64}", re.ASCII)
+
+# Id de la petición en curso; lo heredan las tareas y los hilos de `EjecutorAcotado.ejecutar`.
+id_peticion: ContextVar[str] = ContextVar("id_peticion", default="-")
+
+duracion_etapas = metricas.histograma(
+    "agente_etapa_segundos",
+    "Duración de cada etapa del pipeline (guardián, historial, herramientas, LLM...).",
+    ("etapa", "detalle"),
+)
+duracion_peticiones = metricas.histograma(
+    "http_peticion_segundos",
+    "Duración de las peticiones HTTP hasta el último byte de la respuesta.",
+    ("metodo", "ruta", "estado"),
+)
+tokens_llm = metricas.contador(
+    "llm_tokens_total",
+    "Tokens consumidos por las llamadas a modelos de lenguaje.",
+    ("modelo", "tipo"),
+)
+
+
+class Traza:
+    """Tramos de una petición: (etapa, detalle, inicio relativo, duración, atributos)."""
+
+    def __init__(self, id_peticion: str):
+        self.id_peticion = id_peticion
+        self.inicio = time.perf_counter()
+        self.tramos: List[tuple] = []
+        # Los rellena el middleware al terminar la petición.
+        self.ruta: Optional[str] = None
+        self.estado: Optional[int] = None
+        self.duracion: Optional[float] = None
+
+    def agregar(self, etapa: str, detalle: str, inicio: float, duracion: float, atributos: dict) -> None:
+        # list.append es atómico: pueden añadir tramos los hilos de los pools.
+        self.tramos.append((etapa, detalle, inicio - self.inicio, duracion, atributos))
+
+    def totales(self) -> Dict[str, float]:
+        """Segundos por etapa (sumando las repeticiones), en orden de aparición."""
+        totales: Dict[str, float] = {}
+        for etapa, detalle, _, duracion, _ in self.tramos:
+            clave = f"{etapa}:{detalle}" if detalle else etapa
+            totales[clave] = totales.get(clave, 0.0) + duracion
+        return totales
+
+    def server_timing(self) -> str:
+        """Cabecera Server-Timing con los tramos terminados hasta ahora."""
+        return ", ".join(
+            f"{clave.replace(':', '.')};dur={segundos * 1000:.1f}" for clave, segundos in self.totales().items()
+        )
+
+
+traza_actual: ContextVar[Optional[Traza]] = ContextVar("traza_actual", default=None)
+
+# Funciones que reciben cada traza terminada (p. ej. el benchmark de carga).
+observadores_trazas: List[Callable[[Traza], None]] = []
+
+
+def observar_trazas(funcion: Callable[[Traza], None]) -> None:
+    """Registra `funcion` para que reciba la traza de cada petición HTTP al terminar, con todos sus tramos."""
+    observadores_trazas.append(funcion)
+
+
+def registrar_tramo(etapa: str, detalle: str, inicio: float, duracion: float, **atributos) -> None:
+    duracion_etapas.observar(duracion, etapa=etapa, detalle=detalle)
+    traza = traza_actual.get()
+    if traza is not None:
+        traza.agregar(etapa, detalle, inicio, duracion, atributos)
+    if log.isEnabledFor(logging.DEBUG):
+        log.debug("%s%s %.1f ms %s", etapa, f":{detalle}" if detalle else "", duracion * 1000, atributos or "")
+
+
+@contextmanager
+def tramo(etapa: str, detalle: str = "", **atributos):
+    """
+    Mide un bloque y lo registra en el histograma `agente_etapa_segundos` y
+    en la traza de la petición. `detalle` es una etiqueta (debe tener pocos
+    valores posibles); los `atributos` solo van a la traza y al log.
+    """
+    inicio = time.perf_counter()
+    try:
+        yield atributos
+    finally:
+        registrar_tramo(etapa, detalle, inicio, time.perf_counter() - inicio, **atributos)
+
+
+def _nombre_modelo(serializado: Optional[dict], kwargs: dict) -> str:
+    parametros = kwargs.get("invocation_params") or {}
+    nombre = parametros.get("model") or parametros.get("model_name")
+    if not nombre and serializado:
+        nombre = (serializado.get("kwargs") or {}).get("model") or (serializado.get("id") or ["llm"])[-1]
+    return str(nombre or "llm").removeprefix("models/")
+
+
+def _uso_de_tokens(respuesta) -> Dict[str, int]:
+    for generaciones in respuesta.generations:
+        for generacion in generaciones:
+            uso = getattr(getattr(generacion, "message", None), "usage_metadata", None)
+            if uso:
+                return {"entrada": uso.get("input_tokens", 0), "salida": uso.get("output_tokens", 0)}
+    uso = (respuesta.llm_output or {}).get("usage_metadata") or (respuesta.llm_output or {}).get("token_usage")
+    if uso:
+        return {
+            "entrada": uso.get("input_tokens", uso.get("prompt_tokens", 0)),
+            "salida": uso.get("output_tokens", uso.get("completion_tokens", 0)),
+        }
+    return {}
+
+
+class ManejadorTrazas(BaseCallbackHandler):
+    """
+    Callback de LangChain que convierte las llamadas a modelos y herramientas
+    en tramos de la traza de la petición, con los tokens de cada llamada.
+    Sustituye a `verbose=True`: las entradas y salidas solo se escriben en el
+    log con nivel DEBUG.
+    """
+
+    # Se ejecuta en la propia corrutina, sin saltar a un hilo por cada evento.
+    run_inline = True
+
+    def __init__(self, traza: Optional[Traza] = None):
+        self.traza = traza
+        self._abiertos: Dict[UUID, tuple] = {}
+
+    def _abrir(self, run_id: UUID, etapa: str, detalle: str) -> None:
+        self._abiertos[run_id] = (etapa, detalle, time.perf_counter())
+
+    def _cerrar(self, run_id: UUID, **atributos) -> None:
+        abierto = self._abiertos.pop(run_id, None)
+        if abierto is None:
+            return
+        etapa, detalle, inicio = abierto
+        token = traza_actual.set(self.traza) if self.traza is not None else None
+        try:
+            registrar_tramo(etapa, detalle, inicio, time.perf_counter() - inicio, **atributos)
+        finally:
+            if token is not None:
+                traza_actual.reset(token)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs) -> Any:
+        self._abrir(run_id, "llm", _nombre_modelo(serialized, kwargs))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs) -> Any:
+        self._abrir(run_id, "llm", _nombre_modelo(serialized, kwargs))
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> Any:
+        abierto = self._abiertos.get(run_id)
+        uso = _uso_de_tokens(response)
+        if abierto is not None:
+            for tipo, cantidad in uso.items():
+                tokens_llm.incrementar(cantidad, modelo=abierto[1], tipo=tipo)
+        self._cerrar(run_id, **{f"tokens_{tipo}": cantidad for tipo, cantidad in uso.items()})
+
+    def on_llm_error(self, error, *, run_id, **kwargs) -> Any:
+        self._cerrar(run_id, error=type(error).__name__)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, **kwargs) -> Any:
+        nombre = (serialized or {}).get("name") or kwargs.get("name") or "herramienta"
+        self._abrir(run_id, "herramienta", nombre)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("herramienta %s <- %s", nombre, input_str)
+
+    def on_tool_end(self, output, *, run_id, **kwargs) -> Any:
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug("herramienta -> %.500s", getattr(output, "content", output))
+        self._cerrar(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs) -> Any:
+        self._cerrar(run_id, error=type(error).__name__)
+
+
+def config_trazas(config: Optional[dict] = None) -> dict:
+    """
+    Config de LangChain con el callback de trazas y el id de la petición en
+    los metadatos, para que llegue a todas las ejecuciones hijas.
+    """
+    config = dict(config or {})
+    config["callbacks"] = [*(config.get("callbacks") or []), ManejadorTrazas(traza_actual.get())]
+    config["metadata"] = {**(config.get("metadata") or {}), "id_peticion": id_peticion.get()}
+    return config
+
+
+class MiddlewareTrazas:
+    """
+    Middleware ASGI: asigna el id de la petición (o respeta `X-Request-ID`),
+    abre su traza, mide la duración hasta el último byte y añade las
+    cabeceras `X-Request-ID` y `Server-Timing`. Con PERFILADO_HABILITADO, una
+    petición con `X-Perfilar: 1` se perfila con el muestreador de pilas.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        cabeceras = dict(scope.get("headers") or [])
+        identificador = cabeceras.get(b"x-request-id", b"").decode("latin-1")
+        if not ID_VALIDO.fullmatch(identificador):
+            identificador = uuid.uuid4().hex
+        traza = Traza(identificador)
+        token_id = id_peticion.set(identificador)
+        token_traza = traza_actual.set(traza)
+        estado = 500
+
+        perfilador = None
+        if PERFILADO_HABILITADO and cabeceras.get(b"x-perfilar") in (b"1", b"true"):
+            from app.core.perfilador import Perfilador
+
+            perfilador = Perfilador(identificador)
+            perfilador.iniciar()
+
+        async def enviar(mensaje):
+            nonlocal estado
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+                cabeceras_extra = [(b"x-request-id", identificador.encode("latin-1"))]
+                if traza.tramos:
+                    cabeceras_extra.append((b"server-timing", traza.server_timing().encode("latin-1")))
+                mensaje["headers"] = [*mensaje.get("headers", []), *cabeceras_extra]
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            duracion = time.perf_counter() - traza.inicio
+            ruta = getattr(scope.get("route"), "path", "sin_ruta")
+            duracion_peticiones.observar(duracion, metodo=scope["method"], ruta=ruta, estado=str(estado))
+            traza.ruta, traza.estado, traza.duracion = ruta, estado, duracion
+            for observador in observadores_trazas:
+                try:
+                    observador(traza)
+                except Exception:
+                    log.exception("Error en un observador de trazas")
+            if perfilador is not None:
+                perfilador.detener()
+            nivel = logging.DEBUG if scope["path"] in RUTAS_SILENCIOSAS else logging.INFO
+            if log.isEnabledFor(nivel):
+                etapas = " ".join(f"{clave}={segundos * 1000:.0f}ms" for clave, segundos in traza.totales().items())
+                log.log(nivel, "%s %s %s %.0fms %s", scope["method"], scope["path"], estado, duracion * 1000, etapas)
+            traza_actual.reset(token_traza)
+            id_peticion.reset(token_id)
@@ -1,5 +1,42 @@
-from app.routes import agent
+import asyncio
+from contextlib import asynccontextmanager
+
+from app.routes import agent, documentos, metricas, salud
+from app.core.cache_sesiones import cache_sesiones
+from app.core.cliente_http import cliente_crm
+from app.core.config import PRECARGAR_RECURSOS
+from app.core.ejecutores import cerrar_ejecutores, instalar_ejecutores, pool_disco, pool_red
+from app.core.embedding import cache_embeddings
+from app.core.logs import configurar_logs
+from app.core.recursos import recursos
+from app.core.trazas import MiddlewareTrazas
+from app.services.contexto_historial import contexto_historial
 from fastapi import FastAPI
-app = FastAPI()
+
+configurar_logs()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    instalar_ejecutores(asyncio.get_running_loop())
+    cache_sesiones.iniciar()
+    # Los modelos y clientes se cargan en segundo plano: el servidor acepta
+    # conexiones enseguida y /salud/listo indica cuándo está todo cargado.
+    calentamiento = asyncio.create_task(recursos.calentar(pool_red)) if PRECARGAR_RECURSOS else None
+    yield
+    if calentamiento is not None and not calentamiento.done():
+        calentamiento.cancel()
+    await contexto_historial.esperar_resumenes()
+    await cache_sesiones.detener()
+    await asyncio.get_running_loop().run_in_executor(pool_disco, cache_embeddings.guardar)
+    await cliente_crm.cerrar()
+    cerrar_ejecutores()
+
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(MiddlewareTrazas)
 
 app.include_router(agent.router, prefix="/agent")
+app.include_router(documentos.router, prefix="/documentos")
+app.include_router(salud.router, prefix="/salud")
+app.include_router(metricas.router)
@@ -7,11 +7,23 @@ class DocumentoRequest(BaseModel):
     texto: str
     metadatos: Dict = {}
 
-from typing import Optional
+from typing import List, Optional
+
+class IngestaRequest(BaseModel):
+    documentos: List[DocumentoRequest]
+    tamano_fragmento: Optional[int] = None
+    solapamiento: Optional[int] = None
 
 class BusquedaRequest(BaseModel):
     consulta: str
     session_id: str = ''
     top_k: int = 3
     image_base64: Optional[str] = None
-    audio_base64: Optional[str] = None
\ No newline at end of file
+    audio_base64: Optional[str] = None
+    # Con CACHE_RESPUESTAS activo; False para preguntas que dependen del historial de la sesión.
+    usar_cache: bool = True
+
+class LoteRequest(BaseModel):
+    peticiones: List[BusquedaRequest]
+    # Peticiones del lote en paralelo; como mucho LOTE_CONCURRENCIA.
+    concurrencia: Optional[int] = None
\ No newline at end of file
@@ -0,0 +1,42 @@
+import io
+
+from fastapi import APIRouter, File, HTTPException, UploadFile
+
+from app.core.config import INGESTA_SOLAPAMIENTO, INGESTA_TAMANO_FRAGMENTO
+from app.core.ejecutores import PoolSaturado, pool_ingesta
+from app.models.schemas import IngestaRequest
+from app.services.ingesta import Ingestor, documentos_de_flujo, fragmentar
+
+router = APIRouter()
+
+async def ejecutar_ingesta(funcion, *args) -> dict:
+    try:
+        return await pool_ingesta.ejecutar(funcion, *args)
+    except PoolSaturado as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
+@router.post("/")
+async def ingerir_documentos(payload: IngestaRequest):
+    """Trocea, embebe y guarda los documentos. Devuelve cuántos fragmentos son nuevos y el throughput."""
+    tamano = payload.tamano_fragmento or INGESTA_TAMANO_FRAGMENTO
+    solapamiento = INGESTA_SOLAPAMIENTO if payload.solapamiento is None else payload.solapamiento
+    return await ejecutar_ingesta(Ingestor().ingerir_documentos, payload.documentos, tamano, solapamiento)
+
+@router.post("/archivo")
+async def ingerir_archivo(
+    archivo: UploadFile = File(...),
+    tamano_fragmento: int = INGESTA_TAMANO_FRAGMENTO,
+    solapamiento: int = INGESTA_SOLAPAMIENTO,
+):
+    """
+    Ingiere un archivo subido (`.jsonl` con un documento por línea, o texto
+    plano). Se lee por bloques, sin cargarlo entero en memoria.
+    """
+    def ingerir():
+        flujo = io.TextIOWrapper(archivo.file, encoding="utf-8")
+        documentos = documentos_de_flujo(flujo, archivo.filename or "archivo")
+        return Ingestor().ingerir(fragmentar(documentos, tamano_fragmento, solapamiento))
+
+    return await ejecutar_ingesta(ingerir)
@@ -0,0 +1,74 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.core.cache_sesiones import cache_sesiones
+from app.core.config import AGENTE_MAX_CONCURRENCIA
+from app.core.ejecutores import estadisticas_pools
+from app.core.embedding import cache_embeddings, planificador_embeddings
+from app.core.medios import almacen_medios
+from app.core.metricas import metricas
+from app.core.recursos import recursos
+from app.core.sql_database import estadisticas_sql
+from app.routes import agent
+from app.services.busqueda import cache_busquedas
+from app.services.cache_respuestas import cache_respuestas
+from app.services.cache_sql import cache_consultas_sql
+from app.services.contexto_historial import contexto_historial
+from app.services.rerank import cache_rerank, estadisticas_rerank, planificador_rerank
+from app.services.tts_service import cache_audio
+from app.tools.agent_tools import cache_clientes
+
+router = APIRouter()
+
+metricas.registrar_colector("pool", "Estado de los pools de ejecutores.", estadisticas_pools)
+metricas.registrar_colector(
+    "cache",
+    "Aciertos, fallos y tamaño de las caches en memoria.",
+    lambda: {
+        "embeddings": cache_embeddings.estadisticas(),
+        "busquedas": cache_busquedas.estadisticas(),
+        "rerank": cache_rerank.estadisticas(),
+        "clientes_crm": cache_clientes.estadisticas(),
+        "audio_tts": cache_audio.estadisticas(),
+        "sql_consultas": cache_consultas_sql.consultas.estadisticas(),
+        "sql_resultados": cache_consultas_sql.resultados.estadisticas(),
+        "respuestas": cache_respuestas.entradas.estadisticas(),
+    },
+)
+metricas.registrar_colector(
+    "respuestas",
+    "Cache semántica de respuestas del agente: consultas, aciertos, tasa de aciertos y entradas.",
+    lambda: {"agente": cache_respuestas.estadisticas()},
+)
+metricas.registrar_colector(
+    "sesiones",
+    "Historiales en memoria, mensajes pendientes de volcar y resúmenes de sesiones largas.",
+    lambda: {"historial": cache_sesiones.estadisticas(), "contexto": contexto_historial.estadisticas()},
+)
+metricas.registrar_colector(
+    "planificador",
+    "Micro-lotes de inferencia (embeddings y rerank).",
+    lambda: {"embeddings": planificador_embeddings.estadisticas(), "rerank": planificador_rerank.estadisticas()},
+)
+metricas.registrar_colector("medios", "Medios subidos en memoria.", lambda: {"almacen": almacen_medios.estadisticas()})
+metricas.registrar_colector("recurso", "Modelos y clientes cargados de forma perezosa.", recursos.estado)
+metricas.registrar_colector(
+    "rerank",
+    "Candidatos reordenados y omitidos por el rerank adaptativo.",
+    lambda: {"cross_encoder": estadisticas_rerank()},
+)
+metricas.registrar_colector(
+    "sql",
+    "Consultas de la herramienta SQL (rechazadas, truncadas, por coste o tiempo) y pool de conexiones.",
+    lambda: {"base_de_datos": estadisticas_sql()},
+)
+metricas.registrar_colector(
+    "agente",
+    "Peticiones del agente en curso y límite de concurrencia.",
+    lambda: {"peticiones": {"en_curso": agent.peticiones_en_curso, "maximo": AGENTE_MAX_CONCURRENCIA}},
+)
+
+@router.get("/metrics")
+async def exponer_metricas():
+    """Métricas en el formato de texto de Prometheus."""
+    return PlainTextResponse(metricas.exponer(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,17 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app.core.recursos import recursos
+
+router = APIRouter()
+
+@router.get("/vivo")
+async def liveness():
+    """El proceso responde. No mira dependencias: si falla, hay que reiniciar el contenedor."""
+    return {"estado": "vivo"}
+
+@router.get("/listo")
+async def readiness():
+    """Listo para recibir tráfico cuando todos los recursos críticos están cargados."""
+    cuerpo = {"listo": recursos.listo, "recursos": recursos.estado()}
+    return JSONResponse(cuerpo, status_code=200 if recursos.listo else 503)
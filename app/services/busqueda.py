@@ -1,13 +1,94 @@
+import copy
+import hashlib
+import struct
+from typing import List
+
+from app.core.cache import CacheLRU, normalizar_texto
+from app.core.config import BUSQUEDA_HIBRIDA, BUSQUEDA_RRF_K, CACHE_BUSQUEDAS_MAX, CACHE_BUSQUEDAS_TTL
 from app.core.embedding import generar_embedding
-from app.core.supabase_client import supabase
+from app.core.trazas import tramo
 from app.models.schemas import BusquedaRequest
+from app.services.recuperadores import RecuperadorLexico, crear_recuperador
 
-def buscar_documentos(payload: BusquedaRequest):
-    vector = generar_embedding(payload.consulta)
+# Supabase (pgvector) o índice local, según RECUPERADOR.
+recuperador = crear_recuperador()
+
+# BM25 local; se combina con el vectorial cuando su índice existe.
+recuperador_lexico = RecuperadorLexico()
+
+# (hash del embedding, top_k, versión del índice) -> resultados del recuperador.
+# ("lexico", consulta normalizada, top_k, versión) -> resultados BM25.
+cache_busquedas = CacheLRU(CACHE_BUSQUEDAS_MAX, ttl=CACHE_BUSQUEDAS_TTL)
+
+def hash_embedding(vector: list[float]) -> str:
+    return hashlib.sha1(struct.pack(f"{len(vector)}f", *vector)).hexdigest()
+
+def invalidar_cache_busquedas() -> None:
+    """Descarta los resultados cacheados. Llamar después de ingerir documentos."""
+    cache_busquedas.clear()
 
-    resultado = supabase.rpc(
-        "buscar_similares",
-        {"query": vector, "top_k": payload.top_k}
-    ).execute()
+def busqueda_vectorial(vector: List[float], top_k: int) -> List[dict]:
+    clave = (hash_embedding(vector), top_k, recuperador.version)
+    resultados = cache_busquedas.get(clave)
+    if resultados is None:
+        with tramo("busqueda", "vectorial"):
+            resultados = recuperador.buscar(vector, top_k)
+        cache_busquedas.set(clave, resultados)
+    return resultados
 
-    return {"resultados": resultado.data}
\ No newline at end of file
+def busqueda_lexica(consulta: str, top_k: int) -> List[dict]:
+    clave = ("lexico", normalizar_texto(consulta), top_k, recuperador_lexico.version)
+    resultados = cache_busquedas.get(clave)
+    if resultados is None:
+        with tramo("busqueda", "lexica"):
+            resultados = recuperador_lexico.buscar(consulta, top_k)
+        cache_busquedas.set(clave, resultados)
+    return resultados
+
+def fusionar_rrf(listas: List[List[dict]], k: int = BUSQUEDA_RRF_K) -> List[dict]:
+    """
+    Reciprocal rank fusion: cada documento suma 1 / (k + posición) por cada
+    lista en la que aparece. `puntaje` es esa suma dividida por el máximo
+    posible (primero en todas las listas), entre 0 y 1, y `posicion` la mejor
+    posición que tuvo en alguna de las listas.
+    """
+    fusion = {}
+    for lista in listas:
+        for posicion, documento in enumerate(lista, start=1):
+            clave = str(documento.get("id") or documento["texto"])
+            entrada = fusion.get(clave)
+            if entrada is None:
+                entrada = fusion[clave] = {**documento, "rrf": 0.0, "posicion": posicion}
+            else:
+                # Conserva la similitud de una lista y el bm25 de la otra.
+                entrada.update({c: v for c, v in documento.items() if c not in entrada})
+                entrada["posicion"] = min(entrada["posicion"], posicion)
+            entrada["rrf"] += 1 / (k + posicion)
+
+    # Una lista vacía (p. ej. ningún término de la consulta en el índice léxico) no cuenta.
+    maximo = max(1, sum(1 for lista in listas if lista)) / (k + 1)
+    resultados = sorted(fusion.values(), key=lambda documento: documento["rrf"], reverse=True)
+    for documento in resultados:
+        documento["puntaje"] = documento["rrf"] / maximo
+    return resultados
+
+def recuperar(consulta: str, vector: List[float], top_k: int, hibrida: bool = BUSQUEDA_HIBRIDA) -> List[dict]:
+    """
+    Primera etapa de la búsqueda: los `top_k` candidatos ordenados por
+    `puntaje` (fusión RRF si hay índice léxico; si no, la similitud vectorial
+    cuando el recuperador la devuelve).
+    """
+    vectoriales = copy.deepcopy(busqueda_vectorial(vector, top_k))
+    if hibrida and recuperador_lexico.disponible:
+        lexicos = copy.deepcopy(busqueda_lexica(consulta, top_k))
+        return fusionar_rrf([vectoriales, lexicos])[:top_k]
+
+    for posicion, documento in enumerate(vectoriales, start=1):
+        documento["puntaje"] = documento.get("similitud")
+        documento["posicion"] = posicion
+    return vectoriales
+
+def buscar_documentos(payload: BusquedaRequest):
+    vector = generar_embedding(payload.consulta)
+    # Copia para que quien llama pueda anotar los chunks sin tocar la cache.
+    return {"resultados": recuperar(payload.consulta, vector, payload.top_k)}
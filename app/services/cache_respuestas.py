@@ -0,0 +1,122 @@
+import logging
+import threading
+from typing import Iterable, Optional
+
+import numpy as np
+
+from app.core.cache import CacheLRU, normalizar_texto
+from app.core.config import CACHE_RESPUESTAS_MAX, CACHE_RESPUESTAS_TTL, CACHE_RESPUESTAS_UMBRAL
+from app.core.embedding import generar_embedding
+from app.services import busqueda
+
+log = logging.getLogger(__name__)
+
+# Herramientas cuyas respuestas solo cambian al ingerir documentos. Una
+# respuesta que usó cualquier otra (CRM, SQL, adjuntos) no se cachea, y una
+# que no usó ninguna tampoco: sale del historial o del propio modelo, no de
+# los documentos, y podría servirse a otra sesión.
+HERRAMIENTAS_CACHEABLES = frozenset({"buscar_contexto_en_documentos"})
+
+
+def _normalizar(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    return vector / (np.linalg.norm(vector) or 1)
+
+
+class CacheRespuestas:
+    """
+    Respuestas completas del agente (`respuesta` y `contexto`) indexadas por
+    el embedding de la pregunta. Una pregunta nueva con similitud coseno de
+    al menos `umbral` con una guardada recibe su respuesta sin pasar por el
+    agente, la búsqueda ni el rerank (el prefiltro y el guardián sí se
+    aplican a la consulta nueva, en `app.routes.agent`).
+
+    Las entradas caducan con `ttl`, se expulsan por LRU y se descartan al
+    ingerir documentos o cuando cambia la versión de los índices locales.
+    """
+
+    def __init__(
+        self,
+        max_items: int = CACHE_RESPUESTAS_MAX,
+        ttl: float = CACHE_RESPUESTAS_TTL,
+        umbral: float = CACHE_RESPUESTAS_UMBRAL,
+    ):
+        # Pregunta normalizada -> {"vector", "respuesta", "contexto", "version"}.
+        self.entradas = CacheLRU(max_items, ttl=ttl)
+        self.umbral = umbral
+        self._lock = threading.Lock()
+        self.metricas = {"consultas": 0, "aciertos": 0, "guardadas": 0, "descartadas": 0, "invalidaciones": 0}
+
+    def _contar(self, clave: str) -> None:
+        with self._lock:
+            self.metricas[clave] += 1
+
+    @staticmethod
+    def _version() -> tuple:
+        return busqueda.recuperador.version, busqueda.recuperador_lexico.version
+
+    def buscar(self, consulta: str) -> Optional[dict]:
+        """La respuesta guardada más parecida a `consulta` si supera el umbral; si no, None."""
+        self._contar("consultas")
+        version = self._version()
+        clave = normalizar_texto(consulta)
+
+        entrada = self.entradas.get(clave)
+        if entrada is None:
+            candidatas = [(c, e) for c, e in self.entradas.items() if e["version"] == version]
+            if candidatas:
+                vector = _normalizar(generar_embedding(consulta))
+                similitudes = np.stack([e["vector"] for _, e in candidatas]) @ vector
+                mejor = int(np.argmax(similitudes))
+                if similitudes[mejor] >= self.umbral:
+                    clave = candidatas[mejor][0]
+                    # Se vuelve a pedir para que cuente como uso reciente en el LRU.
+                    entrada = self.entradas.get(clave)
+
+        if entrada is None or entrada["version"] != version:
+            return None
+        self._contar("aciertos")
+        log.debug("Respuesta servida desde la cache semántica para: %s", consulta)
+        return {"respuesta": entrada["respuesta"], "contexto": list(entrada["contexto"])}
+
+    def guardar(
+        self,
+        consulta: str,
+        respuesta: str,
+        contexto: list,
+        herramientas: Iterable[str],
+        con_historial: bool = False,
+    ) -> bool:
+        """
+        Guarda la respuesta si se construyó con la búsqueda de documentos y
+        nada más, y fuera de una sesión con historial (`con_historial`) que
+        pudiera haberla condicionado. Devuelve si se guardó.
+        """
+        herramientas = set(herramientas)
+        if con_historial or not herramientas or not herramientas <= HERRAMIENTAS_CACHEABLES:
+            self._contar("descartadas")
+            return False
+        self.entradas.set(
+            normalizar_texto(consulta),
+            {
+                "vector": _normalizar(generar_embedding(consulta)),
+                "respuesta": respuesta,
+                "contexto": list(contexto),
+                "version": self._version(),
+            },
+        )
+        self._contar("guardadas")
+        return True
+
+    def invalidar(self) -> None:
+        self.entradas.clear()
+        self._contar("invalidaciones")
+
+    def estadisticas(self) -> dict:
+        with self._lock:
+            metricas = dict(self.metricas)
+        metricas["tasa_aciertos"] = metricas["aciertos"] / metricas["consultas"] if metricas["consultas"] else 0.0
+        return {**metricas, "entradas": len(self.entradas)}
+
+
+cache_respuestas = CacheRespuestas()
@@ -0,0 +1,116 @@
+import logging
+import re
+import threading
+from collections import defaultdict
+from typing import Optional
+
+from app.core.cache import CacheLRU, normalizar_texto
+from app.core.config import CACHE_SQL_MAX
+from app.core.sql_database import db, firma_tablas
+
+log = logging.getLogger(__name__)
+
+
+def extraer_consulta(pasos_intermedios) -> Optional[tuple]:
+    """
+    (SQL, filas devueltas) de la consulta que ejecutó con éxito la herramienta
+    `sql_db_query` del agente SQL. None si no hubo ninguna o si hubo varias:
+    una respuesta construida con varias consultas no se puede revalidar
+    reejecutando solo una.
+    """
+    consultas = {}
+    for accion, observacion in pasos_intermedios:
+        if accion.tool != "sql_db_query":
+            continue
+        if isinstance(observacion, str) and observacion.startswith("Error"):
+            continue
+        entrada = accion.tool_input
+        sql = entrada.get("query") if isinstance(entrada, dict) else entrada
+        consultas[sql] = observacion
+    if len(consultas) != 1:
+        return None
+    return next(iter(consultas.items()))
+
+
+def es_solo_lectura(sql: str) -> bool:
+    return sql.lstrip().lower().startswith(("select", "with"))
+
+
+class CacheConsultasSQL:
+    """
+    Cache de la herramienta SQL en dos niveles:
+
+    - pregunta normalizada -> SQL generada y tablas que toca;
+    - SQL -> filas que devolvió y respuesta del agente, junto con la firma de
+      cambios de esas tablas.
+
+    Si la firma no cambió se devuelve la respuesta guardada sin llamar al LLM.
+    Si cambió, se vuelve a ejecutar la misma SQL: si devuelve las mismas filas
+    la respuesta sigue valiendo; si no, se descarta y el agente responde de nuevo.
+    """
+
+    def __init__(self, max_items: int = CACHE_SQL_MAX):
+        self.consultas = CacheLRU(max_items)
+        self.resultados = CacheLRU(max_items)
+        # Contadores locales que suben las herramientas que escriben (p. ej. el CRM).
+        self._versiones = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def _firma(self, tablas: tuple) -> tuple:
+        with self._lock:
+            locales = tuple(self._versiones[tabla] for tabla in tablas)
+        return firma_tablas(list(tablas)), locales
+
+    def tablas_de_sql(self, sql: str) -> tuple:
+        conocidas = db.get_usable_table_names()
+        encontradas = {
+            tabla for tabla in conocidas
+            if re.search(rf"\b{re.escape(tabla)}\b", sql, flags=re.IGNORECASE)
+        }
+        return tuple(sorted(encontradas))
+
+    def buscar(self, pregunta: str) -> Optional[str]:
+        consulta = self.consultas.get(normalizar_texto(pregunta))
+        if consulta is None:
+            return None
+
+        sql, tablas = consulta["sql"], consulta["tablas"]
+        firma = self._firma(tablas)
+        resultado = self.resultados.get(sql)
+        if resultado is not None and resultado["firma"] == firma:
+            log.debug("Herramienta SQL: respuesta servida desde cache")
+            return resultado["respuesta"]
+
+        if resultado is None:
+            return None
+
+        log.debug("Herramienta SQL: datos cambiados, reejecutando SQL cacheada: %s", sql)
+        try:
+            filas = db.run(sql)
+        except Exception as e:
+            log.warning("La SQL cacheada ya no es válida, se regenerará: %s", e)
+            self.consultas.pop(normalizar_texto(pregunta))
+            return None
+
+        if filas != resultado["filas"]:
+            self.resultados.pop(sql)
+            return None
+        self.resultados.set(sql, {**resultado, "firma": firma})
+        return resultado["respuesta"]
+
+    def guardar(self, pregunta: str, sql: str, filas: str, respuesta: str) -> None:
+        if not es_solo_lectura(sql):
+            return
+        tablas = self.tablas_de_sql(sql)
+        if not tablas:
+            return
+        self.consultas.set(normalizar_texto(pregunta), {"sql": sql, "tablas": tablas})
+        self.resultados.set(sql, {"firma": self._firma(tablas), "filas": filas, "respuesta": respuesta})
+
+    def invalidar_tabla(self, tabla: str) -> None:
+        """Marca como obsoletos los resultados que leen `tabla`."""
+        with self._lock:
+            self._versiones[tabla] += 1
+
+
+cache_consultas_sql = CacheConsultasSQL()
@@ -0,0 +1,323 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.runnables import RunnableConfig
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+from app.core.cache import CacheLRU
+from app.core.cache_sesiones import CacheSesiones, cache_sesiones
+from app.core.config import (
+    GEMINI_API_KEY,
+    HISTORIAL_MAX_TOKENS,
+    HISTORIAL_MENSAJES_ARCHIVO,
+    HISTORIAL_RESUMEN_MAX_TOKENS,
+    HISTORIAL_RESUMEN_MIN_MENSAJES,
+    HISTORIAL_RESUMEN_MODELO,
+    HISTORIAL_SIMILITUD_MINIMA,
+    HISTORIAL_TURNOS_RECUPERADOS,
+)
+from app.core.ejecutores import pool_red
+from app.core.embedding import generar_embeddings_cacheados
+from app.core.recursos import recursos
+from app.core.trazas import config_trazas, tramo
+
+log = logging.getLogger(__name__)
+
+# Aproximación para español con el tokenizador de Gemini; contar de verdad
+# requiere una llamada a la API por mensaje.
+CARACTERES_POR_TOKEN = 4
+TOKENS_POR_MENSAJE = 4
+
+# Los turnos recuperados entran recortados: sirven de recordatorio, no de transcripción.
+MAX_CARACTERES_TURNO = 800
+
+modelo_resumen = recursos.registrar(
+    "gemini_resumen",
+    lambda: ChatGoogleGenerativeAI(model=HISTORIAL_RESUMEN_MODELO, google_api_key=GEMINI_API_KEY),
+    critico=False,
+)
+
+prompt_resumen = ChatPromptTemplate.from_template(
+    """Mantienes el resumen de una conversación entre un usuario y un asistente de datos de clientes y documentos.
+    Actualiza el resumen con los mensajes nuevos. Conserva nombres, ids, emails, cifras, decisiones tomadas y
+    preguntas pendientes; omite saludos y frases de cortesía. Escribe como máximo {palabras} palabras y devuelve
+    solo el resumen.
+
+    Resumen actual:
+    {resumen}
+
+    Mensajes nuevos:
+    {mensajes}
+
+    Resumen actualizado:
+    """
+)
+
+
+def texto_mensaje(mensaje: BaseMessage) -> str:
+    contenido = mensaje.content
+    if isinstance(contenido, str):
+        return contenido
+    return "".join(parte.get("text", "") if isinstance(parte, dict) else str(parte) for parte in contenido)
+
+
+def estimar_tokens(mensaje: BaseMessage) -> int:
+    return len(texto_mensaje(mensaje)) // CARACTERES_POR_TOKEN + TOKENS_POR_MENSAJE
+
+
+def inicio_ventana(mensajes: List[BaseMessage], presupuesto: int) -> int:
+    """
+    Índice del primer mensaje del sufijo más largo que cabe en `presupuesto`
+    tokens y empieza en un mensaje del usuario. El último turno entra aunque
+    no quepa.
+    """
+    inicio = len(mensajes)
+    usados = 0
+    for posicion in range(len(mensajes) - 1, -1, -1):
+        usados += estimar_tokens(mensajes[posicion])
+        if usados > presupuesto:
+            break
+        inicio = posicion
+    while inicio < len(mensajes) and not isinstance(mensajes[inicio], HumanMessage):
+        inicio += 1
+    if inicio == len(mensajes):
+        humanos = [posicion for posicion, mensaje in enumerate(mensajes) if isinstance(mensaje, HumanMessage)]
+        inicio = humanos[-1] if humanos else len(mensajes)
+    return inicio
+
+
+def agrupar_turnos(mensajes: List[BaseMessage]) -> List[List[BaseMessage]]:
+    """Corta la lista en turnos: cada mensaje del usuario con las respuestas que lo siguen."""
+    turnos = []
+    for mensaje in mensajes:
+        if isinstance(mensaje, HumanMessage) or not turnos:
+            turnos.append([])
+        turnos[-1].append(mensaje)
+    return turnos
+
+
+def transcribir(mensajes: List[BaseMessage], max_caracteres: Optional[int] = None) -> str:
+    lineas = []
+    for mensaje in mensajes:
+        texto = texto_mensaje(mensaje)
+        if max_caracteres is not None:
+            texto = texto[:max_caracteres]
+        lineas.append(f"{'Usuario' if isinstance(mensaje, HumanMessage) else 'Asistente'}: {texto}")
+    return "\n".join(lineas)
+
+
+async def resumir_con_gemini(resumen: str, mensajes: List[BaseMessage]) -> str:
+    cadena = prompt_resumen | modelo_resumen.obtener()
+    respuesta = await cadena.ainvoke(
+        {
+            "palabras": HISTORIAL_RESUMEN_MAX_TOKENS * CARACTERES_POR_TOKEN // 6,
+            "resumen": resumen or "(vacío)",
+            "mensajes": transcribir(mensajes),
+        },
+        config=config_trazas(),
+    )
+    return texto_mensaje(respuesta).strip()
+
+
+class ContextoHistorial:
+    """
+    Arma el historial que recibe el agente con un tamaño acotado, sea cual
+    sea la longitud de la sesión:
+
+    - los mensajes más recientes que caben en `presupuesto` tokens, tal cual;
+    - un resumen de los anteriores, que se actualiza en segundo plano después
+      de responder, cuando se acumulan `min_pendientes` mensajes fuera de la
+      ventana (hasta entonces esos mensajes siguen en la ventana). Se ancla
+      en el id de fila del último mensaje resumido y se lee de Supabase, así
+      que también cubre los mensajes que ya salieron de la cola cargada;
+    - los `turnos_recuperados` turnos anteriores a la ventana más parecidos a
+      la consulta, para recuperar detalles que el resumen haya perdido. Se
+      buscan en la cola cargada y en los últimos `archivo` mensajes resumidos.
+
+    El resumen y los turnos recuperados van en un único mensaje de sistema
+    delante de la ventana.
+    """
+
+    def __init__(
+        self,
+        sesiones: CacheSesiones = cache_sesiones,
+        presupuesto: int = HISTORIAL_MAX_TOKENS,
+        min_pendientes: int = HISTORIAL_RESUMEN_MIN_MENSAJES,
+        turnos_recuperados: int = HISTORIAL_TURNOS_RECUPERADOS,
+        archivo: int = HISTORIAL_MENSAJES_ARCHIVO,
+        similitud_minima: float = HISTORIAL_SIMILITUD_MINIMA,
+        resumir: Callable[[str, List[BaseMessage]], Awaitable[str]] = resumir_con_gemini,
+        embeber: Callable[[List[str]], List[List[float]]] = generar_embeddings_cacheados,
+    ):
+        self.sesiones = sesiones
+        self.presupuesto = presupuesto
+        self.min_pendientes = min_pendientes
+        self.turnos_recuperados = turnos_recuperados
+        self.archivo = archivo
+        self.similitud_minima = similitud_minima
+        self.resumir = resumir
+        self.embeber = embeber
+        self._tareas: Dict[str, asyncio.Task] = {}
+        # (sesión, fila del resumen) -> mensajes resumidos; no cambian hasta el siguiente resumen.
+        self._archivados = CacheLRU(sesiones.max_sesiones, ttl=sesiones.ttl)
+        self.metricas = {"resumenes": 0, "errores_resumen": 0, "mensajes_resumidos": 0, "turnos_recuperados": 0}
+
+    def _limites(self, mensajes: List[BaseMessage], hasta: Optional[str]) -> tuple:
+        """
+        (primer mensaje cargado sin resumir, primer mensaje de la ventana). Si
+        `hasta` no está entre los cargados es anterior a todos ellos: los
+        cargados son la cola de la sesión y el resumen avanza en orden.
+        """
+        desde = 0
+        if hasta is not None:
+            for posicion in range(len(mensajes) - 1, -1, -1):
+                if mensajes[posicion].id == hasta:
+                    desde = posicion + 1
+                    break
+        inicio = max(desde, inicio_ventana(mensajes, self.presupuesto))
+        if inicio - desde < self.min_pendientes:
+            inicio = desde
+        return desde, inicio
+
+    async def construir(self, session_id: str, mensajes: List[BaseMessage], consulta: str) -> List[BaseMessage]:
+        with tramo("historial", "contexto") as atributos:
+            estado = await self.sesiones.historial(session_id).aobtener_resumen()
+            _, inicio = self._limites(mensajes, estado["hasta"])
+            anteriores, recientes = mensajes[:inicio], mensajes[inicio:]
+
+            partes = []
+            if estado["resumen"]:
+                partes.append(f"Resumen de la conversación anterior:\n{estado['resumen']}")
+            archivados = await self._archivados_de(session_id, mensajes, estado)
+            recuperados = await self._recuperar(consulta, archivados + anteriores)
+            if recuperados:
+                partes.append("Turnos anteriores relacionados con la consulta:\n" + "\n\n".join(recuperados))
+
+            contexto = [SystemMessage(content="\n\n".join(partes))] if partes else []
+            atributos.update(
+                mensajes=len(mensajes),
+                ventana=len(recientes),
+                recuperados=len(recuperados),
+                tokens=sum(estimar_tokens(mensaje) for mensaje in contexto + recientes),
+            )
+        return contexto + recientes
+
+    async def _archivados_de(self, session_id: str, mensajes: List[BaseMessage], estado: dict) -> List[BaseMessage]:
+        """Los últimos `archivo` mensajes resumidos que ya no están en la cola cargada, en orden."""
+        fila = estado.get("hasta_fila")
+        if fila is None or self.archivo <= 0 or self.turnos_recuperados <= 0:
+            return []
+        if len(mensajes) < self.sesiones.ventana:
+            # La cola no está llena: la sesión entera está cargada.
+            return []
+        clave = (session_id, fila)
+        archivados = self._archivados.get(clave)
+        if archivados is None:
+            filas = await pool_red.ejecutar(self.sesiones.backend(session_id).mensajes_hasta, fila, self.archivo)
+            archivados = [mensaje for _, mensaje in filas]
+            self._archivados.set(clave, archivados)
+        cargados = {mensaje.id for mensaje in mensajes}
+        return [mensaje for mensaje in archivados if mensaje.id not in cargados]
+
+    async def _recuperar(self, consulta: str, anteriores: List[BaseMessage]) -> List[str]:
+        if not consulta or not anteriores or self.turnos_recuperados <= 0:
+            return []
+        turnos = [transcribir(turno, MAX_CARACTERES_TURNO) for turno in agrupar_turnos(anteriores)]
+        vectores = np.asarray(await pool_red.ejecutar(self.embeber, [consulta, *turnos]), dtype=np.float32)
+        vectores /= np.linalg.norm(vectores, axis=1, keepdims=True) + 1e-12
+        similitudes = vectores[1:] @ vectores[0]
+
+        mejores = [
+            posicion
+            for posicion in np.argsort(-similitudes)[: self.turnos_recuperados]
+            if similitudes[posicion] >= self.similitud_minima
+        ]
+        self.metricas["turnos_recuperados"] += len(mejores)
+        # En orden cronológico, como aparecieron en la conversación.
+        return [turnos[posicion] for posicion in sorted(mejores)]
+
+    def programar_resumen(self, session_id: str) -> None:
+        """Actualiza el resumen de la sesión en segundo plano si hay suficientes mensajes fuera de la ventana."""
+        if session_id in self._tareas:
+            return
+        tarea = asyncio.create_task(self._actualizar_resumen(session_id))
+        self._tareas[session_id] = tarea
+        tarea.add_done_callback(lambda _: self._tareas.pop(session_id, None))
+
+    def _sin_resumir(self, session_id: str, estado: dict, ventana: set) -> List[Tuple[int, BaseMessage]]:
+        """
+        Filas de la sesión posteriores al resumen que ya no están en la
+        ventana del prompt, en orden y como mucho una cola (`ventana` de la
+        cache). Incluye las que salieron de la cola cargada. Los resúmenes
+        guardados sin `hasta_fila` se localizan por el id del mensaje.
+        """
+        # Los mensajes pendientes de volcar aún no tienen fila.
+        self.sesiones.flush()
+        backend = self.sesiones.backend(session_id)
+        limite = self.sesiones.ventana
+        fila = estado.get("hasta_fila") or 0
+        ancla = estado["hasta"] if estado.get("hasta_fila") is None else None
+        pendientes = []
+        while ancla is not None or len(pendientes) < limite:
+            pagina = backend.mensajes_posteriores(fila, limite)
+            for fila, mensaje in pagina:
+                if mensaje.id in ventana:
+                    return pendientes[:limite]
+                if mensaje.id == ancla:
+                    # Todo lo anterior ya está en el resumen.
+                    pendientes, ancla = [], None
+                    continue
+                pendientes.append((fila, mensaje))
+            if len(pagina) < limite:
+                break
+        return pendientes[:limite]
+
+    async def _actualizar_resumen(self, session_id: str) -> None:
+        historial = self.sesiones.historial(session_id)
+        try:
+            while True:
+                mensajes = await historial.aget_messages()
+                estado = await historial.aobtener_resumen()
+                desde, inicio = self._limites(mensajes, estado["hasta"])
+                # Con el resumen al día dentro de la cola, o con la sesión entera
+                # cargada, lo pendiente está a la vista y no hace falta leer Supabase.
+                if inicio - desde < self.min_pendientes and (desde > 0 or len(mensajes) < self.sesiones.ventana):
+                    return
+
+                ventana = {mensaje.id for mensaje in mensajes[inicio:]}
+                pendientes = await pool_red.ejecutar(self._sin_resumir, session_id, estado, ventana)
+                if len(pendientes) < self.min_pendientes:
+                    return
+
+                with tramo("historial", "resumen", mensajes=len(pendientes)):
+                    resumen = await self.resumir(estado["resumen"], [mensaje for _, mensaje in pendientes])
+                fila, ultimo = pendientes[-1]
+                await pool_red.ejecutar(self.sesiones.actualizar_resumen, session_id, resumen, ultimo.id, fila)
+                self.metricas["resumenes"] += 1
+                self.metricas["mensajes_resumidos"] += len(pendientes)
+                # Una cola entera puede dejar más atrasados: se sigue hasta ponerse al día.
+                if len(pendientes) < self.sesiones.ventana:
+                    return
+        except Exception as e:
+            self.metricas["errores_resumen"] += 1
+            log.warning("No se pudo actualizar el resumen de la sesión '%s': %s", session_id, e)
+
+    async def esperar_resumenes(self) -> None:
+        """Espera a que terminen los resúmenes en curso (al apagar el servidor)."""
+        await asyncio.gather(*self._tareas.values(), return_exceptions=True)
+
+    def estadisticas(self) -> dict:
+        return {**self.metricas, "resumenes_en_curso": len(self._tareas)}
+
+
+contexto_historial = ContextoHistorial()
+
+
+async def acotar_historial(entrada: dict, config: RunnableConfig) -> List[BaseMessage]:
+    """Paso de la cadena del agente que sustituye el historial completo por el contexto acotado."""
+    session_id = config["configurable"]["session_id"]
+    return await contexto_historial.construir(session_id, entrada["history"], entrada["input"])
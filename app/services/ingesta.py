@@ -0,0 +1,328 @@
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from app.core.config import (
+    INGESTA_LOTE_EMBEDDINGS,
+    INGESTA_SOLAPAMIENTO,
+    INGESTA_TAMANO_FRAGMENTO,
+    INGESTA_TAMANO_PAGINA,
+    RECUPERADOR,
+)
+from app.core.embedding import planificador_embeddings
+from app.core.inferencia import PlanificadorLotes
+from app.core.supabase_client import supabase
+from app.models.schemas import DocumentoRequest
+from app.services.busqueda import invalidar_cache_busquedas, recuperador_lexico
+from app.services.cache_respuestas import cache_respuestas
+from app.services.recuperadores import TABLA_DOCUMENTOS, marcar_version
+
+log = logging.getLogger(__name__)
+
+TAMANO_BLOQUE_LECTURA = 64 * 1024
+# Preferencia de corte dentro de la ventana: párrafo, línea, frase y palabra.
+SEPARADORES = ("\n\n", "\n", ". ", " ")
+
+
+def trocear(
+    bloques: Iterable[str],
+    tamano: int = INGESTA_TAMANO_FRAGMENTO,
+    solapamiento: int = INGESTA_SOLAPAMIENTO,
+) -> Iterator[str]:
+    """
+    Parte un texto que llega por bloques en fragmentos de hasta `tamano`
+    caracteres; cada uno empieza con los últimos `solapamiento` caracteres del
+    anterior. Corta en el mejor separador de la segunda mitad de la ventana.
+    Nunca tiene en memoria mucho más de un fragmento.
+    """
+    if not 0 <= solapamiento < tamano // 2:
+        raise ValueError("El solapamiento debe ser menor que la mitad del tamaño del fragmento.")
+
+    pendiente = ""
+    # Caracteres al principio de `pendiente` que ya salieron en el fragmento anterior.
+    repetidos = 0
+    for bloque in bloques:
+        pendiente += bloque
+        while len(pendiente) > tamano:
+            ventana = pendiente[:tamano]
+            corte = tamano
+            for separador in SEPARADORES:
+                posicion = ventana.rfind(separador, tamano // 2)
+                if posicion != -1:
+                    corte = posicion + len(separador)
+                    break
+            fragmento = pendiente[:corte].strip()
+            if fragmento:
+                yield fragmento
+            inicio = corte - solapamiento
+            # El solapamiento empieza en una palabra entera.
+            espacio = pendiente.find(" ", inicio, corte)
+            if solapamiento and espacio != -1:
+                inicio = espacio + 1
+            pendiente = pendiente[inicio:]
+            repetidos = corte - inicio
+
+    resto = pendiente.strip()
+    if resto and len(pendiente) > repetidos:
+        yield resto
+
+
+def id_fragmento(texto: str) -> str:
+    """Id determinista a partir del contenido: el mismo texto siempre cae en la misma fila."""
+    return str(uuid.UUID(hex=hashlib.sha256(texto.encode("utf-8")).hexdigest()[:32]))
+
+
+def documentos_de_flujo(flujo: TextIO, nombre: str) -> Iterator[Tuple[str, dict, Iterable[str]]]:
+    """
+    Documentos de un archivo de texto abierto, como (fuente, metadatos,
+    bloques de texto). `.jsonl`: un `DocumentoRequest` por línea. Cualquier
+    otro: texto plano, leído por bloques sin cargarlo entero.
+    """
+    if nombre.endswith(".jsonl"):
+        for numero, linea in enumerate(flujo, start=1):
+            if not linea.strip():
+                continue
+            registro = json.loads(linea)
+            documento = DocumentoRequest(**registro)
+            fuente = str(registro.get("id") or f"{nombre}:{numero}")
+            yield fuente, documento.metadatos, [documento.texto]
+        return
+
+    def bloques():
+        while bloque := flujo.read(TAMANO_BLOQUE_LECTURA):
+            yield bloque
+
+    yield nombre, {}, bloques()
+
+
+def leer_documentos(ruta: str) -> Iterator[Tuple[str, dict, Iterable[str]]]:
+    with open(ruta, encoding="utf-8") as f:
+        yield from documentos_de_flujo(f, os.path.basename(ruta))
+
+
+def fragmentar(
+    documentos: Iterable[Tuple[str, dict, Iterable[str]]],
+    tamano: int = INGESTA_TAMANO_FRAGMENTO,
+    solapamiento: int = INGESTA_SOLAPAMIENTO,
+) -> Iterator[dict]:
+    for fuente, metadatos, bloques in documentos:
+        for numero, texto in enumerate(trocear(bloques, tamano, solapamiento)):
+            yield {
+                "id": id_fragmento(texto),
+                "texto": texto,
+                "metadatos": {**metadatos, "fuente": fuente, "fragmento": numero},
+            }
+
+
+def embeber_en_lotes(
+    textos: List[str],
+    lote: int = INGESTA_LOTE_EMBEDDINGS,
+    planificador: PlanificadorLotes = planificador_embeddings,
+) -> List[List[float]]:
+    """
+    Envía todos los sub-lotes al planificador de una vez: el modelo no espera
+    entre lotes y las consultas interactivas se intercalan entre ellos.
+    """
+    futuros = [
+        planificador.enviar_muchos(textos[inicio:inicio + lote])
+        for inicio in range(0, len(textos), lote)
+    ]
+    return [vector for futuro in futuros for vector in futuro.result()]
+
+
+class PuntoDeControl:
+    """
+    Progreso de la ingesta de un archivo, guardado junto a él en
+    `<archivo>.ingesta.json`. Solo vale mientras no cambien ni el archivo ni
+    el troceo.
+    """
+
+    def __init__(self, ruta_archivo: str, tamano_fragmento: int, solapamiento: int):
+        self.ruta = f"{ruta_archivo}.ingesta.json"
+        estado = os.stat(ruta_archivo)
+        # Con otro troceo los fragmentos ya no coinciden, así que también forma parte de la huella.
+        self.huella = {
+            "tamano": estado.st_size,
+            "mtime_ns": estado.st_mtime_ns,
+            "tamano_fragmento": tamano_fragmento,
+            "solapamiento": solapamiento,
+        }
+
+    def leer(self) -> int:
+        try:
+            with open(self.ruta, encoding="utf-8") as f:
+                guardado = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        return guardado.get("fragmentos", 0) if guardado.get("huella") == self.huella else 0
+
+    def guardar(self, fragmentos: int) -> None:
+        temporal = f"{self.ruta}.tmp"
+        with open(temporal, "w", encoding="utf-8") as f:
+            json.dump({"huella": self.huella, "fragmentos": fragmentos}, f)
+        os.replace(temporal, self.ruta)
+
+    def borrar(self) -> None:
+        if os.path.exists(self.ruta):
+            os.remove(self.ruta)
+
+
+class Ingestor:
+    """
+    Ingesta por páginas de `tamano_pagina` fragmentos. Por cada página:
+
+    1. una sola consulta para saber qué ids (hash del contenido) ya existen;
+    2. solo los fragmentos nuevos se embeben, en lotes grandes;
+    3. un único upsert con la página entera, en segundo plano mientras se
+       prepara la siguiente.
+
+    Como los ids dependen del contenido, repetir una ingesta no duplica filas
+    ni vuelve a embeber lo que ya estaba.
+    """
+
+    def __init__(
+        self,
+        client=None,
+        tamano_pagina: int = INGESTA_TAMANO_PAGINA,
+        embeber: Callable[[List[str]], List[List[float]]] = embeber_en_lotes,
+        tabla: str = TABLA_DOCUMENTOS,
+    ):
+        self.client = client or supabase
+        self.tamano_pagina = tamano_pagina
+        self.embeber = embeber
+        self.tabla = tabla
+
+    def _existentes(self, ids: List[str]) -> set:
+        respuesta = self.client.table(self.tabla).select("id").in_("id", ids).execute()
+        return {fila["id"] for fila in respuesta.data or []}
+
+    def _guardar(self, filas: List[dict]) -> None:
+        self.client.table(self.tabla).upsert(filas).execute()
+
+    def ingerir(
+        self,
+        fragmentos: Iterable[dict],
+        saltar: int = 0,
+        al_guardar_pagina: Optional[Callable[[int], None]] = None,
+    ) -> dict:
+        """
+        Ingiere los fragmentos y devuelve un resumen con el throughput. Los
+        primeros `saltar` se dan por guardados (reanudación). Tras cada página
+        guardada se llama a `al_guardar_pagina` con los fragmentos procesados.
+        """
+        resumen = {"fragmentos": saltar, "nuevos": 0, "duplicados": 0, "reanudados": saltar}
+        inicio = time.perf_counter()
+        escritor = ThreadPoolExecutor(1, thread_name_prefix="ingesta")
+        guardado_en_curso: Optional[Future] = None
+        # Ids ya vistos en esta ingesta: un fragmento repetido se procesa una sola vez,
+        # aunque el upsert de su primera aparición todavía no haya terminado.
+        vistos = set()
+
+        def procesar(pagina: List[dict]) -> None:
+            nonlocal guardado_en_curso
+            unicos = []
+            for fragmento in pagina:
+                if fragmento["id"] not in vistos:
+                    vistos.add(fragmento["id"])
+                    unicos.append(fragmento)
+            existentes = self._existentes([fragmento["id"] for fragmento in unicos]) if unicos else set()
+            nuevos = [fragmento for fragmento in unicos if fragmento["id"] not in existentes]
+            if nuevos:
+                vectores = self.embeber([fragmento["texto"] for fragmento in nuevos])
+                filas = [{**fragmento, "embedding": list(vector)} for fragmento, vector in zip(nuevos, vectores)]
+            else:
+                filas = []
+
+            if guardado_en_curso is not None:
+                guardado_en_curso.result()
+            procesados = resumen["fragmentos"] + len(pagina)
+
+            def guardar():
+                if filas:
+                    self._guardar(filas)
+                if al_guardar_pagina is not None:
+                    al_guardar_pagina(procesados)
+
+            guardado_en_curso = escritor.submit(guardar)
+            resumen["fragmentos"] = procesados
+            resumen["nuevos"] += len(filas)
+            resumen["duplicados"] += len(pagina) - len(filas)
+            segundos = time.perf_counter() - inicio
+            log.info(
+                "Ingesta: %d fragmentos (%d nuevos), %.0f fragmentos/s",
+                resumen["fragmentos"], resumen["nuevos"], (resumen["fragmentos"] - saltar) / segundos,
+            )
+
+        try:
+            pagina = []
+            for numero, fragmento in enumerate(fragmentos):
+                if numero < saltar:
+                    continue
+                pagina.append(fragmento)
+                if len(pagina) == self.tamano_pagina:
+                    procesar(pagina)
+                    pagina = []
+            if pagina:
+                procesar(pagina)
+            if guardado_en_curso is not None:
+                guardado_en_curso.result()
+        finally:
+            escritor.shutdown(wait=True)
+            if resumen["nuevos"]:
+                # Los demás procesos (la API si esto es la CLI) lo ven por la versión.
+                try:
+                    marcar_version(self.tabla, self.client)
+                except Exception as e:
+                    log.warning("No se pudo publicar la versión de '%s'; sus caches caducarán por TTL: %s", self.tabla, e)
+                invalidar_cache_busquedas()
+                cache_respuestas.invalidar()
+                # Los índices locales no se reconstruyen aquí: hasta sincronizarlos,
+                # BM25 (y el índice vectorial local) no ven los fragmentos nuevos.
+                if RECUPERADOR == "local" or recuperador_lexico.disponible:
+                    log.warning(
+                        "Los índices locales no incluyen los %d fragmentos nuevos; "
+                        "ejecuta scripts.sincronizar_indice --desde-supabase",
+                        resumen["nuevos"],
+                    )
+
+        segundos = time.perf_counter() - inicio
+        resumen["segundos"] = round(segundos, 3)
+        resumen["fragmentos_por_segundo"] = round((resumen["fragmentos"] - saltar) / segundos, 1) if segundos else 0.0
+        return resumen
+
+    def ingerir_documentos(
+        self,
+        documentos: Iterable[DocumentoRequest],
+        tamano: int = INGESTA_TAMANO_FRAGMENTO,
+        solapamiento: int = INGESTA_SOLAPAMIENTO,
+    ) -> dict:
+        origen = (
+            (str(documento.metadatos.get("fuente") or f"api:{numero}"), documento.metadatos, [documento.texto])
+            for numero, documento in enumerate(documentos)
+        )
+        return self.ingerir(fragmentar(origen, tamano, solapamiento))
+
+    def ingerir_archivo(
+        self,
+        ruta: str,
+        tamano: int = INGESTA_TAMANO_FRAGMENTO,
+        solapamiento: int = INGESTA_SOLAPAMIENTO,
+        reanudar: bool = True,
+    ) -> dict:
+        """Ingiere un archivo guardando el progreso; si se interrumpe, la siguiente llamada sigue donde se quedó."""
+        punto = PuntoDeControl(ruta, tamano, solapamiento)
+        saltar = punto.leer() if reanudar else 0
+        if saltar:
+            log.info("Reanudando la ingesta de %s en el fragmento %d", ruta, saltar)
+        resumen = self.ingerir(
+            fragmentar(leer_documentos(ruta), tamano, solapamiento),
+            saltar=saltar,
+            al_guardar_pagina=punto.guardar,
+        )
+        punto.borrar()
+        return resumen
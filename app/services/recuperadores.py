@@ -0,0 +1,213 @@
+import logging
+import os
+import threading
+import time
+from typing import List, Optional
+
+from app.core.config import (
+    DOCUMENTOS_VERSION_TTL,
+    INDICE_IVF_NPROBE,
+    INDICE_LOCAL_RUTA,
+    INDICE_VERSION_TTL,
+    RECUPERADOR,
+)
+from app.core.indice_lexico import ARCHIVO_LEXICO, IndiceLexico
+from app.core.indice_vectorial import ARCHIVO_EMBEDDINGS, ARCHIVO_MANIFIESTO, IndiceVectorial
+from app.core.supabase_client import supabase
+
+log = logging.getLogger(__name__)
+
+TABLA_DOCUMENTOS = "documentos"
+# Una fila por tabla con la versión de su contenido; la escriben las ingestas.
+TABLA_VERSIONES = "versiones"
+
+
+class MarcaArchivo:
+    """
+    Fecha de modificación del primero de `rutas` que exista, o None si no
+    existe ninguno. Se consulta al disco como mucho cada `ttl` segundos, no
+    en cada búsqueda.
+    """
+
+    def __init__(self, *rutas: str, ttl: float = INDICE_VERSION_TTL):
+        self.rutas = rutas
+        self.ttl = ttl
+        self._valor = None
+        self._caduca = 0.0
+
+    @property
+    def valor(self) -> Optional[int]:
+        ahora = time.monotonic()
+        if ahora >= self._caduca:
+            valor = None
+            for ruta in self.rutas:
+                try:
+                    valor = os.stat(ruta).st_mtime_ns
+                    break
+                except FileNotFoundError:
+                    continue
+            self._valor, self._caduca = valor, ahora + self.ttl
+        return self._valor
+
+
+class MarcaTabla:
+    """
+    Versión de `tabla` en `versiones`, o None si todavía no hay fila. La
+    escribe `marcar_version` en cualquier proceso que cambie la tabla (la
+    ingesta por CLI incluida) y, como `MarcaArchivo`, se consulta como mucho
+    cada `ttl` segundos.
+    """
+
+    def __init__(self, tabla: str, client=None, ttl: float = DOCUMENTOS_VERSION_TTL):
+        self.tabla = tabla
+        self.client = client or supabase
+        self.ttl = ttl
+        self._valor = None
+        self._caduca = 0.0
+
+    @property
+    def valor(self) -> Optional[int]:
+        ahora = time.monotonic()
+        if ahora >= self._caduca:
+            try:
+                respuesta = self.client.table(TABLA_VERSIONES).select("version").eq("tabla", self.tabla).execute()
+                self._valor = respuesta.data[0]["version"] if respuesta.data else None
+            except Exception as e:
+                # Sin respuesta se mantiene la última versión conocida.
+                log.warning("No se pudo leer la versión de '%s': %s", self.tabla, e)
+            self._caduca = ahora + self.ttl
+        return self._valor
+
+
+def marcar_version(tabla: str, client=None) -> int:
+    """Publica una versión nueva de `tabla` para que los demás procesos descarten sus caches."""
+    version = time.time_ns()
+    (client or supabase).table(TABLA_VERSIONES).upsert({"tabla": tabla, "version": version}).execute()
+    return version
+
+
+class Recuperador:
+    """Devuelve los `top_k` documentos más parecidos a un embedding de consulta."""
+
+    def buscar(self, vector: List[float], top_k: int) -> List[dict]:
+        raise NotImplementedError
+
+    @property
+    def version(self):
+        """Cambia cuando cambian los documentos indexados; forma parte de la clave de cache."""
+        return None
+
+
+class RecuperadorSupabase(Recuperador):
+    """Búsqueda con la función `buscar_similares` de pgvector en Supabase."""
+
+    def __init__(self, client=None):
+        self.client = client or supabase
+        self._marca = MarcaTabla(TABLA_DOCUMENTOS, self.client)
+
+    @property
+    def version(self):
+        return self._marca.valor
+
+    def buscar(self, vector: List[float], top_k: int) -> List[dict]:
+        resultado = self.client.rpc(
+            "buscar_similares",
+            {"query": vector, "top_k": top_k}
+        ).execute()
+        return resultado.data
+
+
+class RecuperadorLocal(Recuperador):
+    """
+    Búsqueda sobre el índice local en `ruta`. El índice se abre en la primera
+    consulta y se vuelve a abrir si `scripts.sincronizar_indice` lo reescribe.
+    """
+
+    def __init__(self, ruta: str = INDICE_LOCAL_RUTA, nprobe: int = INDICE_IVF_NPROBE):
+        self.ruta = ruta
+        self.nprobe = nprobe
+        # Los índices escritos antes del manifiesto solo tienen `embeddings.npy`.
+        self._marca = MarcaArchivo(os.path.join(ruta, ARCHIVO_MANIFIESTO), os.path.join(ruta, ARCHIVO_EMBEDDINGS))
+        self._indice = None
+        self._version = None
+        self._avisado = False
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        return self._marca.valor
+
+    def _obtener_indice(self) -> Optional[IndiceVectorial]:
+        version = self.version
+        if version is None:
+            if self._indice is None and not self._avisado:
+                log.warning("No hay índice local en %s; ejecuta scripts.sincronizar_indice", self.ruta)
+                self._avisado = True
+            return self._indice
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    try:
+                        self._indice = IndiceVectorial(self.ruta)
+                    except (OSError, ValueError) as e:
+                        # Generación borrada o incompleta: se sigue con el índice anterior, si lo hay.
+                        log.warning("Índice local no cargado: %s", e)
+                        return self._indice
+                    self._version = version
+                    log.info("Índice local cargado desde %s: %d documentos", self.ruta, len(self._indice))
+        return self._indice
+
+    def buscar(self, vector: List[float], top_k: int) -> List[dict]:
+        indice = self._obtener_indice()
+        return indice.buscar(vector, top_k, nprobe=self.nprobe) if indice is not None else []
+
+
+class RecuperadorLexico:
+    """
+    Búsqueda BM25 sobre el índice léxico que `scripts.sincronizar_indice`
+    escribe en `ruta` (sirve con cualquiera de los dos recuperadores
+    vectoriales). Si todavía no existe, `disponible` es False y la búsqueda
+    queda solo vectorial.
+    """
+
+    def __init__(self, ruta: str = INDICE_LOCAL_RUTA):
+        self.ruta = ruta
+        self._marca = MarcaArchivo(os.path.join(ruta, ARCHIVO_LEXICO))
+        self._indice = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        return self._marca.valor
+
+    @property
+    def disponible(self) -> bool:
+        return self.version is not None
+
+    def _obtener_indice(self) -> IndiceLexico:
+        version = self.version
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    try:
+                        self._indice = IndiceLexico(self.ruta)
+                    except (OSError, ValueError) as e:
+                        # Reconstrucción a medias: se sigue con el índice anterior, si lo hay.
+                        log.warning("Índice léxico no cargado: %s", e)
+                        return self._indice
+                    self._version = version
+                    log.info("Índice léxico cargado desde %s: %d documentos", self.ruta, len(self._indice))
+        return self._indice
+
+    def buscar(self, consulta: str, top_k: int) -> List[dict]:
+        indice = self._obtener_indice()
+        return indice.buscar(consulta, top_k) if indice is not None else []
+
+
+def crear_recuperador(nombre: str = RECUPERADOR) -> Recuperador:
+    if nombre == "local":
+        return RecuperadorLocal()
+    if nombre == "supabase":
+        return RecuperadorSupabase()
+    raise ValueError(f"Recuperador desconocido: '{nombre}'. Usa 'supabase' o 'local'.")
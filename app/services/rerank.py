@@ -0,0 +1,161 @@
+import asyncio
+import hashlib
+import threading
+from typing import List, Optional, Tuple
+
+from app.core.cache import CacheLRU, normalizar_texto
+from app.core.config import BUSQUEDA_K_FINAL, RERANK_CACHE_MAX, RERANK_UMBRAL
+from app.core.inferencia import PlanificadorLotes
+from app.core.modelos import cargar_modelo_rerank
+from app.core.recursos import recursos
+from app.core.trazas import tramo
+
+modelo_rerank = recursos.registrar("rerank", cargar_modelo_rerank)
+
+# Los pares de varias búsquedas concurrentes se puntúan en un mismo lote.
+planificador_rerank = PlanificadorLotes(
+    lambda pares: modelo_rerank.obtener().predict(pares, batch_size=len(pares)).tolist(),
+    nombre="rerank",
+)
+
+# (consulta normalizada, id del fragmento) -> puntaje del CrossEncoder.
+cache_rerank = CacheLRU(RERANK_CACHE_MAX)
+
+# Puntajes de cada lista de la primera etapa que conserva la fusión RRF, y
+# si su margen se mide relativo al mejor (BM25 no está acotado, el coseno sí).
+SENALES_PREVIAS = (("similitud", False), ("bm25", True))
+
+metricas_rerank = {"consultas": 0, "omitidas": 0, "pares_puntuados": 0, "pares_en_cache": 0}
+_lock_metricas = threading.Lock()
+
+
+def _contar(**incrementos) -> None:
+    with _lock_metricas:
+        for clave, valor in incrementos.items():
+            metricas_rerank[clave] += valor
+
+
+def estadisticas_rerank() -> dict:
+    with _lock_metricas:
+        return {**metricas_rerank, "cache": cache_rerank.estadisticas()}
+
+
+def _clave_fragmento(fragmento: dict) -> str:
+    if fragmento.get("id") is not None:
+        return str(fragmento["id"])
+    return hashlib.sha1(fragmento["texto"].encode("utf-8")).hexdigest()
+
+
+async def puntuar(
+    consulta: str,
+    fragmentos: List[dict],
+    planificador: PlanificadorLotes = planificador_rerank,
+) -> List[float]:
+    """Puntajes del CrossEncoder; solo se calculan los pares que no están en cache."""
+    base = normalizar_texto(consulta)
+    claves = [(base, _clave_fragmento(fragmento)) for fragmento in fragmentos]
+    puntajes = [cache_rerank.get(clave) for clave in claves]
+    pendientes = [i for i, puntaje in enumerate(puntajes) if puntaje is None]
+
+    if pendientes:
+        pares = [[consulta, fragmentos[i]["texto"]] for i in pendientes]
+        nuevos = await asyncio.wrap_future(planificador.enviar_muchos(pares))
+        for i, puntaje in zip(pendientes, nuevos):
+            puntajes[i] = float(puntaje)
+            cache_rerank.set(claves[i], puntajes[i])
+    _contar(pares_puntuados=len(pendientes), pares_en_cache=len(fragmentos) - len(pendientes))
+    return puntajes
+
+
+def _seguros_de_lista(candidatos: List[dict], campo: str, k: int, umbral: float, relativo: bool) -> set:
+    """
+    Ids (de objeto) de los candidatos del top-k de una lista de la primera
+    etapa que superan por `umbral` o más, en su propio puntaje `campo`, al
+    primero que la lista deja fuera.
+    """
+    lista = sorted((c for c in candidatos if c.get(campo) is not None), key=lambda c: c[campo], reverse=True)
+    frontera = lista[k][campo] if len(lista) > k else 0.0
+    escala = (abs(lista[0][campo]) or 1) if relativo else 1
+    return {id(candidato) for candidato in lista[:k] if (candidato[campo] - frontera) / escala >= umbral}
+
+
+def dividir_por_confianza(
+    candidatos: List[dict], k: int, umbral: float
+) -> Tuple[List[dict], List[dict]]:
+    """
+    Separa los candidatos (ordenados por `puntaje`) en los que entran seguro
+    en el top-k y los dudosos que hay que reordenar.
+
+    Un candidato es seguro si su puntaje supera en `umbral` o más al mejor de
+    los que quedan fuera. Son dudosos los demás que están a menos de `umbral`
+    del último puesto del top-k y los que alguna de las listas de la primera
+    etapa puso entre sus k primeros (`posicion`): que la fusión los deje
+    atrás solo dice que las listas no coinciden. El resto no se puntúa.
+    Sin puntajes o con `umbral <= 0` todos son dudosos.
+
+    Con fusión RRF el `puntaje` solo refleja posiciones (dos puestos seguidos
+    difieren en ~0.01), así que el margen se mide en cada lista antes de
+    fusionar (coseno, o BM25 relativo al mejor): es seguro el que lo tiene
+    en todas, y dudoso el resto del top-k fusionado o de alguna lista.
+    """
+    if len(candidatos) <= k:
+        return candidatos, []
+    puntajes = [candidato.get("puntaje") for candidato in candidatos]
+    if umbral <= 0 or any(puntaje is None for puntaje in puntajes):
+        return [], candidatos
+
+    senales = [
+        (campo, relativo)
+        for campo, relativo in SENALES_PREVIAS
+        if any(candidato.get(campo) is not None for candidato in candidatos)
+    ]
+    if senales and all("rrf" in candidato for candidato in candidatos):
+        ids = set.intersection(*(_seguros_de_lista(candidatos, campo, k, umbral, relativo) for campo, relativo in senales))
+        seguros = [candidato for candidato in candidatos if id(candidato) in ids]
+        dudosos = [
+            candidato
+            for orden, candidato in enumerate(candidatos)
+            if id(candidato) not in ids and (orden < k or candidato.get("posicion", k + 1) <= k)
+        ]
+        return seguros, dudosos
+
+    frontera = puntajes[k]
+    seguros = 0
+    while seguros < k and puntajes[seguros] - frontera >= umbral:
+        seguros += 1
+    limite = puntajes[k - 1] - umbral
+    dudosos = [
+        candidato
+        for candidato, puntaje in zip(candidatos[seguros:], puntajes[seguros:])
+        if puntaje >= limite or candidato.get("posicion", k + 1) <= k
+    ]
+    if dudosos and seguros == k:
+        # Un candidato fuerte en una sola lista compite por el último puesto.
+        seguros -= 1
+        dudosos.insert(0, candidatos[seguros])
+    return candidatos[:seguros], dudosos
+
+
+async def reordenar(
+    consulta: str,
+    candidatos: List[dict],
+    k: int = BUSQUEDA_K_FINAL,
+    umbral: float = RERANK_UMBRAL,
+    planificador: PlanificadorLotes = planificador_rerank,
+) -> List[dict]:
+    """
+    Los `k` mejores candidatos. El CrossEncoder solo puntúa los dudosos: si
+    la primera etapa ya separa el top-k con margen, no se llama al modelo.
+    """
+    _contar(consultas=1)
+    seguros, dudosos = dividir_por_confianza(candidatos, k, umbral)
+    if not dudosos:
+        _contar(omitidas=1)
+        return seguros[:k]
+
+    with tramo("rerank", candidatos=len(candidatos), pares=len(dudosos)):
+        puntajes = await puntuar(consulta, dudosos, planificador)
+    for fragmento, puntaje in zip(dudosos, puntajes):
+        fragmento["relevance_score"] = puntaje
+    dudosos.sort(key=lambda fragmento: fragmento["relevance_score"], reverse=True)
+    return seguros + dudosos[:k - len(seguros)]
@@ -1,49 +1,151 @@
+import logging
 from google import genai
 from google.genai import types
 from markdown import markdown
 from bs4 import BeautifulSoup
-import wave
-from app.core.config import GEMINI_API_KEY
-
-def wave_file(filename, pcm, channels=1, rate=24000, sample_width=2):
-    """Guarda los bytes PCM en un archivo WAV."""
-    with wave.open(filename, "wb") as wf:
-        wf.setnchannels(channels)
-        wf.setsampwidth(sample_width)
-        wf.setframerate(rate)
-        wf.writeframes(pcm)
-
-def text_to_speech(text: str, file_name: str = "out.wav") -> str:
-    """
-    Convierte texto a audio WAV usando Gemini 2.5 TTS.
-    """
+import asyncio
+import re
+import struct
+from typing import AsyncIterator, List, Optional
+from app.core.cache import CacheLRU, normalizar_texto
+from app.core.config import (
+    GEMINI_API_KEY,
+    TTS_CACHE_MAX,
+    TTS_CACHE_MAX_CARACTERES,
+    TTS_CACHE_MAX_MB,
+    TTS_MAX_CARACTERES_FRASE,
+    TTS_MAX_CONCURRENCIA,
+)
+from app.core.trazas import tramo
+
+log = logging.getLogger(__name__)
+
+CANALES = 1
+FRECUENCIA = 24000
+BYTES_POR_MUESTRA = 2
+
+def cabecera_wav_streaming(channels=CANALES, rate=FRECUENCIA, sample_width=BYTES_POR_MUESTRA) -> bytes:
+    """Cabecera WAV con tamaños 0xFFFFFFFF (longitud desconocida), para enviar el PCM a medida que se genera."""
+    return b"".join([
+        b"RIFF", struct.pack("<I", 0xFFFFFFFF), b"WAVE",
+        b"fmt ", struct.pack("<IHHIIHH", 16, 1, channels, rate, rate * channels * sample_width,
+                             channels * sample_width, sample_width * 8),
+        b"data", struct.pack("<I", 0xFFFFFFFF),
+    ])
+
+def texto_plano(text: str) -> str:
     html = markdown(text)
     soup = BeautifulSoup(html, "html.parser")
-    plain_text = soup.get_text()
+    return soup.get_text()
 
-    print(f"Generando audio con Gemini para: '{plain_text[:70]}...'")
+def dividir_en_frases(texto: str, max_caracteres: int = TTS_MAX_CARACTERES_FRASE) -> List[str]:
+    """Parte el texto en frases y junta las cortas hasta `max_caracteres` para no hacer llamadas diminutas."""
+    frases = [f.strip() for f in re.split(r"(?<=[.!?;:])\s+|\n+", texto) if f.strip()]
+    fragmentos = []
+    for frase in frases:
+        if fragmentos and len(fragmentos[-1]) + len(frase) + 1 <= max_caracteres:
+            fragmentos[-1] = f"{fragmentos[-1]} {frase}"
+        else:
+            fragmentos.append(frase)
+    return fragmentos
 
-    try:
-        client = genai.Client(api_key=GEMINI_API_KEY)
 
-        response = client.models.generate_content(
-            model="gemini-2.5-flash-preview-tts",
-            contents=plain_text,
-            config=types.GenerateContentConfig(
-                response_modalities=["AUDIO"],
-                speech_config=types.SpeechConfig(
-                    voice_config=types.VoiceConfig(
-                        prebuilt_voice_config=types.PrebuiltVoiceConfig(
-                            voice_name="Kore"
-                        )
+class SintetizadorGemini:
+    """Sintetiza PCM (16 bits, 24 kHz, mono) con Gemini TTS reutilizando un único cliente."""
+
+    def __init__(self, api_key: Optional[str] = GEMINI_API_KEY):
+        self.api_key = api_key
+        self._client = None
+
+    @property
+    def client(self) -> genai.Client:
+        if self._client is None:
+            self._client = genai.Client(api_key=self.api_key)
+        return self._client
+
+    def _config(self) -> types.GenerateContentConfig:
+        return types.GenerateContentConfig(
+            response_modalities=["AUDIO"],
+            speech_config=types.SpeechConfig(
+                voice_config=types.VoiceConfig(
+                    prebuilt_voice_config=types.PrebuiltVoiceConfig(
+                        voice_name="Kore"
                     )
-                ),
+                )
             ),
         )
 
-        audio_bytes = response.candidates[0].content.parts[0].inline_data.data
-        wave_file(file_name, audio_bytes)
+    async def sintetizar(self, texto: str) -> bytes:
+        response = await self.client.aio.models.generate_content(
+            model="gemini-2.5-flash-preview-tts",
+            contents=texto,
+            config=self._config(),
+        )
+        return response.candidates[0].content.parts[0].inline_data.data
+
 
+sintetizador = SintetizadorGemini()
+
+# Frase normalizada -> PCM. Las respuestas fijas ("No tengo esa información en
+# este momento.", el rechazo del guardián...) se sirven sin llamar a Gemini.
+# Solo se guardan frases cortas, que son las que se repiten; un fragmento de
+# 300 caracteres son ~1 MB de PCM y casi nunca vuelve a pedirse. El tope en
+# bytes acota la memoria por proceso aunque cambie la longitud de las frases.
+cache_audio = CacheLRU(TTS_CACHE_MAX, max_peso=int(TTS_CACHE_MAX_MB * 1024 * 1024))
+
+async def sintetizar_frase(frase: str) -> bytes:
+    cacheable = len(frase) <= TTS_CACHE_MAX_CARACTERES
+    clave = normalizar_texto(frase)
+    pcm = cache_audio.get(clave) if cacheable else None
+    if pcm is None:
+        with tramo("tts", caracteres=len(frase)):
+            pcm = await sintetizador.sintetizar(frase)
+        if cacheable:
+            cache_audio.set(clave, pcm)
+    return pcm
+
+async def text_to_speech_stream(text: str) -> AsyncIterator[bytes]:
+    """
+    Convierte texto a audio WAV por fragmentos. Todas las frases se sintetizan
+    en paralelo (hasta TTS_MAX_CONCURRENCIA a la vez) y el PCM se emite en
+    orden en cuanto está listo cada una.
+
+    Espera a que la primera frase esté sintetizada antes de devolver el
+    iterador, así un fallo de Gemini se detecta mientras todavía se puede
+    responder con otra cosa.
+    """
+    plain_text = texto_plano(text)
+    frases = dividir_en_frases(plain_text)
+    if not frases:
+        raise ValueError("No hay texto que convertir a audio.")
+
+    log.debug("Generando audio con Gemini para: '%.70s...' (%d fragmentos)", plain_text, len(frases))
+
+    semaforo = asyncio.Semaphore(TTS_MAX_CONCURRENCIA)
+
+    async def sintetizar_con_limite(frase: str) -> bytes:
+        async with semaforo:
+            return await sintetizar_frase(frase)
+
+    tareas = [asyncio.create_task(sintetizar_con_limite(frase)) for frase in frases]
+    try:
+        primera = await tareas[0]
     except Exception as e:
-        print(f"Error al generar audio con Gemini: {e}")
-        raise Exception("Error al generar el audio con Gemini.")
\ No newline at end of file
+        for tarea in tareas:
+            tarea.cancel()
+        log.warning("Error al generar audio con Gemini: %s", e)
+        raise Exception("Error al generar el audio con Gemini.")
+
+    async def emitir() -> AsyncIterator[bytes]:
+        try:
+            yield cabecera_wav_streaming()
+            yield primera
+            for tarea in tareas[1:]:
+                yield await tarea
+        except Exception as e:
+            log.warning("Error al generar audio con Gemini, se corta el audio: %s", e)
+        finally:
+            for tarea in tareas:
+                tarea.cancel()
+
+    return emitir()
@@ -1,90 +1,105 @@
+import logging
 from langchain_core.tools import tool
-import requests
-from app.core.config import URL_CLIENTS
+import httpx
+from app.core.aprobacion import esperar_aprobacion
+from app.core.cache import CacheLRU
+from app.core.cliente_http import cliente_crm
+from app.core.ejecutores import pool_red
+from app.core.config import BUSQUEDA_CANDIDATOS, CRM_CACHE_MAX, CRM_CACHE_TTL, URL_CLIENTS
 from app.services.busqueda import buscar_documentos
-from sentence_transformers.cross_encoder import CrossEncoder
 from datetime import datetime
 from app.models.schemas import BusquedaRequest
+from app.services.cache_sql import cache_consultas_sql
+from app.services.rerank import reordenar
 
-cross_encoder = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
+log = logging.getLogger(__name__)
+
+SEPARADOR_CONTEXTO = "\n\n---\n\n"
 
 @tool
-def buscar_contexto_en_documentos(consulta: str) -> str:
+async def buscar_contexto_en_documentos(consulta: str) -> str:
     """Útil para buscar información en documentos. Devuelve el contexto relevante para responder una pregunta."""
-    print(f"--- Herramienta RAG buscando contexto para: {consulta} ---")
+    log.debug("Herramienta RAG buscando contexto para: %s", consulta)
     
-    payload_busqueda = BusquedaRequest(consulta=consulta, top_k=10)
-    contexto_chunks = buscar_documentos(payload_busqueda)
+    payload_busqueda = BusquedaRequest(consulta=consulta, top_k=BUSQUEDA_CANDIDATOS)
+    contexto_chunks = await pool_red.ejecutar(buscar_documentos, payload_busqueda)
 
     if not contexto_chunks.get('resultados'):
         return "No se encontró contexto relevante en los documentos."
     
-    pares_para_rerank = [[consulta, chunk['texto']] for chunk in contexto_chunks['resultados']]
-    puntajes = cross_encoder.predict(pares_para_rerank)
-    
-    for i, chunk in enumerate(contexto_chunks['resultados']):
-        chunk['relevance_score'] = puntajes[i]
-        
-    chunks_reordenados = sorted(contexto_chunks['resultados'], key=lambda x: x['relevance_score'], reverse=True)
-    
-    contexto_final_chunks = chunks_reordenados[:3]
+    # El CrossEncoder solo reordena los candidatos que la primera etapa no separa con margen.
+    contexto_final_chunks = await reordenar(consulta, contexto_chunks['resultados'])
     
-    contexto_str = "".join(chunk['texto'] for chunk in contexto_final_chunks)
-    return contexto_str
+    return SEPARADOR_CONTEXTO.join(chunk['texto'] for chunk in contexto_final_chunks)
+
+# id -> cliente del CRM. Se invalida cuando las herramientas lo editan o eliminan.
+cache_clientes = CacheLRU(CRM_CACHE_MAX, ttl=CRM_CACHE_TTL)
 
 @tool
-def buscar_info_cliente(id: int) -> str:
+async def buscar_info_cliente(id: int) -> str:
     """Útil para los detalles de un cliente por su id en el sistema CRM."""
-    print(f"--- Herramienta CRM buscando al cliente: {id} ---")
+    log.debug("Herramienta CRM buscando al cliente: %s", id)
     if not URL_CLIENTS:
         return "Error: La URL del CRM no está configurada en las variables de entorno."
+    cliente = cache_clientes.get(id)
+    if cliente is not None:
+        return cliente
     try:
-        response = requests.get(f"{URL_CLIENTS}/{id}")
+        response = await cliente_crm.get(f"{URL_CLIENTS}/{id}")
         response.raise_for_status()
         cliente = response.json()
         if not cliente:
             return f"No se encontró ningún cliente con el id '{id}'."
+        cache_clientes.set(id, cliente)
         return cliente
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         return f"Ocurrió un error al contactar la API del CRM: {e}"
 
 @tool
-def registrar_cliente(nombre: str, email: str) -> str:
+async def registrar_cliente(nombre: str, email: str) -> str:
     """Útil para CREAR o REGISTRAR un nuevo cliente. Necesita el nombre y el email."""
-    print(f"--- Herramienta: Registrando al cliente: {nombre} ---")
+    log.info("Herramienta: Registrando al cliente: %s", nombre)
+    await esperar_aprobacion()
     if not URL_CLIENTS: return "Error: URL_CLIENTS no configurada."
     datos_cliente = {"name": nombre, "email": email, "createdAt": datetime.now().isoformat()}
     try:
-        response = requests.post(URL_CLIENTS, json=datos_cliente)
+        response = await cliente_crm.post(URL_CLIENTS, json=datos_cliente)
         response.raise_for_status()
         cliente_creado = response.json()
+        cache_consultas_sql.invalidar_tabla("clientes")
         return f"Cliente '{nombre}' registrado con éxito. Su nuevo ID es {cliente_creado['id']}."
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         return f"Error al registrar cliente: {e}"
 
 @tool
-def editar_cliente(id: int, nombre: str, email: str) -> str:
+async def editar_cliente(id: int, nombre: str, email: str) -> str:
     """Útil para ACTUALIZAR o EDITAR un cliente existente. Necesita el ID del cliente y los nuevos datos de nombre y email."""
-    print(f"--- Herramienta: Editando al cliente ID: {id} ---")
+    log.info("Herramienta: Editando al cliente ID: %s", id)
+    await esperar_aprobacion()
     if not URL_CLIENTS: return "Error: URL_CLIENTS no configurada."
     url_cliente = f"{URL_CLIENTS}/{id}"
     datos_actualizados = {"name": nombre, "email": email}
     try:
-        response = requests.put(url_cliente, json=datos_actualizados)
+        response = await cliente_crm.put(url_cliente, json=datos_actualizados)
         response.raise_for_status()
+        cache_clientes.pop(id)
+        cache_consultas_sql.invalidar_tabla("clientes")
         return f"Cliente con ID {id} actualizado correctamente."
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         return f"Error al editar cliente: {e}"
 
 @tool
-def eliminar_cliente(id: int) -> str:
+async def eliminar_cliente(id: int) -> str:
     """Útil para BORRAR o ELIMINAR un cliente del sistema. Necesita el ID del cliente."""
-    print(f"--- Herramienta: Eliminando al cliente ID: {id} ---")
+    log.info("Herramienta: Eliminando al cliente ID: %s", id)
+    await esperar_aprobacion()
     if not URL_CLIENTS: return "Error: URL_CLIENTS no configurada."
     url_cliente = f"{URL_CLIENTS}/{id}"
     try:
-        response = requests.delete(url_cliente)
+        response = await cliente_crm.delete(url_cliente)
         response.raise_for_status()
+        cache_clientes.pop(id)
+        cache_consultas_sql.invalidar_tabla("clientes")
         return f"Cliente con ID {id} eliminado correctamente."
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         return f"Error al eliminar cliente: {e}"
\ No newline at end of file
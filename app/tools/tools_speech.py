@@ -1,29 +1,46 @@
+import logging
 from langchain_core.tools import tool
 import google.generativeai as genai
-import os
-from app.core.config import GEMINI_API_KEY
+import io
+from app.core.config import GEMINI_API_KEY, MEDIOS_AUDIO_INLINE_MAX
+from app.core.medios import almacen_medios
+from app.core.recursos import recursos
 
-genai.configure(api_key=GEMINI_API_KEY)
+log = logging.getLogger(__name__)
+
+def crear_modelo_transcripcion() -> genai.GenerativeModel:
+    genai.configure(api_key=GEMINI_API_KEY)
+    return genai.GenerativeModel(model_name="gemini-2.5-flash")
+
+modelo_transcripcion = recursos.registrar("gemini_transcripcion", crear_modelo_transcripcion)
 
 @tool
-def transcribe_audio_with_gemini(audio_path: str) -> str:
+def transcribe_audio_with_gemini(audio_id: str) -> str:
     """
-    Útil para transcribir un archivo de audio a texto. Recibe la ruta a un archivo de audio local
-    y devuelve el texto contenido en él. Este debe ser el primer paso si el usuario envía una consulta de voz.
+    Útil para transcribir a texto el audio adjunto identificado por audio_id.
+    Devuelve el texto contenido en él. Este debe ser el primer paso si el usuario envía una consulta de voz.
     """
-    print(f"--- Herramienta de Transcripción transcribiendo audio en: {audio_path} ---")
+    log.debug("Herramienta de Transcripción transcribiendo audio: %s", audio_id)
+    audio = almacen_medios.obtener(audio_id)
+    if audio is None:
+        return f"No se encontró el audio {audio_id}; puede haber caducado."
+
     try:
-        gemini_audio_file = genai.upload_file(path=audio_path)
-        model = genai.GenerativeModel(model_name="gemini-2.5-flash")
-        response = model.generate_content(["Transcribe el siguiente audio:", gemini_audio_file])
-        
-        genai.delete_file(gemini_audio_file.name)
-        print(f"Archivo de Gemini eliminado: {gemini_audio_file.name}")
+        # Los clips pequeños van dentro de la propia petición; solo los grandes se suben a la Files API.
+        model = modelo_transcripcion.obtener()
+        if audio.tamano <= MEDIOS_AUDIO_INLINE_MAX:
+            response = model.generate_content(
+                ["Transcribe el siguiente audio:", {"mime_type": audio.mime, "data": audio.datos}]
+            )
+            return response.text
+
+        gemini_audio_file = genai.upload_file(path=io.BytesIO(audio.datos), mime_type=audio.mime)
+        try:
+            response = model.generate_content(["Transcribe el siguiente audio:", gemini_audio_file])
+        finally:
+            genai.delete_file(gemini_audio_file.name)
+            log.debug("Archivo de Gemini eliminado: %s", gemini_audio_file.name)
 
         return response.text
     except Exception as e:
         return f"Error al transcribir el audio: {e}"
-    finally:
-        if os.path.exists(audio_path):
-            os.remove(audio_path)
-            print(f"Archivo de audio temporal eliminado: {audio_path}")
@@ -1,10 +1,20 @@
+import logging
+import threading
+import time
+
 from langchain_core.tools import tool
 from langchain_community.agent_toolkits import create_sql_agent
 from langchain_google_genai import ChatGoogleGenerativeAI
-from app.core.config import GEMINI_API_KEY
-from app.core.sql_database import db
+from app.core.config import GEMINI_API_KEY, SQL_ESQUEMA_TTL
+from app.core.recursos import recursos
+from app.core.sql_database import crear_db, firma_esquema, recurso_sql
+from app.services.cache_sql import cache_consultas_sql, extraer_consulta
+
+log = logging.getLogger(__name__)
 
-llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", google_api_key=GEMINI_API_KEY)
+modelo_sql = recursos.registrar(
+    "gemini_sql", lambda: ChatGoogleGenerativeAI(model="gemini-2.5-flash", google_api_key=GEMINI_API_KEY)
+)
 
 table_info = {
     "clientes": ["id", "nombre", "sexo", "edad", "fecha_nacimiento"],
@@ -31,6 +41,56 @@ few_shot_examples = [
     }
 ]
 
+class AgenteSQLCacheado:
+    """
+    Construye el agente SQL una sola vez y lo reutiliza entre llamadas.
+
+    El AgentExecutor no guarda estado entre invocaciones, así que se puede
+    compartir entre peticiones concurrentes. Cada `ttl` segundos se compara la
+    firma del esquema y, si hubo DDL, se vuelve a reflejar y se reconstruye.
+    """
+
+    def __init__(self, ttl: float = SQL_ESQUEMA_TTL):
+        self.ttl = ttl
+        self._agente = None
+        self._firma = None
+        self._ultima_revision = 0.0
+        self._lock = threading.Lock()
+
+    def _construir(self, base_de_datos):
+        return create_sql_agent(
+            modelo_sql.obtener(),
+            db=base_de_datos,
+            agent_type="tool-calling",
+            table_info=table_info,
+            few_shot_examples=few_shot_examples,
+            agent_executor_kwargs={"return_intermediate_steps": True},
+        )
+
+    def obtener(self):
+        if self._agente is not None and time.monotonic() - self._ultima_revision < self.ttl:
+            return self._agente
+
+        with self._lock:
+            if self._agente is not None and time.monotonic() - self._ultima_revision < self.ttl:
+                return self._agente
+
+            firma = firma_esquema()
+            if self._agente is None:
+                self._agente = self._construir(recurso_sql.obtener())
+            elif firma != self._firma:
+                log.info("Cambió el esquema de la base de datos, reconstruyendo el agente SQL")
+                self._agente = self._construir(crear_db())
+            self._firma = firma
+            self._ultima_revision = time.monotonic()
+            return self._agente
+
+    def invalidar(self) -> None:
+        """Fuerza la revisión del esquema en la próxima llamada."""
+        self._ultima_revision = 0.0
+
+agente_sql = AgenteSQLCacheado()
+
 @tool
 def consultar_base_de_datos_clientes(consulta_en_lenguaje_natural: str) -> str:
     """
@@ -50,26 +110,25 @@ def consultar_base_de_datos_clientes(consulta_en_lenguaje_natural: str) -> str:
     El agente se encarga de traducir estas preguntas a SQL automáticamente y devolver los resultados.
     """
     
-    print(f"--- Herramienta SQL recibiendo consulta: {consulta_en_lenguaje_natural} ---")
+    log.debug("Herramienta SQL recibiendo consulta: %s", consulta_en_lenguaje_natural)
     
     try:
-        sql_agent_executor = create_sql_agent(
-            llm,
-            db=db,
-            agent_type="tool-calling",
-            verbose=True,
-            table_info=table_info,
-            few_shot_examples=few_shot_examples
-        )
-        
+        respuesta_cacheada = cache_consultas_sql.buscar(consulta_en_lenguaje_natural)
+        if respuesta_cacheada is not None:
+            return respuesta_cacheada
+
+        sql_agent_executor = agente_sql.obtener()
+
         response = sql_agent_executor.invoke({"input": consulta_en_lenguaje_natural})
-        
-        if hasattr(response, "intermediate_steps"):
-            for step in response.intermediate_steps:
-                if "sql" in step:
-                    print(f"SQL generada: {step['sql']}")
-        
-        return response.get("output", "No se pudo obtener una respuesta de la base de datos.")
+        respuesta = response.get("output", "No se pudo obtener una respuesta de la base de datos.")
+
+        consulta = extraer_consulta(response.get("intermediate_steps", []))
+        if consulta:
+            sql, filas = consulta
+            log.debug("SQL generada: %s", sql)
+            cache_consultas_sql.guardar(consulta_en_lenguaje_natural, sql, filas, respuesta)
+
+        return respuesta
     
     except Exception as e:
         return f"Error al consultar la base de datos con SQL: {e}"
\ No newline at end of file
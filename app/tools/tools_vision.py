@@ -1,32 +1,38 @@
+import logging
 from langchain_core.tools import tool
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage
 from app.core.config import GEMINI_API_KEY
-import os
-import base64
+from app.core.medios import almacen_medios
+from app.core.recursos import recursos
+
+log = logging.getLogger(__name__)
+
+modelo_vision = recursos.registrar(
+    "gemini_vision", lambda: ChatGoogleGenerativeAI(model="gemini-2.5-flash", google_api_key=GEMINI_API_KEY)
+)
 
 @tool
-def analyze_image_with_gemini_vision(user_prompt:str, image_path: str) -> str:
+def analyze_image_with_gemini_vision(user_prompt:str, image_id: str) -> str:
     """
-    Analiza el contenido de una imagen ubicada en la ruta (image_path) y devuelve una descripción segun el texto que el usuario envió como prompt.
+    Analiza el contenido de la imagen adjunta identificada por image_id y devuelve una descripción segun el texto que el usuario envió como prompt.
     Esta herramienta es el primer paso para responder cualquier pregunta sobre una imagen.
     Debe ser invocada antes de intentar responder a una pregunta que involucre una imagen.
     """
-    print(f"--- Herramienta de Visión describiendo imagen en: {image_path} ---")
+    log.debug("Herramienta de Visión describiendo imagen: %s", image_id)
     try:
-        llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash", google_api_key=GEMINI_API_KEY)
-
-        with open(image_path, "rb") as f:
-            image_base64 = base64.b64encode(f.read()).decode("utf-8")
+        imagen = almacen_medios.obtener(image_id)
+        if imagen is None:
+            return f"No se encontró la imagen {image_id}; puede haber caducado."
 
         message = HumanMessage(
             content=[
                 {"type": "text", "text": user_prompt},
-                {"type": "image_url", "image_url": f"data:image/jpeg;base64,{image_base64}"},
+                {"type": "image_url", "image_url": imagen.data_url},
             ]
         )
 
-        response = llm.invoke([message])
+        response = modelo_vision.obtener().invoke([message])
 
         if isinstance(response.content, str):
             return response.content
@@ -35,11 +41,4 @@ def analyze_image_with_gemini_vision(user_prompt:str, image_path: str) -> str:
 
         return str(response.content)
     except Exception as e:
-        return f"Error al analizar la imagen desde la ruta {image_path}: {e}"
-    finally:
-        try:
-            if os.path.exists(image_path):
-                os.remove(image_path)
-                print(f"Archivo eliminado: {image_path}")
-        except Exception as del_error:
-            print(f"No se pudo eliminar {image_path}: {del_error}")
\ No newline at end of file
+        return f"Error al analizar la imagen {image_id}: {e}"
@@ -0,0 +1,62 @@
+"""
+Mide el coste de preparación que se ahorra al reutilizar el agente SQL:
+antes cada llamada a consultar_base_de_datos_clientes ejecutaba
+create_sql_agent (toolkit, prompt y agente), ahora solo se construye una vez.
+
+Usa una base SQLite sembrada desde data_clients.sql y un modelo de chat
+falso, así que solo se mide el código propio y el de LangChain.
+
+Uso:
+    python -m benchmarks.bench_agente_sql --llamadas 200
+"""
+import argparse
+import os
+import statistics
+import time
+
+from benchmarks.fakes import crear_sqlite_de_prueba
+
+os.environ["DATABASE_URL"] = crear_sqlite_de_prueba("/tmp/bench_agente_sql.db")
+os.environ.setdefault("GEMINI_API_KEY", "clave-falsa")
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+
+from app.core.sql_database import crear_db, recurso_sql
+from app.tools import tools_sql
+
+
+class ChatSinHerramientas(GenericFakeChatModel):
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+
+def medir(funcion, llamadas: int) -> list:
+    tiempos = []
+    for _ in range(llamadas):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--llamadas", type=int, default=200)
+    args = parser.parse_args()
+
+    tools_sql.llm = ChatSinHerramientas(messages=iter([]))
+    cacheado = tools_sql.AgenteSQLCacheado(ttl=60)
+
+    resultados = {
+        "por llamada": medir(lambda: cacheado._construir(recurso_sql.obtener()), args.llamadas),
+        "por llamada + reflexión": medir(lambda: cacheado._construir(crear_db()), args.llamadas),
+        "cacheado": medir(cacheado.obtener, args.llamadas),
+    }
+
+    print(f"{'preparación':>24} {'p50 (ms)':>10} {'media (ms)':>11}")
+    for nombre, tiempos in resultados.items():
+        print(f"{nombre:>24} {statistics.median(tiempos):>10.3f} {statistics.mean(tiempos):>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Tiempo de arranque: cuánto tarda `import app.main` en un proceso nuevo y
+cuánto tarda después el precalentamiento en dejar todos los recursos
+cargados (lo que antes se pagaba entero durante el import).
+
+Cada medición corre en un subproceso para partir de un intérprete frío. Con
+--supabase-falso no hacen falta credenciales de Supabase; con --sqlite se usa
+la base de `data_clients.sql` en SQLite en lugar de DATABASE_URL.
+
+Uso:
+    python -m benchmarks.bench_arranque --supabase-falso --sqlite --repeticiones 3
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+PROGRAMA = r"""
+import asyncio, json, sys, time
+if {supabase_falso}:
+    from benchmarks.fakes import instalar_supabase_falso
+    instalar_supabase_falso()
+inicio = time.perf_counter()
+import app.main
+importado = time.perf_counter() - inicio
+
+from app.core.recursos import recursos
+inicio = time.perf_counter()
+asyncio.run(recursos.calentar())
+calentado = time.perf_counter() - inicio
+print(json.dumps({{"import": importado, "calentamiento": calentado, "recursos": recursos.estado()}}))
+"""
+
+
+def medir(supabase_falso: bool, entorno: dict) -> dict:
+    salida = subprocess.run(
+        [sys.executable, "-c", PROGRAMA.format(supabase_falso=supabase_falso)],
+        capture_output=True, text=True, env=entorno, check=True,
+    )
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeticiones", type=int, default=3)
+    parser.add_argument("--supabase-falso", action="store_true")
+    parser.add_argument("--sqlite", action="store_true")
+    args = parser.parse_args()
+
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    entorno = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [raiz, os.environ.get("PYTHONPATH")]))}
+    with tempfile.TemporaryDirectory() as directorio:
+        if args.sqlite:
+            from benchmarks.fakes import crear_sqlite_de_prueba
+
+            entorno["DATABASE_URL"] = crear_sqlite_de_prueba(os.path.join(directorio, "clientes.db"))
+
+        mediciones = [medir(args.supabase_falso, entorno) for _ in range(args.repeticiones)]
+
+    importe = statistics.median(m["import"] for m in mediciones)
+    calentamiento = statistics.median(m["calentamiento"] for m in mediciones)
+    print(f"import app.main:  {importe:6.2f} s   (el servidor ya acepta conexiones y /salud/vivo responde)")
+    print(f"calentamiento:    {calentamiento:6.2f} s   (hasta que /salud/listo responde 200)")
+    print(f"total:            {importe + calentamiento:6.2f} s   (lo que costaba el import antes)")
+    print("\nRecursos (última medición):")
+    for nombre, estado in mediciones[-1]["recursos"].items():
+        if estado["cargado"]:
+            print(f"  {nombre:<22} {estado['segundos_carga']:6.2f} s")
+        else:
+            print(f"  {nombre:<22}  error: {estado['error']}")
+
+
+if __name__ == "__main__":
+    main()
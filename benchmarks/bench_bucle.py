@@ -0,0 +1,131 @@
+"""
+Retraso del event loop con tráfico mixto: trabajo de CPU, llamadas de red
+bloqueantes y escrituras a disco, hechas dentro del loop (como antes) o en los
+pools acotados de `app.core.ejecutores`.
+
+Una sonda duerme 5 ms en bucle y mide cuánto tarda de más en despertar; eso
+es lo que espera cualquier otra petición para ser atendida. Al final se lanza
+una ráfaga mayor que la cola del pool de red para ver el rechazo (503).
+
+Uso:
+    python -m benchmarks.bench_bucle --peticiones 200 --concurrencia 32
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from app.core.ejecutores import EjecutorAcotado, PoolSaturado, pool_cpu, pool_disco, pool_red
+
+
+def trabajo_cpu(ms: float) -> int:
+    fin = time.perf_counter() + ms / 1000
+    n = 0
+    while time.perf_counter() < fin:
+        n += 1
+    return n
+
+
+def trabajo_red(ms: float) -> None:
+    time.sleep(ms / 1000)
+
+
+def trabajo_disco(ruta: str, kb: int) -> None:
+    with open(ruta, "wb") as f:
+        f.write(os.urandom(kb * 1024))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+async def sonda(parar: asyncio.Event, retrasos: list, intervalo: float = 0.005) -> None:
+    while not parar.is_set():
+        inicio = time.perf_counter()
+        await asyncio.sleep(intervalo)
+        retrasos.append((time.perf_counter() - inicio - intervalo) * 1000)
+
+
+async def peticion(i: int, en_pools: bool, directorio: str, args) -> None:
+    ruta = os.path.join(directorio, f"{i % 8}.bin")
+    pasos = [
+        (pool_cpu, trabajo_cpu, (args.cpu_ms,)),
+        (pool_red, trabajo_red, (args.red_ms,)),
+        (pool_disco, trabajo_disco, (ruta, args.disco_kb)),
+    ]
+    for pool, funcion, argumentos in pasos:
+        if en_pools:
+            await pool.ejecutar(funcion, *argumentos)
+        else:
+            funcion(*argumentos)
+        await asyncio.sleep(0)
+
+
+async def escenario(en_pools: bool, args, directorio: str) -> dict:
+    retrasos = []
+    parar = asyncio.Event()
+    tarea_sonda = asyncio.create_task(sonda(parar, retrasos))
+    semaforo = asyncio.Semaphore(args.concurrencia)
+
+    async def limitada(i: int):
+        async with semaforo:
+            await peticion(i, en_pools, directorio, args)
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(limitada(i) for i in range(args.peticiones)))
+    duracion = time.perf_counter() - inicio
+    parar.set()
+    await tarea_sonda
+
+    retrasos.sort()
+    return {
+        "rps": args.peticiones / duracion,
+        "retraso_p50": statistics.median(retrasos),
+        "retraso_p99": retrasos[min(len(retrasos) - 1, int(len(retrasos) * 0.99))],
+        "retraso_max": retrasos[-1],
+    }
+
+
+async def rafaga(n: int) -> dict:
+    pool = EjecutorAcotado("rafaga", trabajadores=4, max_cola=16)
+    resultados = await asyncio.gather(
+        *(pool.ejecutar(trabajo_red, 50) for _ in range(n)), return_exceptions=True
+    )
+    pool.shutdown()
+    rechazadas = sum(isinstance(r, PoolSaturado) for r in resultados)
+    return {"aceptadas": n - rechazadas, "rechazadas": rechazadas}
+
+
+async def main_async(args) -> None:
+    with tempfile.TemporaryDirectory() as directorio:
+        for nombre, en_pools in (("en el loop", False), ("en pools", True)):
+            r = await escenario(en_pools, args, directorio)
+            print(
+                f"{nombre:<11} {r['rps']:7.1f} req/s   retraso del loop p50 {r['retraso_p50']:7.2f} ms"
+                f"   p99 {r['retraso_p99']:7.2f} ms   máx {r['retraso_max']:7.2f} ms"
+            )
+
+    print("\nPools tras la carga:")
+    for pool in (pool_cpu, pool_red, pool_disco):
+        e = pool.estadisticas()
+        print(
+            f"  {pool.nombre:<6} trabajadores {e['trabajadores']:3d}   completadas {e['completadas']:5d}"
+            f"   espera p50 {e['espera_ms_p50']:7.2f} ms   p95 {e['espera_ms_p95']:7.2f} ms"
+        )
+
+    r = await rafaga(64)
+    print(f"\nRáfaga de 64 tareas contra un pool de 4 trabajadores y cola 16: {r}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--peticiones", type=int, default=200)
+    parser.add_argument("--concurrencia", type=int, default=32)
+    parser.add_argument("--cpu-ms", type=float, default=5)
+    parser.add_argument("--red-ms", type=float, default=40)
+    parser.add_argument("--disco-kb", type=int, default=256)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""
+Prueba de carga sin red de la aplicación completa (middleware, guardián,
+historial, agente y herramientas) dentro del proceso. Gemini, Supabase, el
+CRM, los modelos de embeddings y rerank y el TTS son los dobles de
+`benchmarks.fakes` con latencias configurables, así que lo que se mide es
+el coste del código propio y su comportamiento con concurrencia.
+
+Por cada escenario de `benchmarks.escenarios` (rag, sql, imagen, voz,
+sesion_larga) informa del rendimiento (peticiones/s), la latencia p50/p95/p99
+y los mismos percentiles por etapa, sacados de la traza de cada petición.
+Cada ejecución se añade a `--resultados` con el commit actual, y
+`--comparar` la contrasta con la última de otro commit (o con la del commit
+indicado) para detectar regresiones.
+
+Uso:
+    python -m benchmarks.bench_carga --peticiones 100 --concurrencia 16
+    python -m benchmarks.bench_carga --escenarios rag sql --comparar
+    python -m benchmarks.bench_carga --comparar 1a2b3c4 --umbral 15
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import time
+from collections import defaultdict
+
+from benchmarks.fakes import (
+    ChatGuionado,
+    CrossEncoderFalso,
+    GuardianFalso,
+    ModeloEmbeddingsFalso,
+    ServidorCRMFalso,
+    SintetizadorFalso,
+    SupabaseFalso,
+    TranscriptorFalso,
+    crear_sqlite_de_prueba,
+    instalar_supabase_falso,
+)
+
+supabase_falso = instalar_supabase_falso(SupabaseFalso())
+crm_falso = ServidorCRMFalso()
+os.environ["URL_CLIENTS"] = crm_falso.url
+os.environ["DATABASE_URL"] = crear_sqlite_de_prueba("/tmp/bench_carga.db")
+os.environ["RECUPERADOR"] = "supabase"
+os.environ["PRECARGAR_RECURSOS"] = "false"
+os.environ.setdefault("GEMINI_API_KEY", "clave-falsa")
+os.environ.setdefault("LOG_NIVEL", "WARNING")
+
+import httpx
+from langchain_core.messages import AIMessage
+
+from app.core.recursos import recursos
+from app.core.trazas import observar_trazas
+from app.main import app, lifespan
+from app.services import tts_service
+from benchmarks.bench_inferencia import percentil
+from benchmarks.escenarios import ESCENARIOS, documentos_sinteticos, guion_agente, guion_sql, transcripcion
+
+RESULTADOS = ".benchmarks/carga.jsonl"
+
+# Id de petición -> segundos por etapa; lo rellena el observador de trazas.
+etapas_por_peticion = {}
+observar_trazas(lambda traza: etapas_por_peticion.__setitem__(traza.id_peticion, traza.totales()))
+
+
+def instalar_dobles(args) -> None:
+    """Sustituye las fábricas de los recursos perezosos antes de la primera petición."""
+    guardian = GuardianFalso(latencia_ms=args.ms_guardian)
+    sustitutos = {
+        "embeddings": ModeloEmbeddingsFalso,
+        "rerank": lambda: CrossEncoderFalso(ms_por_par=args.ms_rerank_par),
+        "gemini_agente": lambda: ChatGuionado(model="agente", guion=guion_agente, latencia_ms=args.ms_llm),
+        "guardian": lambda: guardian,
+        "guardian_lote": lambda: guardian,
+        "gemini_sql": lambda: ChatGuionado(model="sql", guion=guion_sql, latencia_ms=args.ms_llm),
+        "gemini_vision": lambda: ChatGuionado(
+            model="vision",
+            respuestas=[AIMessage(content="La imagen muestra un degradado de colores con ruido.")],
+            latencia_ms=args.ms_llm,
+        ),
+        "gemini_transcripcion": lambda: TranscriptorFalso(transcripcion, latencia_ms=args.ms_llm),
+        "gemini_resumen": lambda: ChatGuionado(
+            model="resumen",
+            respuestas=[AIMessage(content="El usuario consultó datos de clientes, políticas y preferencias de contacto.")],
+            latencia_ms=args.ms_llm,
+        ),
+    }
+    for nombre, fabrica in sustitutos.items():
+        recursos[nombre].fabrica = fabrica
+    tts_service.sintetizador = SintetizadorFalso(latencia_ms=args.ms_tts)
+
+    supabase_falso.latencia = args.ms_supabase / 1000
+    crm_falso.latencia = args.ms_crm / 1000
+    documentos = documentos_sinteticos()
+    vectores = ModeloEmbeddingsFalso().encode([documento["texto"] for documento in documentos]).tolist()
+    supabase_falso.table("documentos").insert([
+        {**documento, "embedding": vector} for documento, vector in zip(documentos, vectores)
+    ]).execute()
+    for numero in range(1, 11):
+        crm_falso.clientes[numero] = {"id": numero, "name": f"Cliente {numero}", "email": f"cliente{numero}@ejemplo.com"}
+
+
+def resumen_percentiles(valores_ms: list) -> dict:
+    return {
+        "n": len(valores_ms),
+        "p50": round(statistics.median(valores_ms), 2),
+        "p95": round(percentil(valores_ms, 95), 2),
+        "p99": round(percentil(valores_ms, 99), 2),
+    }
+
+
+async def ejecutar_escenario(cliente: httpx.AsyncClient, nombre: str, args) -> dict:
+    secuencias = ESCENARIOS[nombre](args.peticiones)
+    # Las primeras peticiones cargan los dobles y llenan las caches de arranque; no se miden.
+    calentamiento = [
+        [{**payload, "session_id": f"calentamiento-{payload['session_id']}"} for payload in secuencia]
+        for secuencia in ESCENARIOS[nombre](args.calentamiento)
+    ]
+    latencias = []
+    errores = 0
+    semaforo = asyncio.Semaphore(args.concurrencia)
+
+    async def recorrer(numero: int, secuencia: list, medir: bool) -> None:
+        nonlocal errores
+        async with semaforo:
+            for turno, payload in enumerate(secuencia):
+                identificador = f"{nombre}-{numero}-{turno}" if medir else f"calentamiento-{nombre}-{numero}-{turno}"
+                inicio = time.perf_counter()
+                # aread: en voz la respuesta es audio en streaming y cuenta hasta el último byte.
+                async with cliente.stream("POST", "/agent/", json=payload, headers={"X-Request-ID": identificador}) as respuesta:
+                    await respuesta.aread()
+                if medir:
+                    latencias.append((time.perf_counter() - inicio) * 1000)
+                    errores += respuesta.status_code != 200
+
+    await asyncio.gather(*(recorrer(numero, secuencia, False) for numero, secuencia in enumerate(calentamiento)))
+
+    inicio = time.perf_counter()
+    await asyncio.gather(*(recorrer(numero, secuencia, True) for numero, secuencia in enumerate(secuencias)))
+    segundos = time.perf_counter() - inicio
+
+    etapas = defaultdict(list)
+    for identificador, totales in etapas_por_peticion.items():
+        if identificador.startswith(f"{nombre}-"):
+            for etapa, duracion in totales.items():
+                etapas[etapa].append(duracion * 1000)
+    return {
+        "peticiones": len(latencias),
+        "errores": errores,
+        "segundos": round(segundos, 3),
+        "rps": round(len(latencias) / segundos, 2),
+        "latencia": resumen_percentiles(latencias),
+        "etapas": {etapa: resumen_percentiles(valores) for etapa, valores in sorted(etapas.items())},
+    }
+
+
+def commit_actual() -> tuple:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+        cambios = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True).stdout
+        return commit, bool(cambios.strip())
+    except (OSError, subprocess.CalledProcessError):
+        return "desconocido", False
+
+
+def imprimir(resultado: dict) -> None:
+    for nombre, escenario in resultado["escenarios"].items():
+        latencia = escenario["latencia"]
+        print(
+            f"\n{nombre}: {escenario['peticiones']} peticiones, {escenario['errores']} errores, "
+            f"{escenario['rps']:.1f} peticiones/s; latencia p50 {latencia['p50']:.0f} ms, "
+            f"p95 {latencia['p95']:.0f} ms, p99 {latencia['p99']:.0f} ms"
+        )
+        print(f"  {'etapa':<42} {'n':>6} {'p50 (ms)':>9} {'p95 (ms)':>9} {'p99 (ms)':>9}")
+        for etapa, valores in escenario["etapas"].items():
+            print(f"  {etapa:<42} {valores['n']:>6} {valores['p50']:>9.2f} {valores['p95']:>9.2f} {valores['p99']:>9.2f}")
+
+
+def cargar_resultados(ruta: str) -> list:
+    if not os.path.exists(ruta):
+        return []
+    with open(ruta, encoding="utf-8") as f:
+        return [json.loads(linea) for linea in f if linea.strip()]
+
+
+def elegir_referencia(anteriores: list, actual: dict, commit: str):
+    """La última ejecución del commit pedido o, sin commit, la última de un commit distinto al actual."""
+    if commit:
+        candidatas = [r for r in anteriores if r["commit"].startswith(commit)]
+    else:
+        candidatas = [r for r in anteriores if r["commit"] != actual["commit"]] or anteriores
+    return candidatas[-1] if candidatas else None
+
+
+def variacion(antes: float, despues: float) -> float:
+    return (despues - antes) / antes * 100 if antes else 0.0
+
+
+def comparar(referencia: dict, actual: dict, umbral: float, umbral_ms: float) -> int:
+    """
+    Imprime la comparación y devuelve cuántas métricas empeoraron más de
+    `umbral` por ciento (y, las de tiempo, también más de `umbral_ms`).
+    """
+    print(
+        f"\nComparación con {referencia['commit']} ({referencia['fecha']}); "
+        f"regresión si empeora más de un {umbral:.0f} % y más de {umbral_ms:g} ms"
+    )
+    if referencia["parametros"] != actual["parametros"]:
+        print("  aviso: los parámetros de las dos ejecuciones no coinciden")
+    regresiones = 0
+
+    def linea(nombre: str, antes: float, despues: float, mas_es_peor: bool = True) -> None:
+        nonlocal regresiones
+        cambio = variacion(antes, despues)
+        # Las etapas de décimas de milisegundo varían mucho en proporción sin importar.
+        empeora = cambio > umbral and despues - antes > umbral_ms if mas_es_peor else cambio < -umbral
+        regresiones += empeora
+        print(f"  {nombre:<50} {antes:>10.2f} -> {despues:>10.2f} {cambio:>+8.1f} %{'  REGRESIÓN' if empeora else ''}")
+
+    for nombre, escenario in actual["escenarios"].items():
+        anterior = referencia["escenarios"].get(nombre)
+        if anterior is None:
+            continue
+        print(f"\n  {nombre}")
+        linea("peticiones/s", anterior["rps"], escenario["rps"], mas_es_peor=False)
+        for percentil_ in ("p50", "p95", "p99"):
+            linea(f"latencia {percentil_} (ms)", anterior["latencia"][percentil_], escenario["latencia"][percentil_])
+        for etapa, valores in escenario["etapas"].items():
+            if etapa in anterior["etapas"]:
+                linea(f"{etapa} p95 (ms)", anterior["etapas"][etapa]["p95"], valores["p95"])
+    return regresiones
+
+
+async def principal(args) -> dict:
+    instalar_dobles(args)
+    transporte = httpx.ASGITransport(app=app)
+    escenarios = {}
+    with crm_falso:
+        async with lifespan(app), httpx.AsyncClient(transport=transporte, base_url="http://bench", timeout=None) as cliente:
+            for nombre in args.escenarios:
+                escenarios[nombre] = await ejecutar_escenario(cliente, nombre, args)
+    return escenarios
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--escenarios", nargs="+", choices=list(ESCENARIOS), default=list(ESCENARIOS))
+    parser.add_argument("--peticiones", type=int, default=100, help="peticiones medidas por escenario")
+    parser.add_argument("--concurrencia", type=int, default=16)
+    parser.add_argument("--calentamiento", type=int, default=5, help="peticiones por escenario que no se miden")
+    parser.add_argument("--ms-llm", type=float, default=50)
+    parser.add_argument("--ms-guardian", type=float, default=20)
+    parser.add_argument("--ms-supabase", type=float, default=5)
+    parser.add_argument("--ms-crm", type=float, default=10)
+    parser.add_argument("--ms-tts", type=float, default=30)
+    parser.add_argument("--ms-rerank-par", type=float, default=0.2)
+    parser.add_argument("--resultados", default=RESULTADOS, help="JSONL donde se acumulan las ejecuciones")
+    parser.add_argument("--comparar", nargs="?", const="", default=None, metavar="COMMIT",
+                        help="compara con la última ejecución de COMMIT o, sin valor, de otro commit")
+    parser.add_argument("--umbral", type=float, default=10, help="porcentaje de empeoramiento que cuenta como regresión")
+    parser.add_argument("--umbral-ms", type=float, default=1, help="empeoramiento mínimo en ms de una latencia para contar")
+    args = parser.parse_args()
+
+    commit, cambios_sin_commit = commit_actual()
+    parametros = {
+        clave: valor for clave, valor in vars(args).items()
+        if clave not in ("escenarios", "resultados", "comparar", "umbral", "umbral_ms")
+    }
+    resultado = {
+        "fecha": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "cambios_sin_commit": cambios_sin_commit,
+        "parametros": parametros,
+        "escenarios": asyncio.run(principal(args)),
+    }
+    imprimir(resultado)
+
+    anteriores = cargar_resultados(args.resultados)
+    os.makedirs(os.path.dirname(args.resultados) or ".", exist_ok=True)
+    with open(args.resultados, "a", encoding="utf-8") as f:
+        f.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+    print(f"\nResultados añadidos a {args.resultados} (commit {commit}{', con cambios sin commit' if cambios_sin_commit else ''})")
+
+    if args.comparar is not None:
+        referencia = elegir_referencia(anteriores, resultado, args.comparar)
+        if referencia is None:
+            print("No hay ejecuciones anteriores con las que comparar.")
+        elif comparar(referencia, resultado, args.umbral, args.umbral_ms):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Tamaño del prompt y latencia frente a la longitud de la sesión con tres
+formas de pasar el historial al agente:
+
+- completo: todos los mensajes de la sesión;
+- ventana fija: los últimos HISTORIAL_VENTANA mensajes (el comportamiento anterior);
+- acotado: `ContextoHistorial` (ventana por tokens + resumen + turnos recuperados).
+
+Las sesiones son sintéticas; en los primeros turnos el usuario da datos de
+un cliente por los que se pregunta al final, y "recuerda" indica si esos
+datos llegan al prompt de la última pregunta. Los embeddings son bolsas de
+palabras con hash, el resumen es extractivo (con `--ms-resumen` de
+latencia simulada) y la latencia del LLM es un modelo lineal en los tokens
+del prompt (`--ms-base` + `--ms-por-1k-tokens`), no una medida real.
+
+Uso:
+    python -m benchmarks.bench_contexto --turnos 10 25 50 100 200
+"""
+import argparse
+import asyncio
+import random
+import re
+import statistics
+import time
+import zlib
+
+import numpy as np
+
+from benchmarks.fakes import instalar_supabase_falso
+
+supabase_falso = instalar_supabase_falso()
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from app.core.cache import normalizar_texto
+from app.core.cache_sesiones import CacheSesiones
+from app.core.config import HISTORIAL_MAX_TOKENS, HISTORIAL_RESUMEN_MAX_TOKENS, HISTORIAL_VENTANA
+from app.services.contexto_historial import CARACTERES_POR_TOKEN, ContextoHistorial, estimar_tokens, texto_mensaje
+from benchmarks.bench_inferencia import percentil
+
+DIMENSION = 256
+
+TEMAS = ["facturación", "pedidos", "envíos", "devoluciones", "contratos", "incidencias", "descuentos", "pagos"]
+
+
+def embeber_bolsa(textos):
+    """Suma de vectores pseudoaleatorios por palabra: similitud alta si comparten palabras."""
+    vectores = []
+    for texto in textos:
+        vector = np.zeros(DIMENSION, dtype=np.float32)
+        for palabra in normalizar_texto(texto).split():
+            if len(palabra) > 3:
+                vector += np.random.default_rng(zlib.crc32(palabra.encode())).normal(size=DIMENSION)
+        vectores.append(vector.tolist())
+    return vectores
+
+
+def resumidor_extractivo(latencia_ms: float):
+    """
+    Como pide `prompt_resumen`, conserva primero las frases con ids, códigos o
+    emails y rellena con las preguntas más recientes hasta el límite.
+    """
+    limite = HISTORIAL_RESUMEN_MAX_TOKENS * CARACTERES_POR_TOKEN
+    datos = re.compile(r"[A-Z]{2}-\d+|@")
+
+    async def resumir(resumen, mensajes):
+        await asyncio.sleep(latencia_ms / 1000)
+        frases = [f for f in resumen.split(" | ") if f]
+        frases += [texto_mensaje(m)[:100] for m in mensajes if isinstance(m, HumanMessage)]
+        ordenadas = [f for f in frases if datos.search(f)] + [f for f in reversed(frases) if not datos.search(f)]
+        conservadas = []
+        for frase in ordenadas:
+            if len(" | ".join(conservadas + [frase])) > limite:
+                break
+            conservadas.append(frase)
+        return " | ".join(conservadas)
+
+    return resumir
+
+
+def conversacion(turnos: int, semilla: int = 0):
+    """Pares (pregunta, respuesta) con el dato a recordar en el segundo turno y la pregunta final."""
+    rng = random.Random(semilla)
+    pares = []
+    for numero in range(turnos):
+        tema = rng.choice(TEMAS)
+        pregunta = f"Consulta {numero} sobre {tema} del trimestre, ¿qué ha cambiado respecto al mes anterior?"
+        respuesta = " ".join(
+            f"En {tema} el indicador {rng.randrange(100)} subió un {rng.randrange(30)} por ciento."
+            for _ in range(rng.randint(4, 8))
+        )
+        pares.append((pregunta, respuesta))
+    pares[1] = (
+        "Apunta que el cliente Zubizarreta tiene el contrato ZX-4821 y su contacto es zubi@ejemplo.com.",
+        "Anotado: Zubizarreta, contrato ZX-4821, contacto zubi@ejemplo.com.",
+    )
+    return pares, "¿Cuál era el contrato del cliente Zubizarreta?"
+
+
+def tokens(mensajes) -> int:
+    return sum(estimar_tokens(mensaje) for mensaje in mensajes)
+
+
+def recuerda(mensajes) -> bool:
+    return any("ZX-4821" in texto_mensaje(mensaje) for mensaje in mensajes)
+
+
+async def medir(turnos: int, args) -> dict:
+    pares, pregunta_final = conversacion(turnos)
+    sesiones = CacheSesiones(client=supabase_falso)
+    contexto = ContextoHistorial(sesiones=sesiones, resumir=resumidor_extractivo(args.ms_resumen), embeber=embeber_bolsa)
+    session_id = f"bench-{turnos}"
+    historial = sesiones.historial(session_id)
+
+    completos = []
+    tiempos_ms = []
+    for pregunta, respuesta in pares + [(pregunta_final, None)]:
+        mensajes = await historial.aget_messages()
+        inicio = time.perf_counter()
+        acotado = await contexto.construir(session_id, mensajes, pregunta)
+        tiempos_ms.append((time.perf_counter() - inicio) * 1000)
+        if respuesta is None:
+            break
+        nuevos = [HumanMessage(content=pregunta), AIMessage(content=respuesta)]
+        historial.add_messages(nuevos)
+        completos.extend(nuevos)
+        # El servidor lo lanza después de responder; aquí se espera para que el turno siguiente lo vea.
+        contexto.programar_resumen(session_id)
+        await contexto.esperar_resumenes()
+
+    fija = completos[-HISTORIAL_VENTANA:]
+    return {
+        "turnos": turnos,
+        "completo": (tokens(completos), recuerda(completos)),
+        "fija": (tokens(fija), recuerda(fija)),
+        "acotado": (tokens(acotado), recuerda(acotado)),
+        "construir_p50": statistics.median(tiempos_ms),
+        "construir_p95": percentil(tiempos_ms, 95),
+        "resumenes": contexto.metricas["resumenes"],
+    }
+
+
+async def principal(args) -> None:
+    print(
+        f"presupuesto {HISTORIAL_MAX_TOKENS} tokens, ventana fija {HISTORIAL_VENTANA} mensajes; "
+        f"latencia LLM estimada = {args.ms_base:.0f} ms + {args.ms_por_1k_tokens:.0f} ms por 1k tokens"
+    )
+    print(
+        f"{'turnos':>7} | {'tokens completo':>15} {'fija':>6} {'acotado':>8} | "
+        f"{'LLM completo (ms)':>17} {'fija':>6} {'acotado':>8} | {'recuerda c/f/a':>14} | "
+        f"{'construir p50/p95 (ms)':>22} {'resúmenes':>9}"
+    )
+    for turnos in args.turnos:
+        r = await medir(turnos, args)
+        latencias = [args.ms_base + r[clave][0] * args.ms_por_1k_tokens / 1000 for clave in ("completo", "fija", "acotado")]
+        marcas = "/".join("sí" if r[clave][1] else "no" for clave in ("completo", "fija", "acotado"))
+        print(
+            f"{turnos:>7} | {r['completo'][0]:>15} {r['fija'][0]:>6} {r['acotado'][0]:>8} | "
+            f"{latencias[0]:>17.0f} {latencias[1]:>6.0f} {latencias[2]:>8.0f} | {marcas:>14} | "
+            f"{r['construir_p50']:>10.2f} / {r['construir_p95']:<9.2f} {r['resumenes']:>9}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turnos", type=int, nargs="+", default=[10, 25, 50, 100, 200])
+    parser.add_argument("--ms-resumen", type=float, default=0)
+    parser.add_argument("--ms-base", type=float, default=400)
+    parser.add_argument("--ms-por-1k-tokens", type=float, default=150)
+    asyncio.run(principal(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Compara la latencia por turno del historial con blob JSON (una fila por
+sesión, reescrita completa en cada turno) frente al historial con una fila
+por mensaje y lectura acotada.
+
+Uso:
+    python -m benchmarks.bench_historial --turnos 2000
+"""
+import argparse
+import statistics
+import time
+
+from benchmarks.fakes import instalar_supabase_falso
+
+supabase_falso = instalar_supabase_falso()
+
+from langchain_core.messages import AIMessage, HumanMessage, messages_from_dict, messages_to_dict
+
+from app.core.memory import SupabaseChatMessageHistory
+
+
+class HistorialBlob:
+    """Reproduce el comportamiento anterior: leer, concatenar y reescribir el blob."""
+
+    def __init__(self, session_id: str, client):
+        self.session_id = session_id
+        self.client = client
+
+    @property
+    def messages(self):
+        response = self.client.table("historial_chat").select("historial").eq("session_id", self.session_id).execute()
+        if not response.data:
+            return []
+        return messages_from_dict(response.data[0].get("historial", []))
+
+    def add_messages(self, messages):
+        updated_history = messages_to_dict(self.messages + messages)
+        self.client.table("historial_chat").upsert({
+            "session_id": self.session_id,
+            "historial": updated_history,
+        }).execute()
+
+
+def medir(historial, turnos: int, cada: int) -> list:
+    """Simula turnos (leer historial + guardar pregunta y respuesta) y agrupa tiempos."""
+    tramos = []
+    tiempos = []
+    for turno in range(1, turnos + 1):
+        inicio = time.perf_counter()
+        historial.messages
+        historial.add_messages([
+            HumanMessage(content=f"Pregunta número {turno} sobre clientes y ventas"),
+            AIMessage(content=f"Respuesta número {turno} con algo de detalle " * 3),
+        ])
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        if turno % cada == 0:
+            tramos.append((turno * 2, statistics.median(tiempos)))
+            tiempos = []
+    return tramos
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turnos", type=int, default=2000)
+    parser.add_argument("--cada", type=int, default=250)
+    args = parser.parse_args()
+
+    blob = medir(HistorialBlob("bench-blob", supabase_falso), args.turnos, args.cada)
+    filas = medir(SupabaseChatMessageHistory("bench-filas", client=supabase_falso), args.turnos, args.cada)
+
+    print(f"{'mensajes':>10} {'blob (ms)':>12} {'por fila (ms)':>14}")
+    for (mensajes, t_blob), (_, t_filas) in zip(blob, filas):
+        print(f"{mensajes:>10} {t_blob:>12.3f} {t_filas:>14.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Prueba de carga del planificador de lotes frente a llamar al modelo
+directamente desde cada hilo (camino anterior).
+
+Por defecto usa un modelo simulado que ocupa una "CPU" compartida con un coste
+fijo por forward más un coste por entrada, que es la forma del coste de un
+encoder pequeño en CPU. Con --real se usa el SentenceTransformer de verdad.
+
+Uso:
+    python -m benchmarks.bench_inferencia --clientes 32 --peticiones 20
+    python -m benchmarks.bench_inferencia --real
+"""
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.inferencia import PlanificadorLotes
+
+
+class ModeloSimulado:
+    def __init__(self, fijo_ms: float, por_entrada_ms: float):
+        self.fijo = fijo_ms / 1000
+        self.por_entrada = por_entrada_ms / 1000
+        self._cpu = threading.Lock()
+
+    def encode(self, textos, **_):
+        textos = [textos] if isinstance(textos, str) else textos
+        with self._cpu:
+            time.sleep(self.fijo + self.por_entrada * len(textos))
+        return [[0.0] * 384 for _ in textos]
+
+
+def percentil(valores, p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(len(ordenados) * p / 100))]
+
+
+def carga(llamar, clientes: int, peticiones: int) -> dict:
+    latencias = []
+    lock = threading.Lock()
+
+    def cliente(n: int):
+        for i in range(peticiones):
+            inicio = time.perf_counter()
+            llamar(f"consulta {n}-{i} sobre el horario de atención")
+            with lock:
+                latencias.append((time.perf_counter() - inicio) * 1000)
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(clientes) as pool:
+        list(pool.map(cliente, range(clientes)))
+    duracion = time.perf_counter() - inicio
+
+    return {
+        "p50": statistics.median(latencias),
+        "p99": percentil(latencias, 99),
+        "rps": len(latencias) / duracion,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--clientes", type=int, default=32)
+    parser.add_argument("--peticiones", type=int, default=20)
+    parser.add_argument("--max-lote", type=int, default=64)
+    parser.add_argument("--max-espera-ms", type=float, default=5)
+    parser.add_argument("--real", action="store_true")
+    args = parser.parse_args()
+
+    if args.real:
+        from sentence_transformers import SentenceTransformer
+        modelo = SentenceTransformer("sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2")
+    else:
+        modelo = ModeloSimulado(fijo_ms=8, por_entrada_ms=0.5)
+
+    planificador = PlanificadorLotes(
+        lambda textos: modelo.encode(textos, batch_size=len(textos)),
+        max_lote=args.max_lote,
+        max_espera_ms=args.max_espera_ms,
+        nombre="bench",
+    )
+
+    resultados = {
+        "directo": carga(lambda texto: modelo.encode(texto), args.clientes, args.peticiones),
+        "lotes": carga(lambda texto: planificador.enviar(texto).result(), args.clientes, args.peticiones),
+    }
+
+    print(f"{'camino':>8} {'p50 (ms)':>10} {'p99 (ms)':>10} {'peticiones/s':>14}")
+    for nombre, r in resultados.items():
+        print(f"{nombre:>8} {r['p50']:>10.2f} {r['p99']:>10.2f} {r['rps']:>14.1f}")
+    print(f"lotes: {planificador.estadisticas()}")
+
+
+if __name__ == "__main__":
+    main()
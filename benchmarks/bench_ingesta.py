@@ -0,0 +1,133 @@
+"""
+Ingesta de un corpus de decenas de miles de fragmentos contra Supabase en
+memoria (con latencia por petición) y un modelo de embeddings simulado:
+
+- camino anterior: `generar_embedding` por fragmento e insert fila a fila
+  (se mide sobre una muestra y se extrapola);
+- ingesta por páginas con embeddings en lote y upsert masivo;
+- segunda pasada sobre el mismo corpus (todo deduplicado, nada se embebe);
+- interrupción a mitad y reanudación desde el punto de control.
+
+Uso:
+    python -m benchmarks.bench_ingesta --documentos 1500 --latencia-ms 20
+"""
+import argparse
+import functools
+import json
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.fakes import SupabaseFalso, instalar_supabase_falso
+
+instalar_supabase_falso()
+
+from app.core.inferencia import PlanificadorLotes
+from app.services.ingesta import Ingestor, embeber_en_lotes, fragmentar, leer_documentos
+from benchmarks.bench_inferencia import ModeloSimulado
+
+
+def crear_corpus(ruta: str, documentos: int, caracteres: int) -> None:
+    rng = random.Random(0)
+    vocabulario = [
+        "".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 10)))
+        for _ in range(5000)
+    ]
+    with open(ruta, "w", encoding="utf-8") as f:
+        for numero in range(documentos):
+            frases, largo = [], 0
+            while largo < caracteres:
+                frase = " ".join(rng.choices(vocabulario, k=rng.randint(6, 20))).capitalize() + "."
+                frases.append(frase)
+                largo += len(frase) + 1
+            registro = {"id": f"doc-{numero}", "texto": " ".join(frases), "metadatos": {"categoria": numero % 7}}
+            f.write(json.dumps(registro) + "\n")
+
+
+class Interrupcion(Exception):
+    pass
+
+
+class ClienteQueSeCae:
+    """Delegado del cliente falso que falla al llegar a `upserts` upserts, como un proceso que muere."""
+
+    def __init__(self, cliente: SupabaseFalso, upserts: int):
+        self.cliente = cliente
+        self.restantes = upserts
+
+    def table(self, nombre: str):
+        consulta = self.cliente.table(nombre)
+        execute = consulta.execute
+
+        def execute_con_fallo():
+            if consulta.operacion == "upsert":
+                if self.restantes == 0:
+                    raise Interrupcion()
+                self.restantes -= 1
+            return execute()
+
+        consulta.execute = execute_con_fallo
+        return consulta
+
+
+def camino_anterior(fragmentos, cliente, planificador) -> float:
+    inicio = time.perf_counter()
+    for fragmento in fragmentos:
+        vector = planificador.enviar(fragmento["texto"]).result()
+        cliente.table("documentos").insert({**fragmento, "embedding": vector}).execute()
+    return len(fragmentos) / (time.perf_counter() - inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--documentos", type=int, default=1500)
+    parser.add_argument("--caracteres", type=int, default=17000, help="Longitud aproximada de cada documento.")
+    parser.add_argument("--latencia-ms", type=float, default=20)
+    parser.add_argument("--muestra-anterior", type=int, default=300)
+    args = parser.parse_args()
+
+    modelo = ModeloSimulado(fijo_ms=8, por_entrada_ms=0.5)
+    planificador = PlanificadorLotes(modelo.encode, nombre="bench-ingesta")
+    embeber = functools.partial(embeber_en_lotes, planificador=planificador)
+
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, "corpus.jsonl")
+        crear_corpus(ruta, args.documentos, args.caracteres)
+        muestra = []
+        for fragmento in fragmentar(leer_documentos(ruta)):
+            muestra.append(fragmento)
+            if len(muestra) == args.muestra_anterior:
+                break
+        print(f"Corpus: {args.documentos} documentos, {os.path.getsize(ruta) / 2**20:.0f} MB")
+
+        ritmo = camino_anterior(muestra, SupabaseFalso(args.latencia_ms), planificador)
+        print(f"\nanterior (muestra de {len(muestra)}): {ritmo:8.1f} fragmentos/s")
+
+        cliente = SupabaseFalso(args.latencia_ms)
+        ingestor = Ingestor(cliente, embeber=embeber)
+        resumen = ingestor.ingerir_archivo(ruta)
+        print(f"ingesta por páginas:       {resumen['fragmentos_por_segundo']:8.1f} fragmentos/s   "
+              f"{resumen['fragmentos']} fragmentos, {cliente.peticiones} peticiones")
+        estimado = resumen["fragmentos"] / ritmo
+        print(f"  (el camino anterior habría tardado ~{estimado:.0f}s frente a {resumen['segundos']:.0f}s)")
+
+        cliente.peticiones = 0
+        resumen = ingestor.ingerir_archivo(ruta)
+        print(f"segunda pasada:            {resumen['fragmentos_por_segundo']:8.1f} fragmentos/s   "
+              f"{resumen['nuevos']} nuevos, {resumen['duplicados']} duplicados, {cliente.peticiones} peticiones")
+
+        cliente = SupabaseFalso(args.latencia_ms)
+        try:
+            Ingestor(ClienteQueSeCae(cliente, upserts=40), embeber=embeber).ingerir_archivo(ruta)
+        except Interrupcion:
+            pass
+        guardados = len(cliente.tablas["documentos"].filas)
+        resumen = Ingestor(cliente, embeber=embeber).ingerir_archivo(ruta)
+        print(f"interrumpida y reanudada:  {guardados} guardados antes del fallo, se reanuda en "
+              f"{resumen['reanudados']}, {resumen['nuevos']} nuevos tras reanudar, "
+              f"total {len(cliente.tablas['documentos'].filas)} filas")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Rendimiento de N consultas enviadas una a una a `/agent/` frente a una sola
+llamada a `/agent/lote`, pasando por la aplicación completa (middleware,
+guardián, historial y agente) dentro del proceso.
+
+El agente y el guardián son modelos guionados con latencia simulada
+(`--ms-llm` por llamada al agente, `--ms-guardian` por llamada al guardián,
+sea de una consulta o de un lote) y Supabase es el cliente en memoria de
+`benchmarks.fakes` con `--ms-supabase` por petición. Los embeddings (turnos
+relevantes del historial) son los del modelo falso. El agente responde sin
+herramientas, así que no se miden la búsqueda ni el rerank.
+
+Uso:
+    python -m benchmarks.bench_lote --consultas 200 --concurrencia 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import time
+
+from benchmarks.fakes import (
+    ChatGuionado,
+    GuardianFalso,
+    ModeloEmbeddingsFalso,
+    SupabaseFalso,
+    crear_sqlite_de_prueba,
+    instalar_supabase_falso,
+)
+
+supabase_falso = instalar_supabase_falso(SupabaseFalso())
+os.environ["DATABASE_URL"] = crear_sqlite_de_prueba("/tmp/bench_lote.db")
+os.environ.setdefault("GEMINI_API_KEY", "clave-falsa")
+os.environ["PRECARGAR_RECURSOS"] = "false"
+os.environ.setdefault("LOG_NIVEL", "WARNING")
+
+import httpx
+from langchain.agents import AgentExecutor, create_tool_calling_agent
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough
+from langchain_core.runnables.history import RunnableWithMessageHistory
+
+from app.core.config import LOTE_CONCURRENCIA
+from app.core.recursos import recursos
+from app.main import app, lifespan
+from app.routes import agent
+from app.services.contexto_historial import acotar_historial
+from benchmarks.bench_inferencia import percentil
+
+
+def instalar_modelos(args) -> tuple:
+    llm = ChatGuionado(respuestas=[AIMessage(content="Respuesta de prueba.")], latencia_ms=args.ms_llm)
+    guardian = GuardianFalso(latencia_ms=args.ms_guardian)
+    agente = AgentExecutor(agent=create_tool_calling_agent(llm, agent.tools, agent.agent_prompt), tools=agent.tools)
+    agent.agent_con_memoria = RunnableWithMessageHistory(
+        RunnablePassthrough.assign(history=RunnableLambda(acotar_historial)) | agente,
+        agent.obtener_historial_de_mensajes,
+        input_messages_key="input",
+        history_messages_key="history",
+    )
+    agent.cadena_guardian = guardian
+    recursos["embeddings"].fabrica = ModeloEmbeddingsFalso
+    agent.cadena_guardian_lote = guardian
+    return llm, guardian
+
+
+def consultas(n: int, prefijo: str) -> list:
+    # Varias consultas por sesión, como un trabajo que recorre clientes.
+    return [{"consulta": f"Clasifica la incidencia {i} del informe", "session_id": f"{prefijo}-{i % 20}"} for i in range(n)]
+
+
+async def secuencial(cliente: httpx.AsyncClient, args) -> tuple:
+    latencias = []
+    inicio = time.perf_counter()
+    for peticion in consultas(args.consultas, "secuencial"):
+        t = time.perf_counter()
+        respuesta = await cliente.post("/agent/", json=peticion)
+        respuesta.raise_for_status()
+        latencias.append((time.perf_counter() - t) * 1000)
+    return time.perf_counter() - inicio, latencias
+
+
+async def en_lote(cliente: httpx.AsyncClient, args) -> tuple:
+    inicio = time.perf_counter()
+    cuerpo = {"peticiones": consultas(args.consultas, "lote"), "concurrencia": args.concurrencia}
+    respuesta = await cliente.post("/agent/lote", json=cuerpo, timeout=None)
+    respuesta.raise_for_status()
+    lineas = [json.loads(linea) for linea in respuesta.text.splitlines()]
+    errores = sum(1 for linea in lineas if "error" in linea)
+    if len(lineas) != args.consultas or errores:
+        raise RuntimeError(f"{len(lineas)} líneas para {args.consultas} consultas, {errores} con error")
+    return time.perf_counter() - inicio, []
+
+
+async def principal(args) -> None:
+    llm, guardian = instalar_modelos(args)
+    supabase_falso.latencia = args.ms_supabase / 1000
+    transporte = httpx.ASGITransport(app=app)
+    async with lifespan(app), httpx.AsyncClient(transport=transporte, base_url="http://bench", timeout=None) as cliente:
+        print(
+            f"{args.consultas} consultas; LLM {args.ms_llm:.0f} ms, guardián {args.ms_guardian:.0f} ms, "
+            f"Supabase {args.ms_supabase:.0f} ms; concurrencia del lote {args.concurrencia}"
+        )
+        print(f"{'modo':>11} {'total (s)':>10} {'consultas/s':>12} {'p50 (ms)':>9} {'p95 (ms)':>9} {'guardián':>9} {'LLM':>5}")
+        for nombre, medir in (("secuencial", secuencial), ("lote", en_lote)):
+            llm.llamadas = guardian.llamadas = 0
+            duracion, latencias = await medir(cliente, args)
+            p50 = f"{statistics.median(latencias):.0f}" if latencias else "-"
+            p95 = f"{percentil(latencias, 95):.0f}" if latencias else "-"
+            print(
+                f"{nombre:>11} {duracion:>10.2f} {args.consultas / duracion:>12.1f} {p50:>9} {p95:>9} "
+                f"{guardian.llamadas:>9} {llm.llamadas:>5}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("--concurrencia", type=int, default=LOTE_CONCURRENCIA)
+    parser.add_argument("--ms-llm", type=float, default=300)
+    parser.add_argument("--ms-guardian", type=float, default=150)
+    parser.add_argument("--ms-supabase", type=float, default=5)
+    asyncio.run(principal(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
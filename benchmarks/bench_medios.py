@@ -0,0 +1,99 @@
+"""
+Coste de preparar un adjunto hasta tenerlo listo para Gemini: el camino
+anterior (base64 -> archivo temporal -> releer -> base64 otra vez) frente al
+almacén de medios en memoria. Mide tiempo y pico de memoria (tracemalloc) por
+petición; la llamada a Gemini queda fuera.
+
+Uso:
+    python -m benchmarks.bench_medios --ancho 4000 --alto 3000 --repeticiones 10
+"""
+import argparse
+import base64
+import io
+import os
+import statistics
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+import numpy as np
+from PIL import Image
+
+from app.core.medios import AlmacenMedios
+
+
+def imagen_de_prueba(ancho: int, alto: int, formato: str) -> str:
+    """Degradado con ruido: se comprime como una foto, no como un color plano."""
+    rng = np.random.default_rng(0)
+    x = np.linspace(0, 255, ancho, dtype=np.float32)
+    y = np.linspace(0, 255, alto, dtype=np.float32)[:, None]
+    pixeles = np.stack([x + 0 * y, y + 0 * x, (x + y) / 2], axis=-1)
+    pixeles += rng.normal(0, 12, pixeles.shape)
+    salida = io.BytesIO()
+    Image.fromarray(np.clip(pixeles, 0, 255).astype(np.uint8)).save(salida, format=formato, quality=95)
+    return base64.b64encode(salida.getvalue()).decode("ascii")
+
+
+def camino_anterior(imagen_base64: str, directorio: str) -> int:
+    ruta = os.path.join(directorio, f"{uuid.uuid4()}_image.png")
+    with open(ruta, "wb") as f:
+        f.write(base64.b64decode(imagen_base64))
+    with open(ruta, "rb") as f:
+        data_url = f"data:image/jpeg;base64,{base64.b64encode(f.read()).decode('utf-8')}"
+    os.remove(ruta)
+    return len(data_url)
+
+
+def camino_almacen(imagen_base64: str, almacen: AlmacenMedios) -> int:
+    id_medio = almacen.guardar_imagen(imagen_base64)
+    data_url = almacen.obtener(id_medio).data_url
+    almacen.liberar(id_medio)
+    return len(data_url)
+
+
+def medir(funcion, repeticiones: int) -> dict:
+    tiempos, picos = [], []
+    enviado = 0
+    for _ in range(repeticiones):
+        tracemalloc.start()
+        inicio = time.perf_counter()
+        enviado = funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        picos.append(tracemalloc.get_traced_memory()[1] / 2**20)
+        tracemalloc.stop()
+    return {"ms": statistics.median(tiempos), "pico_mb": max(picos), "enviado_mb": enviado / 2**20}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ancho", type=int, default=4000)
+    parser.add_argument("--alto", type=int, default=3000)
+    parser.add_argument("--repeticiones", type=int, default=10)
+    args = parser.parse_args()
+
+    almacen = AlmacenMedios()
+    with tempfile.TemporaryDirectory() as directorio:
+        # El PNG con ruido pesa mucho más que el JPEG: se usa a mitad de tamaño.
+        for formato, ancho, alto in (("JPEG", args.ancho, args.alto), ("PNG", args.ancho // 2, args.alto // 2)):
+            imagen_base64 = imagen_de_prueba(ancho, alto, formato)
+            print(f"\n{formato} {ancho}x{alto}, {len(imagen_base64) / 2**20:.1f} MB en base64")
+            for nombre, funcion in (
+                ("anterior", lambda: camino_anterior(imagen_base64, directorio)),
+                ("almacén", lambda: camino_almacen(imagen_base64, almacen)),
+            ):
+                r = medir(funcion, args.repeticiones)
+                print(f"  {nombre:<9} {r['ms']:8.1f} ms   pico {r['pico_mb']:6.1f} MB   a Gemini {r['enviado_mb']:5.1f} MB")
+
+        pequena = imagen_de_prueba(800, 600, "JPEG")
+        print(f"\nJPEG 800x600, {len(pequena) / 2**10:.0f} KB en base64 (por debajo del umbral, no se reduce)")
+        for nombre, funcion in (
+            ("anterior", lambda: camino_anterior(pequena, directorio)),
+            ("almacén", lambda: camino_almacen(pequena, almacen)),
+        ):
+            r = medir(funcion, args.repeticiones)
+            print(f"  {nombre:<9} {r['ms']:8.2f} ms   pico {r['pico_mb']:6.2f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,210 @@
+"""
+Evaluación offline de la búsqueda de documentos: recall@k y latencia de
+cada configuración (solo vectorial o híbrida con BM25, CrossEncoder sobre
+todos los candidatos, sobre los dudosos según RERANK_UMBRAL, o sin él).
+
+Sin argumentos genera un corpus sintético con consultas de tres tipos:
+paráfrasis (sinónimos que no aparecen en el texto: solo las acierta el
+vectorial), identificadores raros (solo las acierta BM25) y literales. Los
+embeddings son bolsas de vectores de palabra donde los sinónimos quedan
+cerca, y el CrossEncoder simulado es un oráculo ruidoso con coste por par.
+
+Con --consultas se evalúa el índice real de INDICE_LOCAL_RUTA con los
+modelos reales; el archivo es un JSONL con {"consulta": ..., "relevantes":
+[ids]}. La latencia no incluye el embedding de la consulta.
+
+Uso:
+    python -m benchmarks.bench_recuperacion --documentos 5000 --consultas-por-tipo 100
+    python -m benchmarks.bench_recuperacion --consultas evaluacion.jsonl --umbrales 0.05 0.1 0.2
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+if "--consultas" not in sys.argv:
+    # El índice sintético se escribe en un directorio temporal antes de importar la configuración.
+    os.environ["RECUPERADOR"] = "local"
+    os.environ["INDICE_LOCAL_RUTA"] = tempfile.mkdtemp(prefix="bench_recuperacion_")
+
+    from benchmarks.fakes import instalar_supabase_falso
+
+    instalar_supabase_falso()
+
+from app.core.config import BUSQUEDA_CANDIDATOS, BUSQUEDA_K_FINAL, INDICE_LOCAL_RUTA
+from app.core.indice_lexico import IndiceLexico
+from app.core.indice_vectorial import IndiceVectorial
+from app.core.inferencia import PlanificadorLotes
+from app.services.busqueda import invalidar_cache_busquedas, recuperar
+from app.services.rerank import cache_rerank, metricas_rerank, planificador_rerank, reordenar
+from benchmarks.bench_inferencia import percentil
+
+DIMENSION = 64
+
+
+class CorpusSintetico:
+    def __init__(self, documentos: int, temas: int = 40, semilla: int = 0):
+        self.rng = random.Random(semilla)
+        generador = np.random.default_rng(semilla)
+
+        def palabra():
+            return "".join(self.rng.choice("bcdfglmnprstv") + self.rng.choice("aeiou") for _ in range(4))
+
+        self.vectores = {}
+        self.sinonimos = {}
+        vocabularios = []
+        for _ in range(temas):
+            centro = generador.normal(size=DIMENSION)
+            vocabulario = []
+            for _ in range(60):
+                original, sinonimo = palabra(), palabra()
+                base = centro + generador.normal(scale=1.2, size=DIMENSION)
+                self.vectores[original] = base
+                self.vectores[sinonimo] = base + generador.normal(scale=0.1, size=DIMENSION)
+                self.sinonimos[original] = sinonimo
+                vocabulario.append(original)
+            vocabularios.append(vocabulario)
+
+        self.documentos = []
+        self.palabras_documento = []
+        for numero in range(documentos):
+            propias = self.rng.sample(vocabularios[numero % temas], 12)
+            codigos = [f"ref{numero:05d}{self.rng.choice('xyz')}", f"lote{self.rng.randrange(10**6):06d}"]
+            for codigo in codigos:
+                self.vectores[codigo] = generador.normal(scale=0.3, size=DIMENSION)
+            texto = self.rng.choices(propias, k=110) + codigos
+            self.rng.shuffle(texto)
+            self.documentos.append({"id": f"doc-{numero}", "texto": " ".join(texto), "metadatos": {}})
+            self.palabras_documento.append((propias, codigos))
+
+    def embeber(self, texto: str) -> np.ndarray:
+        vectores = [self.vectores[p] for p in texto.split() if p in self.vectores]
+        vector = np.sum(vectores, axis=0) if vectores else np.zeros(DIMENSION)
+        return vector / (np.linalg.norm(vector) or 1)
+
+    def consultas(self, por_tipo: int) -> list:
+        consultas = []
+        for tipo in ("parafrasis", "identificador", "literal"):
+            for _ in range(por_tipo):
+                numero = self.rng.randrange(len(self.documentos))
+                propias, codigos = self.palabras_documento[numero]
+                if tipo == "parafrasis":
+                    palabras = [self.sinonimos[p] for p in self.rng.sample(propias, 5)]
+                elif tipo == "identificador":
+                    palabras = [codigos[0]] + self.rng.sample(propias, 1)
+                else:
+                    palabras = self.rng.sample(propias, 5)
+                consultas.append({"consulta": " ".join(palabras), "relevantes": [f"doc-{numero}"], "tipo": tipo})
+        return consultas
+
+
+class CrossEncoderSimulado:
+    """Oráculo ruidoso: el relevante puntúa alto casi siempre. Ocupa una "CPU" compartida."""
+
+    def __init__(self, relevantes: dict, fijo_ms: float = 4, por_par_ms: float = 1.5):
+        self.relevantes = relevantes
+        self.fijo = fijo_ms / 1000
+        self.por_par = por_par_ms / 1000
+        self.rng = random.Random(1)
+        self._cpu = threading.Lock()
+
+    def predict(self, pares):
+        with self._cpu:
+            time.sleep(self.fijo + self.por_par * len(pares))
+            return [
+                (3.0 if texto in self.relevantes.get(consulta, ()) else 0.0) + self.rng.gauss(0, 1)
+                for consulta, texto in pares
+            ]
+
+
+async def evaluar(consultas, vectores, hibrida: bool, umbral, k: int, candidatos: int, planificador) -> dict:
+    """`umbral=None` significa sin CrossEncoder: se quedan los k primeros de la primera etapa."""
+    invalidar_cache_busquedas()
+    aciertos, latencias, pares = [], [], 0
+    aciertos_primera = []
+    for consulta, vector in zip(consultas, vectores):
+        inicio = time.perf_counter()
+        resultados = recuperar(consulta["consulta"], vector, candidatos, hibrida=hibrida)
+        aciertos_primera.append(any(str(r.get("id")) in consulta["relevantes"] for r in resultados))
+        if umbral is None:
+            finales = resultados[:k]
+        else:
+            antes = metricas_rerank["pares_puntuados"]
+            finales = await reordenar(consulta["consulta"], resultados, k=k, umbral=umbral, planificador=planificador)
+            pares += metricas_rerank["pares_puntuados"] - antes
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        encontrados = {str(r.get("id")) for r in finales} & set(consulta["relevantes"])
+        aciertos.append(len(encontrados) / len(consulta["relevantes"]))
+    return {
+        "recall": statistics.mean(aciertos),
+        "recall_candidatos": statistics.mean(aciertos_primera),
+        "pares": pares / len(consultas),
+        "p50": statistics.median(latencias),
+        "p95": percentil(latencias, 95),
+    }
+
+
+def imprimir(nombre: str, r: dict, k: int, candidatos: int) -> None:
+    print(f"{nombre:<34} recall@{k} {r['recall']:.3f}   recall@{candidatos} {r['recall_candidatos']:.3f}   "
+          f"pares/consulta {r['pares']:5.1f}   p50 {r['p50']:6.1f} ms   p95 {r['p95']:6.1f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--consultas", help="JSONL con {consulta, relevantes}; usa el índice y los modelos reales.")
+    parser.add_argument("--documentos", type=int, default=5000)
+    parser.add_argument("--consultas-por-tipo", type=int, default=100)
+    parser.add_argument("--k", type=int, default=BUSQUEDA_K_FINAL)
+    parser.add_argument("--candidatos", type=int, default=BUSQUEDA_CANDIDATOS)
+    parser.add_argument("--umbrales", type=float, nargs="+", default=[0.05, 0.1, 0.2])
+    args = parser.parse_args()
+
+    if args.consultas:
+        from app.core.embedding import generar_embedding
+
+        with open(args.consultas, encoding="utf-8") as f:
+            consultas = [json.loads(linea) for linea in f if linea.strip()]
+        vectores = [generar_embedding(c["consulta"]) for c in consultas]
+        planificador = planificador_rerank
+        print(f"{len(consultas)} consultas contra el índice de {INDICE_LOCAL_RUTA}")
+    else:
+        corpus = CorpusSintetico(args.documentos)
+        embeddings = [corpus.embeber(d["texto"]) for d in corpus.documentos]
+        IndiceVectorial.construir(INDICE_LOCAL_RUTA, embeddings, corpus.documentos)
+        IndiceLexico.construir(INDICE_LOCAL_RUTA, corpus.documentos)
+        consultas = corpus.consultas(args.consultas_por_tipo)
+        vectores = [corpus.embeber(c["consulta"]).tolist() for c in consultas]
+        textos = {d["id"]: d["texto"] for d in corpus.documentos}
+        relevantes = {c["consulta"]: {textos[i] for i in c["relevantes"]} for c in consultas}
+        planificador = PlanificadorLotes(CrossEncoderSimulado(relevantes).predict, nombre="bench-rerank")
+        print(f"Corpus sintético: {args.documentos} documentos, {len(consultas)} consultas "
+              f"({args.consultas_por_tipo} de cada tipo)")
+
+    configuraciones = [
+        ("vectorial, sin rerank", False, None),
+        ("vectorial + rerank de todos", False, 0),
+        ("híbrida, sin rerank", True, None),
+        ("híbrida + rerank de todos", True, 0),
+    ] + [(f"híbrida + rerank adaptativo ({u:g})", True, u) for u in args.umbrales]
+
+    print()
+    for nombre, hibrida, umbral in configuraciones:
+        cache_rerank.clear()
+        resultado = await evaluar(consultas, vectores, hibrida, umbral, args.k, args.candidatos, planificador)
+        imprimir(nombre, resultado, args.k, args.candidatos)
+
+    # La última configuración otra vez, con los puntajes del CrossEncoder ya en cache.
+    resultado = await evaluar(consultas, vectores, True, args.umbrales[-1], args.k, args.candidatos, planificador)
+    imprimir("  repetida con la cache de puntajes", resultado, args.k, args.candidatos)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
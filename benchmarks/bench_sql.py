@@ -0,0 +1,96 @@
+"""
+Consultas SQL como las que puede generar el agente, ejecutadas con el
+SQLDatabase de LangChain sin límites y con `SQLDatabaseAcotada`: tiempo,
+caracteres que llegarían al prompt y si la consulta se truncó o se rechazó.
+
+La base es SQLite sembrada con `data_clients.sql` y `--ventas` ventas
+sintéticas. En SQLite el coste es la estimación por filas recorridas de
+`SQLDatabaseAcotada` (en Postgres se usa el de EXPLAIN).
+
+Uso:
+    python -m benchmarks.bench_sql --ventas 5000 --coste-maximo 20000 --timeout-ms 500
+"""
+import argparse
+import os
+import random
+import sqlite3
+import time
+
+from benchmarks.fakes import crear_sqlite_de_prueba
+
+RUTA = "/tmp/bench_sql.db"
+os.environ["DATABASE_URL"] = crear_sqlite_de_prueba(RUTA)
+
+from langchain_community.utilities import SQLDatabase
+
+from app.core.sql_database import SQLDatabaseAcotada, engine, estadisticas_sql
+
+CONSULTAS = {
+    "agregado": (
+        "SELECT c.nombre, SUM(v.cantidad) AS total_vendido FROM ventas v JOIN clientes c ON v.cliente_id = c.id "
+        "GROUP BY c.nombre ORDER BY total_vendido DESC LIMIT 5;"
+    ),
+    "listado completo": "SELECT * FROM ventas;",
+    "producto cartesiano": "SELECT v.id, c.nombre FROM ventas v, clientes c;",
+    "recursiva sin fin": (
+        "WITH RECURSIVE n(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM n WHERE x < 3000000) SELECT count(*) FROM n;"
+    ),
+    "escritura": "DELETE FROM ventas WHERE cantidad > 1;",
+}
+
+
+def sembrar_ventas(n: int) -> None:
+    rng = random.Random(0)
+    with sqlite3.connect(RUTA) as conexion:
+        conexion.executemany(
+            "INSERT INTO ventas (cliente_id, producto_id, cantidad, total, fecha) VALUES (?, ?, ?, ?, ?)",
+            [
+                (rng.randint(1, 10), rng.randint(1, 5), rng.randint(1, 5), rng.randint(10, 500), "2024-01-15")
+                for _ in range(n)
+            ],
+        )
+
+
+def ejecutar(base_de_datos, sql: str) -> tuple:
+    inicio = time.perf_counter()
+    resultado = base_de_datos.run_no_throw(sql)
+    ms = (time.perf_counter() - inicio) * 1000
+    if resultado.startswith("Error"):
+        estado = "rechazada: " + resultado[len("Error: "):][:60]
+    elif "Resultado truncado" in resultado:
+        estado = "truncada"
+    else:
+        estado = "ok"
+    return ms, len(resultado), estado
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ventas", type=int, default=5000)
+    parser.add_argument("--max-filas", type=int, default=200)
+    parser.add_argument("--coste-maximo", type=float, default=20000)
+    parser.add_argument("--timeout-ms", type=int, default=500)
+    args = parser.parse_args()
+
+    sembrar_ventas(args.ventas)
+    modos = {
+        "sin límites": SQLDatabase(engine),
+        "acotada": SQLDatabaseAcotada(
+            engine, max_filas=args.max_filas, timeout_ms=args.timeout_ms, coste_maximo=args.coste_maximo
+        ),
+    }
+
+    print(f"{args.ventas} ventas; acotada: {args.max_filas} filas, coste {args.coste_maximo:.0f}, {args.timeout_ms} ms")
+    print(f"{'consulta':>20} {'modo':>12} {'ms':>9} {'caracteres':>11}  resultado")
+    for nombre, sql in CONSULTAS.items():
+        for modo, base_de_datos in modos.items():
+            if nombre == "escritura" and modo == "sin límites":
+                # Borraría las ventas del resto de consultas.
+                continue
+            ms, caracteres, estado = ejecutar(base_de_datos, sql)
+            print(f"{nombre:>20} {modo:>12} {ms:>9.1f} {caracteres:>11}  {estado}")
+    print(estadisticas_sql())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Cargas de trabajo de `bench_carga`: las peticiones de cada escenario y los
+guiones de los modelos de chat falsos que deciden qué herramienta llama el
+agente según la conversación.
+
+Cada escenario devuelve secuencias de peticiones: las de una secuencia
+comparten sesión y se envían en orden; las secuencias corren en paralelo.
+"""
+import base64
+import io
+import math
+import re
+import struct
+import uuid
+import wave
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from benchmarks.bench_medios import imagen_de_prueba
+
+TEMAS = ["devoluciones", "garantía", "envíos", "facturación", "privacidad", "soporte", "pagos", "descuentos"]
+
+
+def transcripcion(numero: int) -> str:
+    """
+    Lo que "dice" el audio número `numero`. Cambia en cada petición: si todas
+    fueran iguales, la respuesta también lo sería y la cache de audio serviría
+    el TTS sin medirlo.
+    """
+    return f"Quiero saber qué dice el documento sobre {TEMAS[numero % len(TEMAS)]} para el pedido {numero}."
+
+# Pregunta -> SQL que "generaría" el modelo; el número del cliente va en la pregunta.
+PREGUNTAS_SQL = [
+    (re.compile(r"cuántas ventas tiene el cliente (\d+)", re.IGNORECASE),
+     "SELECT count(*) FROM ventas WHERE cliente_id = {0};"),
+    (re.compile(r"qué productos ha comprado el cliente (\d+)", re.IGNORECASE),
+     "SELECT DISTINCT p.nombre FROM ventas v JOIN productos p ON v.producto_id = p.id WHERE v.cliente_id = {0};"),
+    (re.compile(r"quién ha comprado más", re.IGNORECASE),
+     "SELECT c.nombre, SUM(v.cantidad) AS total_vendido FROM ventas v JOIN clientes c ON v.cliente_id = c.id "
+     "GROUP BY c.nombre ORDER BY total_vendido DESC LIMIT 1;"),
+]
+
+
+def documentos_sinteticos(cantidad: int = 60) -> list:
+    """Textos de políticas y manuales con vocabulario de cada tema, para sembrar la tabla `documentos`."""
+    documentos = []
+    for numero in range(cantidad):
+        tema = TEMAS[numero % len(TEMAS)]
+        documentos.append({
+            "id": str(uuid.UUID(int=numero + 1)),
+            "texto": (
+                f"Documento {numero} sobre {tema}. La política de {tema} establece plazos, condiciones y "
+                f"excepciones para los clientes. Para cualquier duda sobre {tema} contacte con soporte."
+            ),
+            "metadatos": {"fuente": f"manual_{tema}.pdf", "pagina": numero},
+        })
+    return documentos
+
+
+def audio_de_prueba(segundos: float = 2.0, frecuencia: int = 16000) -> str:
+    """WAV mono de 16 bits con un tono de 440 Hz, en base64."""
+    muestras = int(segundos * frecuencia)
+    salida = io.BytesIO()
+    with wave.open(salida, "wb") as archivo:
+        archivo.setnchannels(1)
+        archivo.setsampwidth(2)
+        archivo.setframerate(frecuencia)
+        archivo.writeframes(b"".join(
+            struct.pack("<h", int(8000 * math.sin(2 * math.pi * 440 * i / frecuencia))) for i in range(muestras)
+        ))
+    return base64.b64encode(salida.getvalue()).decode("ascii")
+
+
+def _texto(mensaje) -> str:
+    contenido = mensaje.content
+    return contenido if isinstance(contenido, str) else " ".join(str(parte) for parte in contenido)
+
+
+def _llamar(herramienta: str, **argumentos) -> AIMessage:
+    return AIMessage(content="", tool_calls=[{"name": herramienta, "args": argumentos, "id": uuid.uuid4().hex}])
+
+
+def guion_agente(mensajes) -> AIMessage:
+    """
+    Agente maestro: responde con el resultado de la herramienta si acaba de
+    ejecutar una; si no, elige la herramienta por el contenido de la
+    pregunta, como haría Gemini con las descripciones de cada una.
+    """
+    if isinstance(mensajes[-1], ToolMessage):
+        llamadas = {llamada["id"]: llamada["name"] for m in mensajes if isinstance(m, AIMessage) for llamada in m.tool_calls}
+        herramienta = llamadas.get(mensajes[-1].tool_call_id, "la herramienta")
+        return AIMessage(content=f"Según {herramienta}: {_texto(mensajes[-1])[:300]}")
+
+    pregunta = next(_texto(m) for m in reversed(mensajes) if isinstance(m, HumanMessage))
+    if coincidencia := re.search(r"audio_id: (\S+)", pregunta):
+        return _llamar("transcribe_audio_with_gemini", audio_id=coincidencia.group(1))
+    if coincidencia := re.search(r"image_id: (\S+)", pregunta):
+        return _llamar("analyze_image_with_gemini_vision", user_prompt=pregunta, image_id=coincidencia.group(1))
+    if coincidencia := re.search(r"datos tiene el cliente (\d+)", pregunta):
+        return _llamar("buscar_info_cliente", id=int(coincidencia.group(1)))
+    if re.search(r"ventas|compr", pregunta, re.IGNORECASE):
+        return _llamar("consultar_base_de_datos_clientes", consulta_en_lenguaje_natural=pregunta)
+    if re.search(r"documento|política", pregunta, re.IGNORECASE):
+        return _llamar("buscar_contexto_en_documentos", consulta=pregunta)
+    return AIMessage(content="De acuerdo, lo tengo en cuenta para las siguientes preguntas.")
+
+
+def guion_sql(mensajes) -> AIMessage:
+    """Agente SQL: ejecuta la consulta de `PREGUNTAS_SQL` que corresponde a la pregunta y resume el resultado."""
+    if isinstance(mensajes[-1], ToolMessage):
+        return AIMessage(content=f"El resultado de la consulta es {_texto(mensajes[-1])[:200]}")
+    pregunta = next(_texto(m) for m in reversed(mensajes) if isinstance(m, HumanMessage))
+    for patron, sql in PREGUNTAS_SQL:
+        if coincidencia := patron.search(pregunta):
+            return _llamar("sql_db_query", query=sql.format(*coincidencia.groups()))
+    return _llamar("sql_db_query", query="SELECT count(*) FROM clientes;")
+
+
+def secuencias_rag(peticiones: int) -> list:
+    return [
+        [{"consulta": f"¿Qué dice el documento sobre {TEMAS[i % len(TEMAS)]} para el pedido {i}?", "session_id": f"rag-{i}"}]
+        for i in range(peticiones)
+    ]
+
+
+def secuencias_sql(peticiones: int) -> list:
+    preguntas = [
+        "¿Cuántas ventas tiene el cliente {0}?",
+        "¿Qué productos ha comprado el cliente {0}?",
+        "¿Quién ha comprado más?",
+    ]
+    return [
+        [{"consulta": preguntas[i % len(preguntas)].format(i % 10 + 1), "session_id": f"sql-{i}"}]
+        for i in range(peticiones)
+    ]
+
+
+def secuencias_imagen(peticiones: int) -> list:
+    imagen = imagen_de_prueba(1024, 768, "JPEG")
+    return [
+        [{"consulta": "¿Qué aparece en esta imagen?", "image_base64": imagen, "session_id": f"imagen-{i}"}]
+        for i in range(peticiones)
+    ]
+
+
+def secuencias_voz(peticiones: int) -> list:
+    audio = audio_de_prueba()
+    return [[{"consulta": "", "audio_base64": audio, "session_id": f"voz-{i}"}] for i in range(peticiones)]
+
+
+def secuencias_sesion_larga(peticiones: int, turnos: int = 30) -> list:
+    """Sesiones de `turnos` turnos que alternan consultas al CRM, a documentos y mensajes sin herramientas."""
+    secuencias = []
+    for sesion in range(math.ceil(peticiones / turnos)):
+        secuencia = []
+        for turno in range(min(turnos, peticiones - sesion * turnos)):
+            if turno % 3 == 0:
+                consulta = f"¿Qué datos tiene el cliente {turno % 10 + 1}?"
+            elif turno % 3 == 1:
+                consulta = f"¿Qué dice la política de {TEMAS[turno % len(TEMAS)]}?"
+            else:
+                consulta = f"Apunta que el cliente {turno % 10 + 1} prefiere que le contacten por la tarde."
+            secuencia.append({"consulta": consulta, "session_id": f"larga-{sesion}"})
+        secuencias.append(secuencia)
+    return secuencias
+
+
+ESCENARIOS = {
+    "rag": secuencias_rag,
+    "sql": secuencias_sql,
+    "imagen": secuencias_imagen,
+    "voz": secuencias_voz,
+    "sesion_larga": secuencias_sesion_larga,
+}
@@ -0,0 +1,517 @@
+"""
+Dobles locales para medir el código propio sin red: un cliente Supabase en
+memoria con la misma API encadenable que supabase-py (tablas y la RPC
+`buscar_similares`), una base SQLite sembrada con `data_clients.sql`, un
+servidor HTTP que imita la API del CRM, un sintetizador de voz que devuelve
+PCM determinista, modelos de chat guionados (agente, guardián, visión) y de
+transcripción con latencia configurable, y modelos de embeddings y rerank
+deterministas.
+
+Los payloads se serializan a JSON en cada petición para que el coste de
+"cable" (bytes enviados y recibidos) quede reflejado en las mediciones.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import types
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from typing import Any, Callable, Iterator, List, Optional, Union
+
+import numpy as np
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+class RespuestaFalsa:
+    def __init__(self, data):
+        self.data = data
+
+
+class ConsultaFalsa:
+    def __init__(self, tabla: "TablaFalsa", latencia: float = 0):
+        self.tabla = tabla
+        self.latencia = latencia
+        self.operacion = "select"
+        self.payload = None
+        self.filtros = []
+        self.orden = None
+        self.limite = None
+        self.rango = None
+        self.columnas = "*"
+
+    def select(self, columnas: str = "*"):
+        self.operacion = "select"
+        self.columnas = columnas
+        return self
+
+    def insert(self, filas):
+        self.operacion = "insert"
+        self.payload = filas
+        return self
+
+    def upsert(self, filas):
+        self.operacion = "upsert"
+        self.payload = filas
+        return self
+
+    def update(self, valores):
+        self.operacion = "update"
+        self.payload = valores
+        return self
+
+    def delete(self):
+        self.operacion = "delete"
+        return self
+
+    def eq(self, columna, valor):
+        self.filtros.append(lambda fila: fila.get(columna) == valor)
+        return self
+
+    def gt(self, columna, valor):
+        self.filtros.append(lambda fila: fila.get(columna) is not None and fila.get(columna) > valor)
+        return self
+
+    def lte(self, columna, valor):
+        self.filtros.append(lambda fila: fila.get(columna) is not None and fila.get(columna) <= valor)
+        return self
+
+    def in_(self, columna, valores):
+        valores = set(valores)
+        self.filtros.append(lambda fila: fila.get(columna) in valores)
+        return self
+
+    def order(self, columna, desc: bool = False):
+        self.orden = (columna, desc)
+        return self
+
+    def limit(self, n: int):
+        self.limite = n
+        return self
+
+    def range(self, inicio: int, fin: int):
+        self.rango = (inicio, fin)
+        return self
+
+    def _coincide(self, fila) -> bool:
+        return all(filtro(fila) for filtro in self.filtros)
+
+    def _proyectar(self, fila):
+        if self.columnas.strip() == "*":
+            return dict(fila)
+        columnas = [c.strip() for c in self.columnas.split(",")]
+        return {c: fila.get(c) for c in columnas}
+
+    def execute(self) -> RespuestaFalsa:
+        if self.latencia:
+            time.sleep(self.latencia)
+        if self.payload is not None:
+            self.payload = json.loads(json.dumps(self.payload))
+        filas = self.tabla.filas
+
+        if self.operacion == "insert":
+            nuevas = self.payload if isinstance(self.payload, list) else [self.payload]
+            insertadas = [self.tabla.agregar(fila) for fila in nuevas]
+            return RespuestaFalsa(insertadas)
+
+        if self.operacion == "upsert":
+            nuevas = self.payload if isinstance(self.payload, list) else [self.payload]
+            indice = {f.get(self.tabla.clave): f for f in filas}
+            resultado = []
+            for fila in nuevas:
+                existente = indice.get(fila.get(self.tabla.clave))
+                if existente is not None:
+                    existente.update(fila)
+                    resultado.append(dict(existente))
+                else:
+                    resultado.append(self.tabla.agregar(fila))
+                    indice[fila.get(self.tabla.clave)] = self.tabla.filas[-1]
+            return RespuestaFalsa(resultado)
+
+        if self.operacion == "update":
+            resultado = []
+            for fila in filas:
+                if self._coincide(fila):
+                    fila.update(self.payload)
+                    resultado.append(dict(fila))
+            return RespuestaFalsa(resultado)
+
+        if self.operacion == "delete":
+            borradas = [f for f in filas if self._coincide(f)]
+            self.tabla.filas = [f for f in filas if not self._coincide(f)]
+            return RespuestaFalsa(borradas)
+
+        seleccion = [f for f in filas if self._coincide(f)]
+        if self.orden:
+            columna, desc = self.orden
+            if columna == "id":
+                # Las filas ya están en orden de inserción, como con un índice por id.
+                if desc:
+                    seleccion.reverse()
+            else:
+                seleccion.sort(key=lambda f: f.get(columna), reverse=desc)
+        if self.rango:
+            inicio, fin = self.rango
+            seleccion = seleccion[inicio:fin + 1]
+        if self.limite is not None:
+            seleccion = seleccion[:self.limite]
+        datos = [self._proyectar(f) for f in seleccion]
+        return RespuestaFalsa(json.loads(json.dumps(datos)))
+
+
+class TablaFalsa:
+    def __init__(self, nombre: str, clave: str = "id"):
+        self.nombre = nombre
+        self.clave = clave
+        self.filas = []
+        self._ids = count(1)
+
+    def agregar(self, fila: dict) -> dict:
+        fila = dict(fila)
+        if self.clave == "id" and "id" not in fila:
+            fila["id"] = next(self._ids)
+        self.filas.append(fila)
+        return dict(fila)
+
+
+class LlamadaRPCFalsa:
+    def __init__(self, funcion, parametros: dict, latencia: float = 0):
+        self.funcion = funcion
+        self.parametros = parametros
+        self.latencia = latencia
+
+    def execute(self) -> RespuestaFalsa:
+        if self.latencia:
+            time.sleep(self.latencia)
+        datos = self.funcion(**json.loads(json.dumps(self.parametros)))
+        return RespuestaFalsa(json.loads(json.dumps(datos)))
+
+
+class SupabaseFalso:
+    """
+    Cliente Supabase en memoria. Las tablas se crean al primer uso.
+    `latencia_ms` simula el ida y vuelta de cada petición a PostgREST.
+    `rpc("buscar_similares", ...)` hace la búsqueda por similitud coseno
+    sobre la columna `embedding` de la tabla `documentos`, como la función
+    SQL del README.
+    """
+
+    CLAVES = {"historial_chat": "session_id", "resumenes_chat": "session_id", "versiones": "tabla"}
+
+    def __init__(self, latencia_ms: float = 0):
+        self.tablas = {}
+        self.peticiones = 0
+        self.latencia = latencia_ms / 1000
+
+    def table(self, nombre: str) -> ConsultaFalsa:
+        self.peticiones += 1
+        if nombre not in self.tablas:
+            self.tablas[nombre] = TablaFalsa(nombre, self.CLAVES.get(nombre, "id"))
+        return ConsultaFalsa(self.tablas[nombre], self.latencia)
+
+    def rpc(self, nombre: str, parametros: dict) -> LlamadaRPCFalsa:
+        self.peticiones += 1
+        funciones = {"buscar_similares": self._buscar_similares}
+        return LlamadaRPCFalsa(funciones[nombre], parametros, self.latencia)
+
+    def _buscar_similares(self, query: list, top_k: int) -> list:
+        filas = self.tablas["documentos"].filas if "documentos" in self.tablas else []
+        if not filas:
+            return []
+        matriz = np.asarray([fila["embedding"] for fila in filas], dtype=np.float32)
+        consulta = np.asarray(query, dtype=np.float32)
+        similitudes = matriz @ consulta / (np.linalg.norm(matriz, axis=1) * np.linalg.norm(consulta) + 1e-12)
+        return [
+            {"id": filas[i]["id"], "texto": filas[i]["texto"], "metadatos": filas[i].get("metadatos"), "similitud": float(similitudes[i])}
+            for i in np.argsort(-similitudes)[:top_k]
+        ]
+
+
+def instalar_supabase_falso(cliente: SupabaseFalso = None) -> SupabaseFalso:
+    """
+    Registra `app.core.supabase_client` con un cliente falso antes de que se
+    importe el módulo real, que necesita credenciales para construirse.
+    """
+    cliente = cliente or SupabaseFalso()
+    modulo = types.ModuleType("app.core.supabase_client")
+    modulo.supabase = cliente
+    sys.modules["app.core.supabase_client"] = modulo
+    return cliente
+
+
+def crear_sqlite_de_prueba(ruta: str) -> str:
+    """
+    Crea una base SQLite con el esquema y los datos de `data_clients.sql`
+    (adaptando lo específico de Postgres) y devuelve su URL de SQLAlchemy.
+    """
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(raiz, "data_clients.sql"), encoding="utf-8") as f:
+        script = f.read()
+    script = (
+        script.replace("DEFAULT now()", "DEFAULT CURRENT_TIMESTAMP")
+        .replace("SERIAL PRIMARY KEY", "INTEGER PRIMARY KEY AUTOINCREMENT")
+    )
+
+    if os.path.exists(ruta):
+        os.remove(ruta)
+    with sqlite3.connect(ruta) as conexion:
+        conexion.executescript(script)
+    return f"sqlite:///{ruta}"
+
+
+class ServidorCRMFalso:
+    """
+    API REST mínima de clientes (`/clientes` y `/clientes/<id>`) en un hilo,
+    con latencia configurable para simular un CRM remoto.
+
+        with ServidorCRMFalso(latencia_ms=20) as crm:
+            os.environ["URL_CLIENTS"] = crm.url
+    """
+
+    def __init__(self, latencia_ms: float = 0):
+        self.latencia = latencia_ms / 1000
+        self.clientes = {}
+        self.peticiones = 0
+        self._ids = count(1)
+        self._lock = threading.Lock()
+        self._servidor = ThreadingHTTPServer(("127.0.0.1", 0), self._crear_manejador())
+        self.url = f"http://127.0.0.1:{self._servidor.server_port}/clientes"
+
+    def _crear_manejador(self):
+        crm = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _responder(self, estado: int, cuerpo=None):
+                datos = json.dumps(cuerpo).encode("utf-8")
+                self.send_response(estado)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(datos)))
+                self.end_headers()
+                self.wfile.write(datos)
+
+            def _cuerpo(self):
+                largo = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(largo) or b"{}")
+
+            def _id(self):
+                partes = self.path.rstrip("/").split("/")
+                return int(partes[-1]) if len(partes) > 2 else None
+
+            def _atender(self, metodo: str):
+                time.sleep(crm.latencia)
+                with crm._lock:
+                    crm.peticiones += 1
+                    id_cliente = self._id()
+                    if metodo == "GET":
+                        if id_cliente is None:
+                            return self._responder(200, list(crm.clientes.values()))
+                        cliente = crm.clientes.get(id_cliente)
+                        return self._responder(200 if cliente else 404, cliente)
+                    if metodo == "POST":
+                        cliente = {**self._cuerpo(), "id": next(crm._ids)}
+                        crm.clientes[cliente["id"]] = cliente
+                        return self._responder(201, cliente)
+                    if id_cliente not in crm.clientes:
+                        return self._responder(404, None)
+                    if metodo == "PUT":
+                        crm.clientes[id_cliente].update(self._cuerpo())
+                        return self._responder(200, crm.clientes[id_cliente])
+                    del crm.clientes[id_cliente]
+                    return self._responder(200, {"id": id_cliente})
+
+            def do_GET(self):
+                self._atender("GET")
+
+            def do_POST(self):
+                self._atender("POST")
+
+            def do_PUT(self):
+                self._atender("PUT")
+
+            def do_DELETE(self):
+                self._atender("DELETE")
+
+        return Manejador
+
+    def __enter__(self) -> "ServidorCRMFalso":
+        threading.Thread(target=self._servidor.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self._servidor.shutdown()
+        self._servidor.server_close()
+
+
+class SintetizadorFalso:
+    """
+    Sustituto de `SintetizadorGemini`: devuelve PCM de 16 bits a 24 kHz con
+    una duración proporcional al texto y contenido derivado de su hash.
+    """
+
+    def __init__(self, latencia_ms: float = 0, ms_por_caracter: float = 60):
+        self.latencia = latencia_ms / 1000
+        self.ms_por_caracter = ms_por_caracter
+        self.llamadas = 0
+
+    async def sintetizar(self, texto: str) -> bytes:
+        self.llamadas += 1
+        await asyncio.sleep(self.latencia)
+        muestras = int(24000 * len(texto) * self.ms_por_caracter / 1000)
+        patron = hashlib.sha256(texto.encode("utf-8")).digest()
+        return (patron * (muestras * 2 // len(patron) + 1))[:muestras * 2]
+
+
+class ChatGuionado(BaseChatModel):
+    """
+    Modelo de chat que devuelve `respuestas` por turnos, en bucle, tardando
+    `latencia_ms` en cada llamada. Con `guion`, la respuesta es
+    `guion(mensajes)`: depende solo de la conversación, así que sirve con
+    peticiones concurrentes. Un `AIMessage` con `tool_calls` hace que el
+    agente ejecute esas herramientas; en streaming el texto sale por palabras.
+    `model` es el nombre con el que aparece en las trazas (`llm:<model>`).
+    """
+
+    respuestas: List[AIMessage] = []
+    guion: Optional[Callable[[List[BaseMessage]], AIMessage]] = None
+    model: str = "guionado"
+    latencia_ms: float = 0
+    llamadas: int = 0
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    @property
+    def _llm_type(self) -> str:
+        return "guionado"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"model": self.model}
+
+    def _siguiente(self, mensajes: List[BaseMessage]) -> AIMessage:
+        llamada = self.llamadas
+        self.llamadas += 1
+        if self.guion is not None:
+            return self.guion(mensajes)
+        return self.respuestas[llamada % len(self.respuestas)]
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        time.sleep(self.latencia_ms / 1000)
+        return ChatResult(generations=[ChatGeneration(message=self._siguiente(messages))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self.latencia_ms / 1000)
+        return ChatResult(generations=[ChatGeneration(message=self._siguiente(messages))])
+
+    def _stream(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latencia_ms / 1000)
+        respuesta = self._siguiente(messages)
+        if respuesta.tool_calls:
+            yield ChatGenerationChunk(message=AIMessageChunk(content="", tool_call_chunks=[
+                {"name": llamada["name"], "args": json.dumps(llamada["args"]), "id": llamada["id"], "index": i}
+                for i, llamada in enumerate(respuesta.tool_calls)
+            ]))
+            return
+        for palabra in respuesta.content.split(" "):
+            trozo = ChatGenerationChunk(message=AIMessageChunk(content=palabra + " "))
+            if run_manager:
+                run_manager.on_llm_new_token(trozo.text, chunk=trozo)
+            yield trozo
+
+
+class GuardianFalso:
+    """
+    Sustituye a `cadena_guardian` y `cadena_guardian_lote`: clasifica como
+    maliciosas las consultas que contienen `marca` y tarda `latencia_ms` por
+    llamada, sea de una consulta o de un lote.
+    """
+
+    def __init__(self, latencia_ms: float = 0, marca: str = "borra"):
+        self.latencia = latencia_ms / 1000
+        self.marca = marca
+        self.llamadas = 0
+
+    def _clasificar(self, consulta: str) -> str:
+        return "maliciosa" if self.marca in consulta.lower() else "segura"
+
+    async def ainvoke(self, entrada: dict, config=None) -> AIMessage:
+        self.llamadas += 1
+        await asyncio.sleep(self.latencia)
+        if "peticiones" in entrada:
+            consultas = json.loads(entrada["peticiones"])
+            return AIMessage(content=json.dumps([self._clasificar(c) for c in consultas]))
+        return AIMessage(content=self._clasificar(entrada["input"]))
+
+
+class ModeloEmbeddingsFalso:
+    """
+    Sustituto de SentenceTransformer: suma vectores pseudoaleatorios por
+    palabra, así que dos textos que comparten palabras son parecidos. Se
+    instala con `recursos["embeddings"].fabrica = ModeloEmbeddingsFalso`.
+    """
+
+    def __init__(self, dimension: int = 384):
+        self.dimension = dimension
+
+    def _vector(self, texto: str) -> np.ndarray:
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for palabra in texto.lower().split():
+            vector += np.random.default_rng(zlib.crc32(palabra.encode())).normal(size=self.dimension)
+        return vector
+
+    def encode(self, textos, batch_size: int = 32, **kwargs) -> np.ndarray:
+        if isinstance(textos, str):
+            return self._vector(textos)
+        return np.stack([self._vector(texto) for texto in textos])
+
+
+class CrossEncoderFalso:
+    """
+    Sustituto del CrossEncoder: puntúa cada par (consulta, texto) por las
+    palabras que comparten. `ms_por_par` simula el coste del forward.
+    """
+
+    def __init__(self, ms_por_par: float = 0):
+        self.ms_por_par = ms_por_par
+
+    def predict(self, pares, batch_size: int = 32, **kwargs) -> np.ndarray:
+        time.sleep(len(pares) * self.ms_por_par / 1000)
+        puntuaciones = []
+        for consulta, texto in pares:
+            palabras = set(consulta.lower().split())
+            puntuaciones.append(len(palabras & set(texto.lower().split())) / (len(palabras) or 1))
+        return np.asarray(puntuaciones, dtype=np.float32)
+
+
+class TranscriptorFalso:
+    """
+    Sustituto del `GenerativeModel` de transcripción: devuelve `texto` tras
+    `latencia_ms`. Si `texto` es una función, recibe el número de llamada, así
+    cada audio puede transcribirse distinto.
+    """
+
+    def __init__(self, texto: Union[str, Callable[[int], str]], latencia_ms: float = 0):
+        self.texto = texto
+        self.latencia = latencia_ms / 1000
+        self.llamadas = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, partes) -> types.SimpleNamespace:
+        with self._lock:
+            self.llamadas += 1
+            numero = self.llamadas
+        time.sleep(self.latencia)
+        return types.SimpleNamespace(text=self.texto(numero) if callable(self.texto) else self.texto)
@@ -0,0 +1,55 @@
+"""
+Exporta los modelos de embeddings y de rerank a ONNX con cuantización
+dinámica int8, para cargarlos con MODELOS_BACKEND=onnx (arranque y inferencia
+en CPU más rápidos, sin torch en el camino caliente).
+
+Necesita las dependencias opcionales de ONNX:
+    pip install "sentence-transformers[onnx]"
+
+Uso:
+    python -m scripts.exportar_onnx
+    python -m scripts.exportar_onnx --cuantizacion avx512_vnni
+"""
+import argparse
+import os
+import time
+
+from app.core.config import MODELOS_ONNX_RUTA, ONNX_CUANTIZACION
+from app.core.modelos import MODELO_EMBEDDINGS, MODELO_RERANK, ruta_onnx
+
+
+def exportar(clase, nombre: str, cuantizacion: str) -> str:
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+
+    ruta = ruta_onnx(nombre)
+    inicio = time.perf_counter()
+    # Con backend="onnx" se exporta el grafo en float32; después se cuantiza a partir de él.
+    modelo = clase(nombre, backend="onnx")
+    modelo.save_pretrained(ruta)
+    export_dynamic_quantized_onnx_model(modelo, cuantizacion, ruta)
+    print(f"{nombre}: {ruta}/onnx/model_qint8_{cuantizacion}.onnx ({time.perf_counter() - inicio:.1f}s)")
+    return ruta
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--cuantizacion",
+        default=ONNX_CUANTIZACION,
+        choices=["arm64", "avx2", "avx512", "avx512_vnni"],
+        help="Conjunto de instrucciones de la CPU donde se va a servir.",
+    )
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.cross_encoder import CrossEncoder
+
+    os.makedirs(MODELOS_ONNX_RUTA, exist_ok=True)
+    exportar(SentenceTransformer, MODELO_EMBEDDINGS, args.cuantizacion)
+    exportar(CrossEncoder, MODELO_RERANK, args.cuantizacion)
+    if args.cuantizacion != ONNX_CUANTIZACION:
+        print(f"Recuerda poner ONNX_CUANTIZACION={args.cuantizacion} junto con MODELOS_BACKEND=onnx.")
+
+
+if __name__ == "__main__":
+    main()
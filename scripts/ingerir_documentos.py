@@ -0,0 +1,64 @@
+"""
+Ingiere archivos en la tabla `documentos`: los trocea con solapamiento, embebe
+en lotes solo los fragmentos que no estén ya guardados y los sube con upserts
+por páginas. Si se interrumpe, volver a lanzarlo continúa donde se quedó.
+
+Acepta `.jsonl` (un {"texto": ..., "metadatos": {...}} por línea) y texto
+plano; con un directorio se ingieren todos sus archivos.
+
+Uso:
+    python -m scripts.ingerir_documentos corpus.jsonl
+    python -m scripts.ingerir_documentos docs/ --tamano 800 --solapamiento 100
+"""
+import argparse
+import os
+
+from app.core.config import (
+    BUSQUEDA_HIBRIDA,
+    INGESTA_SOLAPAMIENTO,
+    INGESTA_TAMANO_FRAGMENTO,
+    INGESTA_TAMANO_PAGINA,
+    RECUPERADOR,
+)
+from app.core.logs import configurar_logs
+from app.services.ingesta import Ingestor
+
+
+def archivos(rutas):
+    for ruta in rutas:
+        if not os.path.isdir(ruta):
+            yield ruta
+            continue
+        for raiz, _, nombres in os.walk(ruta):
+            for nombre in sorted(nombres):
+                if not nombre.endswith((".ingesta.json", ".ingesta.json.tmp")):
+                    yield os.path.join(raiz, nombre)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("rutas", nargs="+")
+    parser.add_argument("--tamano", type=int, default=INGESTA_TAMANO_FRAGMENTO)
+    parser.add_argument("--solapamiento", type=int, default=INGESTA_SOLAPAMIENTO)
+    parser.add_argument("--pagina", type=int, default=INGESTA_TAMANO_PAGINA)
+    parser.add_argument("--desde-cero", action="store_true", help="Ignora el progreso guardado.")
+    args = parser.parse_args()
+    configurar_logs()
+
+    ingestor = Ingestor(tamano_pagina=args.pagina)
+    total = {"fragmentos": 0, "nuevos": 0, "segundos": 0.0}
+    for ruta in archivos(args.rutas):
+        resumen = ingestor.ingerir_archivo(ruta, args.tamano, args.solapamiento, reanudar=not args.desde_cero)
+        print(f"{ruta}: {resumen}")
+        for clave in total:
+            total[clave] += resumen[clave]
+
+    ritmo = total["fragmentos"] / total["segundos"] if total["segundos"] else 0
+    print(f"Total: {total['fragmentos']} fragmentos, {total['nuevos']} nuevos, "
+          f"{total['segundos']:.1f}s ({ritmo:.0f} fragmentos/s).")
+    if RECUPERADOR == "local" or BUSQUEDA_HIBRIDA:
+        print("Actualiza los índices locales: python -m scripts.sincronizar_indice --desde-supabase")
+
+
+if __name__ == "__main__":
+    main()
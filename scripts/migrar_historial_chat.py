@@ -0,0 +1,14 @@
+"""
+Migra el historial guardado como blob en `historial_chat` a la tabla
+`mensajes_chat` (una fila por mensaje).
+
+Uso:
+    python -m scripts.migrar_historial_chat
+"""
+from app.core.logs import configurar_logs
+from app.core.memory import migrar_historial_chat
+
+if __name__ == "__main__":
+    configurar_logs()
+    migradas = migrar_historial_chat()
+    print(f"Migración completada: {migradas} sesiones migradas.")
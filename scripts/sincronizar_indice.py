@@ -0,0 +1,103 @@
+"""
+Construye el índice vectorial local que usa RECUPERADOR=local y el índice
+léxico (BM25) que la búsqueda híbrida combina con cualquiera de los dos
+recuperadores.
+
+Los documentos pueden venir de la tabla `documentos` de Supabase (con sus
+embeddings ya calculados) o de un archivo con el formato que acepta
+`scripts.ingerir_documentos`, que se trocea igual que en la ingesta y se
+embebe aquí. Así los ids coinciden con los de Supabase (el hash de cada
+fragmento) y la búsqueda híbrida no cuenta dos veces el mismo fragmento.
+
+Uso:
+    python -m scripts.sincronizar_indice --desde-supabase
+    python -m scripts.sincronizar_indice --archivo documentos.jsonl --listas-ivf 256
+"""
+import argparse
+import json
+import time
+
+from app.core.config import INDICE_IVF_LISTAS, INDICE_LOCAL_RUTA, INGESTA_SOLAPAMIENTO, INGESTA_TAMANO_FRAGMENTO
+from app.core.indice_lexico import IndiceLexico
+from app.core.indice_vectorial import IndiceVectorial
+from app.core.logs import configurar_logs
+
+TAMANO_PAGINA = 1000
+TAMANO_LOTE_EMBEDDINGS = 256
+
+
+def leer_desde_supabase():
+    from app.core.supabase_client import supabase
+
+    documentos, embeddings = [], []
+    inicio = 0
+    while True:
+        filas = (
+            supabase.table("documentos")
+            .select("id, texto, metadatos, embedding")
+            .order("id")
+            .range(inicio, inicio + TAMANO_PAGINA - 1)
+            .execute()
+        ).data or []
+
+        for fila in filas:
+            embedding = fila["embedding"]
+            # PostgREST devuelve las columnas vector como texto "[0.1,0.2,...]".
+            if isinstance(embedding, str):
+                embedding = json.loads(embedding)
+            embeddings.append(embedding)
+            documentos.append({"id": fila["id"], "texto": fila["texto"], "metadatos": fila.get("metadatos") or {}})
+
+        print(f"--- {len(documentos)} documentos leídos de Supabase ---")
+        if len(filas) < TAMANO_PAGINA:
+            return documentos, embeddings
+        inicio += TAMANO_PAGINA
+
+
+def leer_desde_archivo(ruta: str, tamano: int, solapamiento: int):
+    from app.core.embedding import generar_embeddings
+    from app.services.ingesta import fragmentar, leer_documentos
+
+    # Mismo troceo e ids que `scripts.ingerir_documentos` con el mismo tamaño y
+    # solapamiento; como en la ingesta, un fragmento repetido se queda con su primera aparición.
+    unicos = {}
+    for fragmento in fragmentar(leer_documentos(ruta), tamano, solapamiento):
+        unicos.setdefault(fragmento["id"], fragmento)
+    documentos = list(unicos.values())
+
+    embeddings = []
+    for inicio in range(0, len(documentos), TAMANO_LOTE_EMBEDDINGS):
+        lote = documentos[inicio:inicio + TAMANO_LOTE_EMBEDDINGS]
+        embeddings.extend(generar_embeddings([doc["texto"] for doc in lote]))
+        print(f"--- {len(embeddings)}/{len(documentos)} documentos embebidos ---")
+    return documentos, embeddings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    origen = parser.add_mutually_exclusive_group(required=True)
+    origen.add_argument("--desde-supabase", action="store_true")
+    origen.add_argument("--archivo")
+    parser.add_argument("--ruta", default=INDICE_LOCAL_RUTA)
+    parser.add_argument("--listas-ivf", type=int, default=INDICE_IVF_LISTAS)
+    parser.add_argument("--tamano", type=int, default=INGESTA_TAMANO_FRAGMENTO, help="Solo con --archivo.")
+    parser.add_argument("--solapamiento", type=int, default=INGESTA_SOLAPAMIENTO, help="Solo con --archivo.")
+    args = parser.parse_args()
+    configurar_logs()
+
+    inicio = time.perf_counter()
+    if args.desde_supabase:
+        documentos, embeddings = leer_desde_supabase()
+    else:
+        documentos, embeddings = leer_desde_archivo(args.archivo, args.tamano, args.solapamiento)
+
+    indice = IndiceVectorial.construir(args.ruta, embeddings, documentos, listas_ivf=args.listas_ivf)
+    # Después del vectorial: comparte el documentos.json de su generación.
+    lexico = IndiceLexico.construir(args.ruta, documentos, generacion=indice.generacion)
+    modo = f"IVF con {args.listas_ivf} listas" if indice.centroides is not None else "exacto"
+    print(f"Índice {modo} y léxico ({len(lexico.vocabulario)} términos) con {len(indice)} documentos "
+          f"escritos en {args.ruta} en {time.perf_counter() - inicio:.1f}s.")
+
+
+if __name__ == "__main__":
+    main()
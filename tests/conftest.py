@@ -0,0 +1,19 @@
+"""
+Las pruebas corren sin red ni credenciales: antes de importar `app` se
+registra el cliente Supabase en memoria de `benchmarks.fakes`, se crea una
+SQLite con `data_clients.sql` y se fijan las variables de entorno que leen
+los módulos al importarse.
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fakes import SupabaseFalso, crear_sqlite_de_prueba, instalar_supabase_falso
+
+instalar_supabase_falso(SupabaseFalso())
+os.environ["DATABASE_URL"] = crear_sqlite_de_prueba(os.path.join(tempfile.mkdtemp(), "clientes.db"))
+os.environ.setdefault("GEMINI_API_KEY", "clave-falsa")
+os.environ.setdefault("PRECARGAR_RECURSOS", "false")
+os.environ.setdefault("LOG_NIVEL", "WARNING")
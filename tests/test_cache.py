@@ -0,0 +1,26 @@
+from app.core.cache import CacheLRU
+
+
+def test_max_peso_expulsa_las_entradas_mas_antiguas():
+    cache = CacheLRU(100, max_peso=10)
+    cache.set("a", b"1234")
+    cache.set("b", b"1234")
+    cache.get("a")
+    cache.set("c", b"1234")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == b"1234" and cache.get("c") == b"1234"
+    assert cache.estadisticas()["peso"] == 8
+
+
+def test_max_peso_reemplazar_y_quitar_descuentan_el_peso():
+    cache = CacheLRU(100, max_peso=10)
+    cache.set("a", b"12345678")
+    cache.set("a", b"12")
+    cache.set("b", b"12345678")
+    assert cache.estadisticas()["peso"] == 10
+
+    cache.pop("a")
+    cache.set("demasiado", b"x" * 11)
+    assert cache.get("demasiado") is None
+    assert cache.estadisticas()["peso"] == 8
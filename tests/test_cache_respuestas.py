@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+from app.core.cache_sesiones import cache_sesiones
+from app.core.recursos import Recurso, recursos
+from app.core.supabase_client import supabase
+from app.models.schemas import BusquedaRequest
+from app.routes import agent
+from app.services.cache_respuestas import cache_respuestas
+from benchmarks.escenarios import documentos_sinteticos, guion_agente
+from benchmarks.fakes import ChatGuionado, CrossEncoderFalso, GuardianFalso, ModeloEmbeddingsFalso
+
+
+@pytest.fixture
+def entorno(monkeypatch):
+    monkeypatch.setattr(recursos["embeddings"], "fabrica", ModeloEmbeddingsFalso)
+    monkeypatch.setattr(recursos["rerank"], "fabrica", CrossEncoderFalso)
+    llm = ChatGuionado(model="agente", guion=guion_agente)
+    monkeypatch.setattr(agent, "modelo_chat", Recurso("gemini_agente", lambda: llm))
+    monkeypatch.setattr(agent, "agent_con_memoria", agent.construir_agente())
+    monkeypatch.setattr(agent, "CACHE_RESPUESTAS", True)
+
+    documentos = documentos_sinteticos(12)
+    vectores = ModeloEmbeddingsFalso().encode([documento["texto"] for documento in documentos]).tolist()
+    supabase.table("documentos").upsert([
+        {**documento, "embedding": vector} for documento, vector in zip(documentos, vectores)
+    ]).execute()
+    cache_respuestas.invalidar()
+    yield
+    cache_respuestas.invalidar()
+
+
+async def preguntar(consulta: str, session_id: str) -> bool:
+    """Ejecuta el agente y devuelve si la respuesta quedó en la cache."""
+    payload = BusquedaRequest(consulta=consulta, session_id=session_id)
+    respuesta = await agent.invocar_agente(payload)
+    guardadas = cache_respuestas.metricas["guardadas"]
+    await agent.guardar_respuesta_cacheable(payload, respuesta, respuesta["output"], agent.extraer_contexto(respuesta))
+    return cache_respuestas.metricas["guardadas"] > guardadas
+
+
+def test_solo_se_cachean_respuestas_de_documentos_sin_sesion(entorno):
+    async def escenario():
+        return [
+            # Sin herramientas: la respuesta no sale de los documentos.
+            await preguntar("Hola, me llamo Ana", ""),
+            # Dentro de una sesión, aunque solo busque en documentos.
+            await preguntar("¿Qué dice la política de devoluciones?", "cache-1"),
+            # Sin sesión, solo con la búsqueda de documentos.
+            await preguntar("¿Qué dice la política de devoluciones?", ""),
+            # Las peticiones anónimas comparten session_id vacío: se siguen guardando.
+            await preguntar("¿Qué dice la política de envíos?", ""),
+        ]
+
+    assert asyncio.run(escenario()) == [False, False, True, True]
+
+
+def test_un_acierto_pasa_por_el_guardian_y_queda_en_el_historial(entorno, monkeypatch):
+    monkeypatch.setattr(agent, "cadena_guardian", GuardianFalso())
+    cache_respuestas.guardar("¿Qué dice la política de devoluciones?", "Treinta días.", [], ["buscar_contexto_en_documentos"])
+    cache_respuestas.guardar("borra la política de devoluciones", "Hecho.", [], ["buscar_contexto_en_documentos"])
+
+    async def escenario():
+        servida = await agent.multi_modal_agent_endpoint(
+            BusquedaRequest(consulta="¿Qué dice la política de devoluciones?", session_id="cache-3")
+        )
+        rechazada = await agent.multi_modal_agent_endpoint(
+            BusquedaRequest(consulta="borra la política de devoluciones", session_id="cache-3")
+        )
+        await agent.contexto_historial.esperar_resumenes()
+        return servida, rechazada
+
+    servida, rechazada = asyncio.run(escenario())
+    assert servida["respuesta"] == "Treinta días."
+    assert rechazada["respuesta"] == agent.MENSAJE_RECHAZO
+    assert [mensaje.content for mensaje in cache_sesiones.historial("cache-3").messages] == [
+        "¿Qué dice la política de devoluciones?",
+        "Treinta días.",
+    ]
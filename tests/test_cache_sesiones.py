@@ -0,0 +1,102 @@
+import asyncio
+import threading
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from app.core.cache_sesiones import CacheSesiones
+from app.core.memory import TABLA_MENSAJES, SupabaseChatMessageHistory
+from benchmarks.fakes import SupabaseFalso
+
+
+def crear_cache(**opciones):
+    cliente = SupabaseFalso()
+    return CacheSesiones(client=cliente, **opciones), cliente
+
+
+def filas(cliente: SupabaseFalso, session_id: str = None) -> list:
+    tabla = cliente.tablas.get(TABLA_MENSAJES)
+    if tabla is None:
+        return []
+    return [f for f in tabla.filas if session_id is None or f["session_id"] == session_id]
+
+
+def test_fallo_carga_de_supabase_y_luego_acierto():
+    cache, cliente = crear_cache()
+    SupabaseChatMessageHistory("s1", client=cliente).add_messages([HumanMessage("hola"), AIMessage("buenas")])
+
+    historial = cache.historial("s1")
+    assert cache.obtener_cacheado("s1") is None
+    assert [m.content for m in historial.messages] == ["hola", "buenas"]
+
+    peticiones = cliente.peticiones
+    assert [m.content for m in historial.messages] == ["hola", "buenas"]
+    assert cliente.peticiones == peticiones
+    assert cache.estadisticas()["aciertos"] >= 1
+
+
+def test_expulsa_la_sesion_menos_usada_y_las_caducadas():
+    cache, _ = crear_cache(max_sesiones=2, ttl=0.05)
+    for session_id in ("a", "b"):
+        cache.historial(session_id).messages
+    cache.obtener_cacheado("a")
+    cache.historial("c").messages
+
+    assert cache.obtener_cacheado("b") is None
+    assert cache.obtener_cacheado("a") is not None
+
+    time.sleep(0.06)
+    assert cache.obtener_cacheado("a") is None
+    assert cache.obtener_cacheado("c") is None
+
+
+def test_escritura_diferida_agrupa_las_sesiones_en_un_insert():
+    cache, cliente = crear_cache()
+    for session_id in ("a", "b", "c"):
+        cache.historial(session_id).add_messages([HumanMessage(f"pregunta {session_id}"), AIMessage("respuesta")])
+    assert filas(cliente) == []
+    assert cache.estadisticas()["pendientes"] == 6
+
+    peticiones = cliente.peticiones
+    assert cache.flush() == 6
+    assert cliente.peticiones == peticiones + 1
+    assert len(filas(cliente)) == 6
+    assert cache.flush() == 0
+
+
+def test_la_carga_incluye_lo_pendiente_de_volcar():
+    cache, cliente = crear_cache()
+    SupabaseChatMessageHistory("s1", client=cliente).add_messages([HumanMessage("antigua")])
+    cache.agregar("s1", [HumanMessage("nueva")])
+
+    assert [m.content for m in cache.historial("s1").messages] == ["antigua", "nueva"]
+
+
+def test_detener_vuelca_lo_pendiente():
+    cache, cliente = crear_cache(intervalo_flush=3600)
+
+    async def sesion():
+        cache.iniciar()
+        await cache.historial("s1").aadd_messages([HumanMessage("hola"), AIMessage("buenas")])
+        assert filas(cliente) == []
+        await cache.detener()
+
+    asyncio.run(sesion())
+    assert [f["mensaje"]["data"]["content"] for f in filas(cliente, "s1")] == ["hola", "buenas"]
+
+
+def test_borrar_la_sesion_espera_al_volcado_en_curso():
+    cache, cliente = crear_cache()
+    cache.agregar("s1", [HumanMessage("hola")])
+    cliente.latencia = 0.1
+
+    # Solo el insert del volcado es lento; el borrado llega mientras está en curso.
+    volcado = threading.Thread(target=cache.flush)
+    volcado.start()
+    time.sleep(0.02)
+    cliente.latencia = 0
+    cache.historial("s1").clear()
+    volcado.join()
+
+    assert filas(cliente, "s1") == []
+    assert cache.flush() == 0
@@ -0,0 +1,43 @@
+from langchain_core.agents import AgentAction
+from sqlalchemy import text
+
+from app.core.sql_database import db, engine
+from app.services.cache_sql import CacheConsultasSQL, extraer_consulta
+
+SQL = "SELECT count(*) FROM clientes WHERE sexo = 'F'"
+
+
+def paso(sql: str, observacion: str) -> tuple:
+    return AgentAction(tool="sql_db_query", tool_input={"query": sql}, log=""), observacion
+
+
+def test_extrae_la_unica_consulta_con_exito():
+    pasos = [
+        (AgentAction(tool="sql_db_schema", tool_input="clientes", log=""), "CREATE TABLE clientes ..."),
+        paso("SELECT nombre FROM cliente", "Error: no such table: cliente"),
+        paso(SQL, "[(3,)]"),
+    ]
+    assert extraer_consulta(pasos) == (SQL, "[(3,)]")
+
+
+def test_no_extrae_nada_si_la_respuesta_usa_varias_consultas():
+    pasos = [paso(SQL, "[(3,)]"), paso("SELECT count(*) FROM ventas", "[(10,)]")]
+    assert extraer_consulta(pasos) is None
+    assert extraer_consulta([]) is None
+
+
+def test_tras_un_cambio_devuelve_la_respuesta_solo_si_las_filas_no_cambian():
+    cache = CacheConsultasSQL()
+    cache.guardar("¿Cuántas clientas hay?", SQL, db.run(SQL), "Hay varias clientas.")
+    assert cache.buscar("cuantas clientas hay") == "Hay varias clientas."
+
+    # Cambio que no afecta al resultado: misma respuesta, no un volcado de filas.
+    cache.invalidar_tabla("clientes")
+    assert cache.buscar("¿Cuántas clientas hay?") == "Hay varias clientas."
+
+    with engine.begin() as conexion:
+        conexion.execute(text(
+            "INSERT INTO clientes (id, nombre, sexo, fecha_nacimiento) VALUES ('nueva', 'Nueva', 'F', '1980-01-01')"
+        ))
+    cache.invalidar_tabla("clientes")
+    assert cache.buscar("¿Cuántas clientas hay?") is None
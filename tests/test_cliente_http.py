@@ -0,0 +1,102 @@
+import asyncio
+
+import httpx
+import pytest
+
+from app.core.cliente_http import ClienteHTTP
+from app.tools import agent_tools
+from benchmarks.fakes import ServidorCRMFalso
+
+
+def cliente_con(respuestas, **opciones):
+    """ClienteHTTP sin red: cada petición consume la siguiente respuesta (un estado o una excepción)."""
+    llamadas = []
+    pendientes = list(respuestas)
+
+    def atender(request: httpx.Request) -> httpx.Response:
+        llamadas.append(request.method)
+        respuesta = pendientes.pop(0)
+        if isinstance(respuesta, Exception):
+            raise respuesta
+        return httpx.Response(respuesta, json={})
+
+    cliente = ClienteHTTP(backoff=0, **opciones)
+    cliente._cliente = httpx.AsyncClient(transport=httpx.MockTransport(atender))
+    return cliente, llamadas
+
+
+@pytest.mark.parametrize("metodo", ["GET", "PUT", "DELETE"])
+def test_los_metodos_idempotentes_se_reintentan_en_502_503_504(metodo):
+    cliente, llamadas = cliente_con([502, 503, 504, 200], reintentos=3)
+    respuesta = asyncio.run(cliente.request(metodo, "http://crm/clientes/1"))
+    assert respuesta.status_code == 200
+    assert llamadas == [metodo] * 4
+
+
+def test_post_no_se_reintenta():
+    cliente, llamadas = cliente_con([503, 200], reintentos=3)
+    assert asyncio.run(cliente.post("http://crm/clientes")).status_code == 503
+    assert llamadas == ["POST"]
+
+    cliente, llamadas = cliente_con([httpx.ConnectError("sin conexión"), 200], reintentos=3)
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(cliente.post("http://crm/clientes"))
+    assert llamadas == ["POST"]
+
+
+@pytest.mark.parametrize("estado", [400, 404, 500])
+def test_otros_errores_no_se_reintentan(estado):
+    cliente, llamadas = cliente_con([estado, 200], reintentos=3)
+    assert asyncio.run(cliente.get("http://crm/clientes/1")).status_code == estado
+    assert llamadas == ["GET"]
+
+
+def test_los_reintentos_se_agotan_y_devuelven_la_ultima_respuesta():
+    cliente, llamadas = cliente_con([503, 503, 503], reintentos=2)
+    assert asyncio.run(cliente.get("http://crm/clientes/1")).status_code == 503
+    assert len(llamadas) == 3
+
+    cliente, llamadas = cliente_con([httpx.ConnectError("caído")] * 2 + [200], reintentos=2)
+    assert asyncio.run(cliente.get("http://crm/clientes/1")).status_code == 200
+
+
+def test_la_concurrencia_queda_acotada():
+    activas = {"ahora": 0, "maximo": 0}
+
+    async def atender(request: httpx.Request) -> httpx.Response:
+        activas["ahora"] += 1
+        activas["maximo"] = max(activas["maximo"], activas["ahora"])
+        await asyncio.sleep(0.01)
+        activas["ahora"] -= 1
+        return httpx.Response(200, json={})
+
+    async def escenario():
+        cliente = ClienteHTTP(max_concurrencia=3)
+        cliente._cliente = httpx.AsyncClient(transport=httpx.MockTransport(atender))
+        await asyncio.gather(*(cliente.get(f"http://crm/clientes/{i}") for i in range(12)))
+
+    asyncio.run(escenario())
+    assert activas["maximo"] == 3
+
+
+def test_buscar_info_cliente_se_cachea_y_editar_lo_invalida(monkeypatch):
+    monkeypatch.setattr(agent_tools, "cliente_crm", ClienteHTTP())
+    agent_tools.cache_clientes.clear()
+
+    async def escenario():
+        primero = await agent_tools.buscar_info_cliente.ainvoke({"id": 1})
+        en_cache = await agent_tools.buscar_info_cliente.ainvoke({"id": 1})
+        await agent_tools.editar_cliente.ainvoke({"id": 1, "nombre": "Ana", "email": "nueva@ejemplo.com"})
+        editado = await agent_tools.buscar_info_cliente.ainvoke({"id": 1})
+        await agent_tools.cliente_crm.cerrar()
+        return primero, en_cache, editado
+
+    with ServidorCRMFalso() as crm:
+        crm.clientes[1] = {"id": 1, "name": "Ana", "email": "ana@ejemplo.com"}
+        monkeypatch.setattr(agent_tools, "URL_CLIENTS", crm.url)
+        primero, en_cache, editado = asyncio.run(escenario())
+
+    assert primero == en_cache
+    assert "nueva@ejemplo.com" in str(editado)
+    # Dos lecturas (la segunda, tras invalidar) y la edición; la consulta repetida no llega al CRM.
+    assert crm.peticiones == 3
@@ -0,0 +1,95 @@
+import asyncio
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from app.core.cache_sesiones import CacheSesiones
+from app.core.memory import SupabaseChatMessageHistory
+from app.services.contexto_historial import ContextoHistorial
+from benchmarks.fakes import SupabaseFalso
+
+
+def crear_contexto(ventana: int):
+    cliente = SupabaseFalso()
+    sesiones = CacheSesiones(client=cliente, ventana=ventana)
+    resumidos = []
+
+    async def resumir(resumen, mensajes):
+        resumidos.append([mensaje.content for mensaje in mensajes])
+        return f"{resumen} +{len(mensajes)}".strip()
+
+    contexto = ContextoHistorial(
+        sesiones=sesiones, presupuesto=20, min_pendientes=2, turnos_recuperados=0, resumir=resumir
+    )
+    return contexto, sesiones, cliente, resumidos
+
+
+def turnos(n: int, desde: int = 0):
+    mensajes = []
+    for i in range(desde, desde + n):
+        mensajes += [HumanMessage(f"pregunta {i} " + "x" * 40, id=f"h{i}"), AIMessage(f"respuesta {i}", id=f"a{i}")]
+    return mensajes
+
+
+def test_resumen_incremental_no_repite_mensajes():
+    contexto, sesiones, cliente, resumidos = crear_contexto(ventana=50)
+    SupabaseChatMessageHistory("s", client=cliente).add_messages(turnos(6))
+
+    asyncio.run(contexto._actualizar_resumen("s"))
+    sesiones.agregar("s", turnos(2, desde=6))
+    asyncio.run(contexto._actualizar_resumen("s"))
+
+    vistos = [contenido for lote in resumidos for contenido in lote]
+    assert len(resumidos) == 2
+    assert len(vistos) == len(set(vistos))
+
+
+def test_resume_los_mensajes_que_salieron_de_la_cola_cargada():
+    contexto, sesiones, cliente, resumidos = crear_contexto(ventana=8)
+    SupabaseChatMessageHistory("s", client=cliente).add_messages(turnos(10))
+    sesiones.actualizar_resumen("s", "resumen previo", "h0")
+
+    asyncio.run(contexto._actualizar_resumen("s"))
+
+    # Se resume desde el ancla, incluidos los mensajes anteriores a los 8 cargados.
+    vistos = [contenido.split(" x")[0] for lote in resumidos for contenido in lote]
+    assert vistos[:2] == ["respuesta 0", "pregunta 1"]
+    assert all(f"pregunta {i}" in vistos for i in range(1, 6))
+    assert sesiones.obtener_resumen("s")["hasta_fila"] is not None
+
+    sesiones.agregar("s", turnos(1, desde=10))
+    asyncio.run(contexto._actualizar_resumen("s"))
+    vistos = [contenido.split(" x")[0] for lote in resumidos for contenido in lote]
+    assert len(vistos) == len(set(vistos))
+
+
+def test_sesion_larga_que_cabe_en_el_presupuesto_no_pierde_mensajes():
+    cliente = SupabaseFalso()
+    sesiones = CacheSesiones(client=cliente, ventana=50)
+    resumidos = []
+
+    async def resumir(resumen, mensajes):
+        resumidos.extend(mensaje.content for mensaje in mensajes)
+        return " | ".join(filter(None, [resumen] + [mensaje.content for mensaje in mensajes]))
+
+    def embeber(textos):
+        return [[1.0, 0.0] if "nombre" in texto else [0.0, 1.0] for texto in textos]
+
+    contexto = ContextoHistorial(
+        sesiones=sesiones, presupuesto=10_000, min_pendientes=2, turnos_recuperados=1, resumir=resumir, embeber=embeber
+    )
+    mensajes = [HumanMessage("mi nombre es Ana 0", id="h0"), AIMessage("hola", id="a0")]
+    for i in range(1, 100):
+        mensajes += [HumanMessage(f"dato {i}", id=f"h{i}"), AIMessage("ok", id=f"a{i}")]
+    SupabaseChatMessageHistory("s", client=cliente).add_messages(mensajes)
+
+    asyncio.run(contexto._actualizar_resumen("s"))
+
+    assert len(resumidos) == 150
+    assert "mi nombre es Ana 0" in sesiones.obtener_resumen("s")["resumen"]
+
+    # Sin el resumen, el turno sigue al alcance de la recuperación aunque no esté entre los 50 cargados.
+    sesiones.actualizar_resumen("s", "", *[sesiones.obtener_resumen("s")[clave] for clave in ("hasta", "hasta_fila")])
+    cargados = sesiones.historial("s").messages
+    assert "h0" not in [mensaje.id for mensaje in cargados]
+    entrada = asyncio.run(contexto.construir("s", cargados, "¿cuál es mi nombre?"))
+    assert "mi nombre es Ana 0" in entrada[0].content
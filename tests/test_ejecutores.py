@@ -0,0 +1,102 @@
+import asyncio
+import contextvars
+import threading
+import time
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.ejecutores import POOLS_ADMISION, EjecutorAcotado, PoolSaturado, pool_ingesta, pool_red, pool_saturado
+from app.routes import agent
+
+variable = contextvars.ContextVar("variable", default=None)
+
+
+def test_el_trabajo_bloqueante_no_para_el_event_loop():
+    pool = EjecutorAcotado("prueba", trabajadores=2, max_cola=10)
+
+    async def escenario():
+        latidos = 0
+
+        async def latir():
+            nonlocal latidos
+            while True:
+                await asyncio.sleep(0.01)
+                latidos += 1
+
+        latido = asyncio.create_task(latir())
+        await pool.ejecutar(time.sleep, 0.2)
+        latido.cancel()
+        return latidos
+
+    try:
+        assert asyncio.run(escenario()) >= 10
+    finally:
+        pool.shutdown()
+
+
+def test_ejecutar_copia_el_contexto_y_mide_la_espera():
+    pool = EjecutorAcotado("prueba", trabajadores=1, max_cola=10)
+
+    async def escenario():
+        variable.set("petición 1")
+        return await pool.ejecutar(variable.get)
+
+    try:
+        assert asyncio.run(escenario()) == "petición 1"
+        estadisticas = pool.estadisticas()
+        assert estadisticas["completadas"] == 1
+        assert estadisticas["en_cola"] == 0
+    finally:
+        pool.shutdown()
+
+
+def test_con_la_cola_llena_se_rechaza_en_lugar_de_esperar():
+    pool = EjecutorAcotado("prueba", trabajadores=1, max_cola=2)
+    liberar = threading.Event()
+
+    async def escenario():
+        tareas = [asyncio.ensure_future(pool.ejecutar(liberar.wait)) for _ in range(3)]
+        await asyncio.sleep(0.05)
+        assert pool.saturado
+        with pytest.raises(PoolSaturado):
+            await pool.ejecutar(liberar.wait)
+        liberar.set()
+        await asyncio.gather(*tareas)
+
+    try:
+        asyncio.run(escenario())
+        assert pool.metricas["rechazadas"] == 1
+        assert not pool.saturado
+    finally:
+        pool.shutdown()
+
+
+def test_la_admision_responde_503_con_un_pool_del_chat_saturado():
+    ocupadas = pool_red.max_cola + pool_red.trabajadores
+    pool_red._pendientes += ocupadas
+    try:
+        with pytest.raises(HTTPException) as error:
+            agent.comprobar_capacidad()
+        assert error.value.status_code == 503
+        assert error.value.headers["Retry-After"] == "1"
+    finally:
+        pool_red._pendientes -= ocupadas
+
+
+def test_ingesta_saturada_no_rechaza_el_chat():
+    assert pool_ingesta not in POOLS_ADMISION
+    ocupadas = pool_ingesta.max_cola + pool_ingesta.trabajadores
+    pool_ingesta._pendientes += ocupadas
+    try:
+        assert pool_ingesta.saturado
+        assert pool_saturado() is None
+    finally:
+        pool_ingesta._pendientes -= ocupadas
+
+
+def test_la_admision_responde_429_con_el_agente_al_limite(monkeypatch):
+    monkeypatch.setattr(agent, "peticiones_en_curso", agent.AGENTE_MAX_CONCURRENCIA)
+    with pytest.raises(HTTPException) as error:
+        agent.comprobar_capacidad()
+    assert error.value.status_code == 429
@@ -0,0 +1,43 @@
+import concurrent.futures
+
+import pytest
+
+from app.core.inferencia import PlanificadorLotes
+
+
+def test_agrupa_las_entradas_y_respeta_el_orden():
+    planificador = PlanificadorLotes(lambda textos: [t.upper() for t in textos], max_espera_ms=20)
+    futuros = [planificador.enviar(f"texto {i}") for i in range(10)]
+    muchos = planificador.enviar_muchos(["a", "b"])
+
+    assert [f.result(timeout=2) for f in futuros] == [f"TEXTO {i}" for i in range(10)]
+    assert muchos.result(timeout=2) == ["A", "B"]
+    assert planificador.estadisticas()["lotes"] < 11
+
+
+def test_falla_el_lote_si_el_modelo_devuelve_otro_numero_de_salidas():
+    planificador = PlanificadorLotes(lambda textos: textos[:-1], max_espera_ms=1)
+    with pytest.raises(ValueError):
+        planificador.enviar_muchos(["a", "b"]).result(timeout=2)
+
+
+def test_el_despachador_sobrevive_a_un_error_al_enviar_al_pool():
+    planificador = PlanificadorLotes(lambda textos: textos, max_espera_ms=1)
+    assert planificador.enviar("a").result(timeout=2) == "a"
+
+    planificador._pool.shutdown()
+    with pytest.raises(RuntimeError):
+        planificador.enviar("b").result(timeout=2)
+
+    planificador._pool = concurrent.futures.ThreadPoolExecutor(1)
+    assert planificador.enviar("c").result(timeout=2) == "c"
+
+
+def test_los_futuros_cancelados_no_rompen_el_lote():
+    planificador = PlanificadorLotes(lambda textos: textos, max_espera_ms=50)
+    cancelado = planificador.enviar_muchos(["a"])
+    vivo = planificador.enviar_muchos(["b"])
+    assert cancelado.cancel()
+
+    assert vivo.result(timeout=2) == ["b"]
+    assert planificador.estadisticas()["lotes"] == 1
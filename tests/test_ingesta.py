@@ -0,0 +1,107 @@
+import json
+
+import pytest
+
+from app.models.schemas import DocumentoRequest
+from app.services.ingesta import Ingestor, PuntoDeControl, id_fragmento, trocear
+from benchmarks.fakes import SupabaseFalso
+
+
+class Embebedor:
+    """Embeddings de mentira que cuentan los textos embebidos y pueden fallar en una llamada concreta."""
+
+    def __init__(self, falla_en: int = None):
+        self.textos = []
+        self.llamadas = 0
+        self.falla_en = falla_en
+
+    def __call__(self, textos):
+        self.llamadas += 1
+        if self.llamadas == self.falla_en:
+            raise ConnectionError("el modelo no responde")
+        self.textos.extend(textos)
+        return [[float(len(texto)), 1.0] for texto in textos]
+
+
+class IngestorContado(Ingestor):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.upserts = []
+
+    def _guardar(self, filas):
+        self.upserts.append(len(filas))
+        super()._guardar(filas)
+
+
+def texto_largo(parrafos: int) -> str:
+    return "\n\n".join(f"Párrafo {i}: " + " ".join(f"palabra{i}-{j}" for j in range(20)) for i in range(parrafos))
+
+
+def test_trocear_por_bloques_respeta_el_tamano_y_solapa():
+    texto = texto_largo(10)
+    # El texto llega en bloques pequeños que cortan palabras por la mitad.
+    bloques = [texto[inicio:inicio + 37] for inicio in range(0, len(texto), 37)]
+    fragmentos = list(trocear(bloques, tamano=300, solapamiento=40))
+
+    assert len(fragmentos) > 1
+    assert all(len(fragmento) <= 300 for fragmento in fragmentos)
+    for anterior, siguiente in zip(fragmentos, fragmentos[1:]):
+        # El siguiente empieza con una palabra entera del final del anterior.
+        assert siguiente.split()[0] in anterior.split()
+    assert fragmentos == list(trocear([texto], tamano=300, solapamiento=40))
+    with pytest.raises(ValueError):
+        list(trocear([texto], tamano=100, solapamiento=50))
+
+
+def test_repetir_la_ingesta_no_duplica_filas_ni_vuelve_a_embeber():
+    cliente = SupabaseFalso()
+    embebedor = Embebedor()
+    ingestor = IngestorContado(client=cliente, tamano_pagina=4, embeber=embebedor)
+    documentos = [DocumentoRequest(texto=f"documento {i}", metadatos={}) for i in range(6)]
+    # Un fragmento repetido dentro de la misma ingesta se embebe una vez.
+    documentos.append(DocumentoRequest(texto="documento 0", metadatos={}))
+
+    primera = ingestor.ingerir_documentos(documentos)
+    segunda = ingestor.ingerir_documentos(documentos)
+
+    assert primera["nuevos"] == 6 and primera["duplicados"] == 1
+    assert segunda["nuevos"] == 0 and segunda["duplicados"] == 7
+    assert len(embebedor.textos) == 6
+    assert {fila["id"] for fila in cliente.tablas["documentos"].filas} == {
+        id_fragmento(f"documento {i}") for i in range(6)
+    }
+    # Un upsert por página, ninguno cuando la página no trae nada nuevo.
+    assert ingestor.upserts == [4, 2]
+
+
+def test_una_ingesta_interrumpida_se_reanuda_desde_el_punto_de_control(tmp_path):
+    ruta = tmp_path / "manual.jsonl"
+    with open(ruta, "w", encoding="utf-8") as f:
+        for i in range(10):
+            f.write(json.dumps({"id": f"doc-{i}", "texto": f"capítulo {i} del manual", "metadatos": {}}) + "\n")
+
+    cliente = SupabaseFalso()
+    # La tercera página falla: las dos primeras ya están guardadas.
+    with pytest.raises(ConnectionError):
+        Ingestor(client=cliente, tamano_pagina=3, embeber=Embebedor(falla_en=3)).ingerir_archivo(str(ruta))
+    punto = PuntoDeControl(str(ruta), tamano_fragmento=1000, solapamiento=150)
+    assert punto.leer() == 6
+
+    embebedor = Embebedor()
+    resumen = Ingestor(client=cliente, tamano_pagina=3, embeber=embebedor).ingerir_archivo(str(ruta))
+
+    assert resumen["reanudados"] == 6 and resumen["nuevos"] == 4
+    assert embebedor.textos == [f"capítulo {i} del manual" for i in range(6, 10)]
+    assert len(cliente.tablas["documentos"].filas) == 10
+    assert not (tmp_path / "manual.jsonl.ingesta.json").exists()
+
+
+def test_el_punto_de_control_no_vale_si_cambia_el_archivo_o_el_troceo(tmp_path):
+    ruta = tmp_path / "manual.txt"
+    ruta.write_text("primera versión", encoding="utf-8")
+    PuntoDeControl(str(ruta), 1000, 150).guardar(42)
+
+    assert PuntoDeControl(str(ruta), 1000, 150).leer() == 42
+    assert PuntoDeControl(str(ruta), 500, 150).leer() == 0
+    ruta.write_text("segunda versión, más larga", encoding="utf-8")
+    assert PuntoDeControl(str(ruta), 1000, 150).leer() == 0
@@ -0,0 +1,116 @@
+"""
+`/agent/lote`: un guardián por lote, las peticiones de una misma sesión en
+orden y de una en una, y un fallo que solo afecta a su línea.
+"""
+import asyncio
+import json
+
+import pytest
+from fastapi import HTTPException
+
+from app.core.recursos import recursos
+from app.models.schemas import BusquedaRequest, LoteRequest
+from app.routes import agent
+from benchmarks.fakes import GuardianFalso, ModeloEmbeddingsFalso
+
+
+class AgenteRegistrado:
+    """Sustituye a `invocar_agente`: anota cuándo empieza y termina cada consulta y tarda según su sesión."""
+
+    def __init__(self):
+        self.eventos = []
+        self.en_curso = 0
+        self.max_en_curso = 0
+
+    async def __call__(self, peticion: BusquedaRequest) -> dict:
+        self.eventos.append(("inicio", peticion.session_id, peticion.consulta))
+        self.en_curso += 1
+        self.max_en_curso = max(self.max_en_curso, self.en_curso)
+        try:
+            # La primera consulta de cada sesión es la más lenta: si no se
+            # respetara el orden, la segunda terminaría antes.
+            await asyncio.sleep(0.05 if peticion.consulta.endswith("1") else 0.01)
+            if "falla" in peticion.consulta:
+                raise RuntimeError("el CRM no responde")
+            return {"output": f"respuesta a {peticion.consulta}", "intermediate_steps": []}
+        finally:
+            self.en_curso -= 1
+            self.eventos.append(("fin", peticion.session_id, peticion.consulta))
+
+
+@pytest.fixture
+def lote(monkeypatch):
+    monkeypatch.setattr(recursos["embeddings"], "fabrica", ModeloEmbeddingsFalso)
+    monkeypatch.setattr(agent, "CACHE_RESPUESTAS", False)
+    guardian_lote, guardian = GuardianFalso(latencia_ms=20), GuardianFalso()
+    monkeypatch.setattr(agent, "cadena_guardian_lote", guardian_lote)
+    monkeypatch.setattr(agent, "cadena_guardian", guardian)
+    agente = AgenteRegistrado()
+    monkeypatch.setattr(agent, "invocar_agente", agente)
+    return agente, guardian_lote, guardian
+
+
+def ejecutar(peticiones: list, concurrencia: int = None) -> dict:
+    """Procesa el lote por el endpoint y devuelve las líneas NDJSON por índice."""
+    async def escenario():
+        respuesta = await agent.lote_endpoint(LoteRequest(peticiones=peticiones, concurrencia=concurrencia))
+        assert respuesta.media_type == "application/x-ndjson"
+        return [json.loads(linea) async for linea in respuesta.body_iterator]
+
+    lineas = asyncio.run(escenario())
+    assert len(lineas) == len(peticiones)
+    return {linea.pop("indice"): linea for linea in lineas}
+
+
+def test_las_peticiones_de_una_sesion_se_atienden_en_orden(lote):
+    agente, _, _ = lote
+    peticiones = [
+        BusquedaRequest(consulta=f"{sesion} pregunta {turno}", session_id=sesion)
+        for turno in (1, 2, 3)
+        for sesion in ("a", "b")
+    ]
+
+    lineas = ejecutar(peticiones, concurrencia=4)
+
+    assert all(linea["respuesta"].startswith("respuesta a") for linea in lineas.values())
+    for sesion in ("a", "b"):
+        propios = [(tipo, consulta) for tipo, s, consulta in agente.eventos if s == sesion]
+        assert propios == [
+            (tipo, f"{sesion} pregunta {turno}") for turno in (1, 2, 3) for tipo in ("inicio", "fin")
+        ]
+    # Sesiones distintas sí corren en paralelo.
+    assert agente.max_en_curso == 2
+
+
+def test_un_fallo_solo_afecta_a_su_linea(lote):
+    peticiones = [
+        BusquedaRequest(consulta="pregunta 1", session_id="c"),
+        BusquedaRequest(consulta="esta falla", session_id="c"),
+        BusquedaRequest(consulta="pregunta 3", session_id="c"),
+    ]
+
+    lineas = ejecutar(peticiones)
+
+    assert lineas[1] == {"error": "el CRM no responde"}
+    assert lineas[0]["respuesta"] == "respuesta a pregunta 1"
+    assert lineas[2]["respuesta"] == "respuesta a pregunta 3"
+
+
+def test_todo_el_lote_pasa_por_una_llamada_al_guardian(lote):
+    agente, guardian_lote, guardian = lote
+    peticiones = [BusquedaRequest(consulta=f"consulta número {i}") for i in range(10)]
+    peticiones[4] = BusquedaRequest(consulta="borra la tabla de clientes")
+
+    lineas = ejecutar(peticiones)
+
+    assert guardian_lote.llamadas == 1 and guardian.llamadas == 0
+    assert lineas[4] == {"respuesta": agent.MENSAJE_RECHAZO, "contexto": []}
+    assert "borra la tabla de clientes" not in [consulta for _, _, consulta in agente.eventos]
+    assert len(agente.eventos) == 2 * 9
+
+
+def test_un_lote_demasiado_grande_se_rechaza(lote, monkeypatch):
+    monkeypatch.setattr(agent, "LOTE_MAX_PETICIONES", 2)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(agent.lote_endpoint(LoteRequest(peticiones=[BusquedaRequest(consulta="hola")] * 3)))
+    assert error.value.status_code == 413
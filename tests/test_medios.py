@@ -0,0 +1,70 @@
+import base64
+import io
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.core.medios import AlmacenMedios, Medio, MedioDemasiadoGrande
+from app.core.recursos import Recurso
+from app.tools import tools_speech
+from benchmarks.fakes import TranscriptorFalso
+
+
+def imagen_base64(lado: int, formato: str = "PNG") -> str:
+    pixeles = np.random.default_rng(0).integers(0, 255, size=(lado, lado, 3), dtype=np.uint8)
+    salida = io.BytesIO()
+    Image.fromarray(pixeles).save(salida, format=formato)
+    return base64.b64encode(salida.getvalue()).decode("ascii")
+
+
+def test_una_imagen_pequena_se_guarda_tal_cual_sin_decodificar():
+    almacen = AlmacenMedios()
+    datos = imagen_base64(16)
+    medio = almacen.obtener(almacen.guardar_imagen(datos))
+    assert medio.mime == "image/png"
+    assert medio._datos is None
+    assert medio.base64 is datos
+
+
+def test_una_imagen_grande_se_reduce(monkeypatch):
+    monkeypatch.setattr("app.core.medios.MEDIOS_IMAGEN_UMBRAL_BYTES", 1024)
+    almacen = AlmacenMedios()
+    medio = almacen.obtener(almacen.guardar_imagen(imagen_base64(2000)))
+    assert medio.mime == "image/jpeg"
+    with Image.open(io.BytesIO(medio.datos)) as imagen:
+        assert max(imagen.size) <= 1568
+    assert almacen.metricas["imagenes_reducidas"] == 1
+
+
+def test_limites_de_tamano_caducidad_y_liberacion():
+    almacen = AlmacenMedios(ttl=0.05, max_bytes=100, max_bytes_archivo=60)
+    with pytest.raises(MedioDemasiadoGrande):
+        almacen.guardar(Medio("audio/wav", datos=b"x" * 61))
+
+    primero = almacen.guardar(Medio("audio/wav", datos=b"x" * 60))
+    segundo = almacen.guardar(Medio("audio/wav", datos=b"y" * 60))
+    # Por encima de `max_bytes` se expulsa el más antiguo.
+    assert almacen.obtener(primero) is None
+    assert almacen.obtener(segundo).datos == b"y" * 60
+
+    almacen.liberar(segundo)
+    assert almacen.estadisticas()["bytes"] == 0
+
+    tercero = almacen.guardar(Medio("audio/wav", datos=b"z"))
+    time.sleep(0.06)
+    assert almacen.obtener(tercero) is None
+
+
+def test_los_audios_pequenos_se_transcriben_en_linea(monkeypatch):
+    transcriptor = TranscriptorFalso("hola mundo")
+    monkeypatch.setattr(tools_speech, "modelo_transcripcion", Recurso("transcripcion", lambda: transcriptor))
+    monkeypatch.setattr(tools_speech.genai, "upload_file", lambda **_: pytest.fail("no debía subir el audio"))
+    almacen = AlmacenMedios()
+    monkeypatch.setattr(tools_speech, "almacen_medios", almacen)
+    id_audio = almacen.guardar_audio(base64.b64encode(b"RIFF\x00\x00\x00\x00WAVEfmt " + b"\x00" * 64).decode())
+
+    assert almacen.obtener(id_audio).mime == "audio/wav"
+    assert tools_speech.transcribe_audio_with_gemini.invoke({"audio_id": id_audio}) == "hola mundo"
+    assert "caducado" in tools_speech.transcribe_audio_with_gemini.invoke({"audio_id": "medio_inexistente"})
@@ -0,0 +1,45 @@
+from langchain_core.messages import AIMessage, HumanMessage, messages_to_dict
+
+from app.core.memory import TABLA_HISTORIAL_LEGADO, TABLA_MENSAJES, SupabaseChatMessageHistory, migrar_historial_chat
+from benchmarks.fakes import SupabaseFalso
+
+
+def test_cada_turno_es_un_solo_insert_y_la_lectura_trae_la_cola():
+    cliente = SupabaseFalso()
+    historial = SupabaseChatMessageHistory("s", ventana=4, client=cliente)
+    for i in range(5):
+        peticiones = cliente.peticiones
+        historial.add_messages([HumanMessage(f"pregunta {i}"), AIMessage(f"respuesta {i}")])
+        assert cliente.peticiones == peticiones + 1
+
+    assert len(cliente.tablas[TABLA_MENSAJES].filas) == 10
+    assert [mensaje.content for mensaje in historial.messages] == ["pregunta 3", "respuesta 3", "pregunta 4", "respuesta 4"]
+    # Cada mensaje lleva un id estable dentro del JSON.
+    assert all(mensaje.id for mensaje in historial.messages)
+
+
+def test_las_sesiones_no_se_mezclan_y_clear_solo_borra_la_suya():
+    cliente = SupabaseFalso()
+    ana = SupabaseChatMessageHistory("ana", client=cliente)
+    luis = SupabaseChatMessageHistory("luis", client=cliente)
+    ana.add_messages([HumanMessage("hola, soy Ana")])
+    luis.add_messages([HumanMessage("hola, soy Luis")])
+
+    ana.clear()
+    assert ana.messages == []
+    assert [mensaje.content for mensaje in luis.messages] == ["hola, soy Luis"]
+
+
+def test_la_migracion_copia_los_blobs_una_sola_vez():
+    cliente = SupabaseFalso()
+    for i in range(3):
+        historial = messages_to_dict([HumanMessage(f"pregunta {i}"), AIMessage(f"respuesta {i}")])
+        cliente.table(TABLA_HISTORIAL_LEGADO).upsert({"session_id": f"s{i}", "historial": historial}).execute()
+
+    assert migrar_historial_chat(client=cliente, tamano_pagina=2) == 3
+    assert migrar_historial_chat(client=cliente, tamano_pagina=2) == 0
+    assert len(cliente.tablas[TABLA_MENSAJES].filas) == 6
+    mensajes = SupabaseChatMessageHistory("s1", client=cliente).messages
+    assert [mensaje.content for mensaje in mensajes] == ["pregunta 1", "respuesta 1"]
+    # Los mensajes migrados no tenían id: se usa el de su fila.
+    assert all(mensaje.id.startswith("fila-") for mensaje in mensajes)
@@ -0,0 +1,105 @@
+import json
+import os
+
+import numpy as np
+
+from app.core.indice_lexico import IndiceLexico
+from app.core.indice_vectorial import ARCHIVO_MANIFIESTO, IndiceVectorial, archivos_indice
+from app.models.schemas import DocumentoRequest
+from app.services.ingesta import Ingestor
+from app.services.recuperadores import RecuperadorLexico, RecuperadorLocal, RecuperadorSupabase
+from benchmarks.fakes import SupabaseFalso
+
+
+def documentos(n: int, prefijo: str = "doc") -> list:
+    return [{"id": f"{prefijo}-{i}", "texto": f"{prefijo} número {i}", "metadatos": {}} for i in range(n)]
+
+
+def vectores(n: int, semilla: int = 0) -> np.ndarray:
+    return np.random.default_rng(semilla).normal(size=(n, 8)).astype(np.float32)
+
+
+def test_sin_indice_la_busqueda_devuelve_vacio(tmp_path):
+    recuperador = RecuperadorLocal(str(tmp_path / "no_existe"))
+    assert recuperador.version is None
+    assert recuperador.buscar([1.0] * 8, 3) == []
+    assert RecuperadorLexico(str(tmp_path / "no_existe")).buscar("doc", 3) == []
+
+
+def test_la_version_se_cachea_y_cambia_al_reconstruir(tmp_path):
+    ruta = str(tmp_path)
+    IndiceVectorial.construir(ruta, vectores(5), documentos(5))
+    recuperador = RecuperadorLocal(ruta)
+    recuperador._marca.ttl = 3600
+    datos = vectores(5)
+    assert recuperador.buscar(datos[2], 1)[0]["id"] == "doc-2"
+    version = recuperador.version
+
+    IndiceVectorial.construir(ruta, vectores(7, semilla=1), documentos(7, "nuevo"))
+    assert recuperador.version == version
+    recuperador._marca._caduca = 0
+    assert recuperador.version != version
+    assert recuperador.buscar(vectores(7, semilla=1)[3], 1)[0]["id"] == "nuevo-3"
+
+
+def test_reconstruir_no_pisa_los_archivos_de_la_generacion_vigente(tmp_path):
+    ruta = str(tmp_path)
+    IndiceVectorial.construir(ruta, vectores(5), documentos(5), listas_ivf=2)
+    primera = archivos_indice(ruta)
+    IndiceVectorial.construir(ruta, vectores(6), documentos(6, "segunda"))
+    segunda = archivos_indice(ruta)
+    IndiceVectorial.construir(ruta, vectores(4), documentos(4, "tercera"))
+
+    assert set(primera.values()).isdisjoint(segunda.values())
+    # Se conserva la generación anterior para los lectores que la estén abriendo y se borran las demás.
+    assert os.path.exists(segunda["embeddings"]) and os.path.exists(segunda["documentos"])
+    assert not os.path.exists(primera["embeddings"]) and not os.path.exists(primera["ivf"])
+    with open(os.path.join(ruta, ARCHIVO_MANIFIESTO)) as f:
+        assert json.load(f)["documentos"] == 4
+    assert len(IndiceVectorial(ruta)) == 4
+
+
+def test_el_indice_lexico_lee_los_documentos_de_la_generacion_vigente(tmp_path):
+    ruta = str(tmp_path)
+    docs = documentos(3)
+    IndiceVectorial.construir(ruta, vectores(3), docs)
+    IndiceLexico.construir(ruta, docs)
+    assert IndiceLexico(ruta).buscar("doc número 1", 1)[0]["id"] == "doc-1"
+
+
+def test_el_indice_lexico_sigue_con_su_generacion_hasta_reconstruirse(tmp_path):
+    ruta = str(tmp_path)
+    docs = documentos(3)
+    IndiceVectorial.construir(ruta, vectores(3), docs)
+    IndiceLexico.construir(ruta, docs)
+
+    # Entre la publicación del vectorial y la del léxico, el léxico sigue
+    # leyendo los documentos con los que se construyó.
+    nuevos = documentos(5)
+    IndiceVectorial.construir(ruta, vectores(5), nuevos)
+    lexico = IndiceLexico(ruta)
+    assert len(lexico) == 3
+    assert lexico.buscar("doc número 1", 1)[0]["id"] == "doc-1"
+
+    IndiceLexico.construir(ruta, nuevos)
+    assert len(IndiceLexico(ruta)) == 5
+
+
+def test_la_version_de_supabase_cambia_cuando_otro_proceso_ingiere():
+    cliente = SupabaseFalso()
+    recuperador = RecuperadorSupabase(client=cliente)
+    recuperador._marca.ttl = 3600
+    assert recuperador.version is None
+
+    # Otro proceso (la CLI) con su propio Ingestor sobre la misma base de datos.
+    ingestor = Ingestor(client=cliente, embeber=lambda textos: vectores(len(textos)).tolist())
+    ingestor.ingerir_documentos([DocumentoRequest(texto="política de devoluciones", metadatos={})])
+    assert recuperador.version is None
+    recuperador._marca._caduca = 0
+    version = recuperador.version
+    assert version is not None
+
+    # Repetir la ingesta no añade filas ni cambia la versión.
+    ingestor.ingerir_documentos([DocumentoRequest(texto="política de devoluciones", metadatos={})])
+    recuperador._marca._caduca = 0
+    assert recuperador.version == version
@@ -0,0 +1,101 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.core.recursos import Perezoso, Recurso, RegistroRecursos
+from app.routes import salud
+
+
+class Fabrica:
+    """Fábrica lenta que cuenta cuántas veces se llama y puede fallar las primeras."""
+
+    def __init__(self, fallos: int = 0, segundos: float = 0.0):
+        self.llamadas = 0
+        self.fallos = fallos
+        self.segundos = segundos
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self.llamadas += 1
+            llamada = self.llamadas
+        time.sleep(self.segundos)
+        if llamada <= self.fallos:
+            raise ConnectionError("base de datos caída")
+        return {"llamada": llamada}
+
+
+def test_el_recurso_se_construye_una_vez_aunque_lo_pidan_varios_hilos():
+    fabrica = Fabrica(segundos=0.05)
+    recurso = Recurso("modelo", fabrica)
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        valores = list(pool.map(lambda _: recurso.obtener(), range(16)))
+
+    assert fabrica.llamadas == 1
+    assert all(valor is valores[0] for valor in valores)
+    assert recurso.estado()["segundos_carga"] >= 0.05
+
+
+def test_un_fallo_al_construir_se_reintenta_en_la_siguiente_peticion():
+    recurso = Recurso("supabase", Fabrica(fallos=1))
+
+    with pytest.raises(ConnectionError):
+        recurso.obtener()
+    assert not recurso.cargado
+    assert "ConnectionError" in recurso.estado()["error"]
+
+    assert recurso.obtener() == {"llamada": 2}
+    assert recurso.estado()["error"] is None
+
+
+def test_el_perezoso_no_construye_nada_hasta_el_primer_acceso():
+    fabrica = Fabrica()
+    perezoso = Perezoso(Recurso("cliente", fabrica))
+
+    assert fabrica.llamadas == 0
+    assert "sin cargar" in repr(perezoso)
+    assert perezoso.get("llamada") == 1
+    assert perezoso.get("llamada") == 1
+    assert fabrica.llamadas == 1
+    assert "cargado" in repr(perezoso)
+
+
+def test_calentar_carga_en_paralelo_y_no_falla_por_un_recurso_caido():
+    registro = RegistroRecursos()
+    lentas = [Fabrica(segundos=0.2) for _ in range(3)]
+    for i, fabrica in enumerate(lentas):
+        registro.registrar(f"modelo-{i}", fabrica)
+    registro.registrar("crm", Fabrica(fallos=1), critico=False)
+
+    async def escenario():
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            inicio = time.perf_counter()
+            await registro.calentar(pool)
+            return time.perf_counter() - inicio
+
+    assert asyncio.run(escenario()) < 0.5
+    assert all(fabrica.llamadas == 1 for fabrica in lentas)
+    assert registro.listo
+    assert registro.estado()["crm"]["error"] is not None
+
+
+def test_la_sonda_de_readiness_espera_a_los_recursos_criticos(monkeypatch):
+    registro = RegistroRecursos()
+    critico = registro.registrar("embeddings", Fabrica())
+    registro.registrar("crm", Fabrica(fallos=1), critico=False)
+    monkeypatch.setattr(salud, "recursos", registro)
+
+    antes = asyncio.run(salud.readiness())
+    assert antes.status_code == 503
+    assert asyncio.run(salud.liveness()) == {"estado": "vivo"}
+
+    critico.obtener()
+    despues = asyncio.run(salud.readiness())
+    cuerpo = json.loads(despues.body)
+    assert despues.status_code == 200
+    assert cuerpo["listo"] and not cuerpo["recursos"]["crm"]["cargado"]
@@ -0,0 +1,48 @@
+import asyncio
+from concurrent.futures import Future
+
+from app.services.busqueda import fusionar_rrf
+from app.services.rerank import metricas_rerank, reordenar
+
+
+class PlanificadorProhibido:
+    def enviar_muchos(self, pares):
+        raise AssertionError(f"No debía reordenar {len(pares)} pares")
+
+
+def documento(i: int, **puntajes) -> dict:
+    return {"id": f"doc-{i}", "texto": f"texto {i}", **puntajes}
+
+
+def test_la_busqueda_hibrida_omite_el_rerank_si_las_listas_coinciden_con_margen():
+    vectoriales = [documento(i, similitud=s) for i, s in enumerate([0.9, 0.88, 0.86, 0.6, 0.58, 0.55])]
+    lexicos = [documento(i, bm25=b) for i, b in zip([1, 0, 2, 5, 4, 3], [12.0, 11.5, 11.0, 4.0, 3.5, 3.0])]
+    candidatos = fusionar_rrf([vectoriales, lexicos])
+    # Con RRF el tercero y el cuarto apenas se separan: solo el margen previo a la fusión lo decide.
+    assert candidatos[2]["puntaje"] - candidatos[3]["puntaje"] < 0.1
+
+    omitidas = metricas_rerank["omitidas"]
+    finales = asyncio.run(reordenar("consulta", candidatos, k=3, umbral=0.1, planificador=PlanificadorProhibido()))
+
+    assert {f["id"] for f in finales} == {"doc-0", "doc-1", "doc-2"}
+    assert metricas_rerank["omitidas"] == omitidas + 1
+
+
+def test_la_busqueda_hibrida_reordena_si_las_listas_no_coinciden():
+    vectoriales = [documento(i, similitud=s) for i, s in enumerate([0.9, 0.88, 0.86, 0.6])]
+    lexicos = [documento(i, bm25=b) for i, b in zip([3, 0, 1, 2], [12.0, 11.5, 11.0, 4.0])]
+    candidatos = fusionar_rrf([vectoriales, lexicos])
+    puntuados = []
+
+    class Planificador:
+        def enviar_muchos(self, pares):
+            puntuados.extend(texto for _, texto in pares)
+            resultado = Future()
+            resultado.set_result([1.0 if texto == "texto 3" else 0.0 for _, texto in pares])
+            return resultado
+
+    finales = asyncio.run(reordenar("consulta", candidatos, k=3, umbral=0.1, planificador=Planificador()))
+
+    # doc-3 solo es el primero en BM25: se reordena y entra en el top-k.
+    assert "texto 3" in puntuados
+    assert "doc-3" in {f["id"] for f in finales}
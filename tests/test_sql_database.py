@@ -0,0 +1,29 @@
+from sqlalchemy import event
+
+from app.core.sql_database import SQLDatabaseAcotada, engine
+
+
+def test_comentario_final_no_rompe_el_limit():
+    db = SQLDatabaseAcotada(engine)
+    resultado = db.run("SELECT count(*) AS total FROM clientes -- todos los clientes")
+    assert not resultado.startswith("Error")
+    assert db.run("-- inicio\nSELECT nombre FROM clientes c /* fin */ -- limitado", fetch="one")
+
+
+def test_el_tamano_de_las_tablas_se_reutiliza():
+    db = SQLDatabaseAcotada(engine, coste_maximo=1e12)
+    conteos = []
+
+    def registrar(conexion, cursor, sentencia, *args):
+        if sentencia.lower().startswith("select count(*) from"):
+            conteos.append(sentencia)
+
+    event.listen(engine, "before_cursor_execute", registrar)
+    try:
+        for _ in range(3):
+            db.run("SELECT c.nombre FROM clientes c JOIN ventas v ON v.cliente_id = c.id")
+            db.run("WITH t AS (SELECT * FROM Clientes) SELECT count(*) FROM t")
+    finally:
+        event.remove(engine, "before_cursor_execute", registrar)
+
+    assert sorted(conteos) == ['SELECT count(*) FROM "clientes"', 'SELECT count(*) FROM "ventas"']
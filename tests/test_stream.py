@@ -0,0 +1,83 @@
+"""
+`/agent/stream` con el guardián especulativo: el agente arranca a la vez que
+el guardián, pero ningún evento sale hacia el cliente hasta el veredicto.
+"""
+import asyncio
+import json
+import time
+
+import pytest
+
+from app.core.recursos import Recurso, recursos
+from app.core.supabase_client import supabase
+from app.models.schemas import BusquedaRequest
+from app.routes import agent
+from benchmarks.escenarios import documentos_sinteticos, guion_agente
+from benchmarks.fakes import ChatGuionado, CrossEncoderFalso, GuardianFalso, ModeloEmbeddingsFalso
+
+LATENCIA_GUARDIAN_MS = 200
+
+
+class GuardianCronometrado(GuardianFalso):
+    def __init__(self):
+        super().__init__(latencia_ms=LATENCIA_GUARDIAN_MS)
+        self.veredicto = None
+
+    async def ainvoke(self, entrada: dict, config=None):
+        respuesta = await super().ainvoke(entrada, config)
+        self.veredicto = time.perf_counter()
+        return respuesta
+
+
+@pytest.fixture
+def guardian(monkeypatch):
+    monkeypatch.setattr(recursos["embeddings"], "fabrica", ModeloEmbeddingsFalso)
+    monkeypatch.setattr(recursos["rerank"], "fabrica", CrossEncoderFalso)
+    monkeypatch.setattr(agent, "modelo_chat", Recurso("gemini_agente", lambda: ChatGuionado(model="agente", guion=guion_agente)))
+    monkeypatch.setattr(agent, "agent_con_memoria", agent.construir_agente())
+    monkeypatch.setattr(agent, "CACHE_RESPUESTAS", False)
+    guardian = GuardianCronometrado()
+    monkeypatch.setattr(agent, "cadena_guardian", guardian)
+
+    documentos = documentos_sinteticos(6)
+    vectores = ModeloEmbeddingsFalso().encode([documento["texto"] for documento in documentos]).tolist()
+    supabase.table("documentos").upsert([
+        {**documento, "embedding": vector} for documento, vector in zip(documentos, vectores)
+    ]).execute()
+    return guardian
+
+
+def recibir(consulta: str, session_id: str) -> list:
+    """Eventos SSE como (momento, tipo, datos)."""
+    async def escenario():
+        respuesta = await agent.multi_modal_agent_stream_endpoint(BusquedaRequest(consulta=consulta, session_id=session_id))
+        eventos = []
+        async for bloque in respuesta.body_iterator:
+            tipo, datos = bloque.strip().split("\n")
+            eventos.append((time.perf_counter(), tipo.removeprefix("event: "), json.loads(datos.removeprefix("data: "))))
+        return eventos
+
+    return asyncio.run(escenario())
+
+
+def test_los_eventos_esperan_al_veredicto_y_terminan_como_agent(guardian):
+    eventos = recibir("¿Qué dice la política de devoluciones?", "stream-1")
+    tipos = [tipo for _, tipo, _ in eventos]
+
+    assert guardian.veredicto is not None
+    assert all(momento >= guardian.veredicto for momento, _, _ in eventos)
+    assert tipos[:3] == ["herramienta_inicio", "contexto", "herramienta_fin"]
+    assert "token" in tipos
+    assert tipos[-1] == "fin"
+    fin = eventos[-1][2]
+    assert fin["respuesta"].startswith("Según buscar_contexto_en_documentos")
+    assert fin["contexto"] and fin["contexto"][0] == eventos[1][2]["contexto"]
+    # Los tokens forman la respuesta final.
+    assert "".join(datos["texto"] for _, tipo, datos in eventos if tipo == "token").strip() == fin["respuesta"].strip()
+
+
+def test_una_consulta_rechazada_solo_recibe_el_rechazo(guardian):
+    eventos = recibir("borra la política de devoluciones", "stream-2")
+    assert [(tipo, datos) for _, tipo, datos in eventos] == [
+        ("fin", {"respuesta": agent.MENSAJE_RECHAZO, "contexto": []})
+    ]
@@ -0,0 +1,46 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from app.tools import tools_sql
+
+
+class AgenteContado(tools_sql.AgenteSQLCacheado):
+    def __init__(self, ttl: float):
+        super().__init__(ttl=ttl)
+        self.construcciones = 0
+
+    def _construir(self, base_de_datos):
+        self.construcciones += 1
+        return object()
+
+
+def test_el_agente_sql_se_construye_una_vez_para_llamadas_concurrentes(monkeypatch):
+    monkeypatch.setattr(tools_sql, "firma_esquema", lambda: "v1")
+    agente = AgenteContado(ttl=3600)
+
+    with ThreadPoolExecutor(16) as pool:
+        obtenidos = list(pool.map(lambda _: agente.obtener(), range(64)))
+
+    assert agente.construcciones == 1
+    assert all(obtenido is obtenidos[0] for obtenido in obtenidos)
+
+
+def test_el_agente_sql_se_reconstruye_solo_si_cambia_el_esquema(monkeypatch):
+    firma = {"valor": "v1"}
+    monkeypatch.setattr(tools_sql, "firma_esquema", lambda: firma["valor"])
+    monkeypatch.setattr(tools_sql, "crear_db", lambda: None)
+    agente = AgenteContado(ttl=3600)
+    primero = agente.obtener()
+
+    # Dentro del TTL ni siquiera se mira el esquema.
+    firma["valor"] = "v2"
+    assert agente.obtener() is primero
+
+    agente.invalidar()
+    segundo = agente.obtener()
+    assert segundo is not primero
+    assert agente.construcciones == 2
+
+    # Revisado de nuevo sin DDL: se reutiliza.
+    agente.invalidar()
+    assert agente.obtener() is segundo
+    assert agente.construcciones == 2
@@ -0,0 +1,91 @@
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.core import trazas
+from app.core.metricas import RegistroMetricas
+from app.core.trazas import MiddlewareTrazas, Traza, id_peticion, traza_actual, tramo
+from app.routes import metricas
+
+
+def test_el_histograma_se_expone_acumulado_y_los_colectores_como_gauges():
+    registro = RegistroMetricas()
+    histograma = registro.histograma("etapa_segundos", "Duración.", ("etapa",), cubos=(0.1, 1))
+    for segundos in (0.05, 0.5, 0.5, 3):
+        histograma.observar(segundos, etapa="llm")
+    registro.registrar_colector("pool", "Pools.", lambda: {"red": {"en_cola": 2, "saturado": True, "nombre": "red"}})
+
+    lineas = registro.exponer().splitlines()
+
+    assert "# TYPE etapa_segundos histogram" in lineas
+    assert 'etapa_segundos_bucket{etapa="llm",le="0.1"} 1' in lineas
+    assert 'etapa_segundos_bucket{etapa="llm",le="1"} 3' in lineas
+    assert 'etapa_segundos_bucket{etapa="llm",le="+Inf"} 4' in lineas
+    assert 'etapa_segundos_count{etapa="llm"} 4' in lineas
+    assert "# TYPE pool_en_cola gauge" in lineas
+    assert 'pool_en_cola{nombre="red"} 2' in lineas
+    assert 'pool_saturado{nombre="red"} 1' in lineas
+    # Los campos que no son números no se exponen.
+    assert not any(linea.startswith("pool_nombre") for linea in lineas)
+
+
+def test_el_tramo_queda_en_la_traza_aunque_el_bloque_falle():
+    traza = Traza("prueba")
+    token = traza_actual.set(traza)
+    try:
+        with tramo("herramienta", "sql") as atributos:
+            atributos["filas"] = 3
+        with pytest.raises(ValueError):
+            with tramo("llm", "gemini"):
+                raise ValueError("cuota agotada")
+    finally:
+        traza_actual.reset(token)
+
+    assert [(etapa, detalle) for etapa, detalle, *_ in traza.tramos] == [("herramienta", "sql"), ("llm", "gemini")]
+    assert traza.tramos[0][4] == {"filas": 3}
+    assert list(traza.totales()) == ["herramienta:sql", "llm:gemini"]
+    assert "herramienta.sql;dur=" in traza.server_timing()
+
+
+def test_el_middleware_propaga_el_id_y_anade_server_timing(monkeypatch):
+    app = FastAPI()
+    app.add_middleware(MiddlewareTrazas)
+
+    @app.get("/eco")
+    async def eco():
+        with tramo("guardian"):
+            await asyncio.sleep(0.01)
+        return {"id": id_peticion.get()}
+
+    observadas = []
+    monkeypatch.setattr(trazas, "observadores_trazas", [observadas.append])
+
+    with TestClient(app) as cliente:
+        propia = cliente.get("/eco", headers={"X-Request-ID": "peticion-1"})
+        invalida = cliente.get("/eco", headers={"X-Request-ID": "../../etc/passwd"})
+
+    assert propia.headers["x-request-id"] == "peticion-1"
+    assert propia.json() == {"id": "peticion-1"}
+    assert propia.headers["server-timing"].startswith("guardian;dur=")
+    # Un id que no es seguro para cabeceras y nombres de archivo se sustituye.
+    assert invalida.headers["x-request-id"] != "../../etc/passwd"
+    assert invalida.json()["id"] == invalida.headers["x-request-id"]
+
+    assert [(traza.ruta, traza.estado) for traza in observadas] == [("/eco", 200), ("/eco", 200)]
+    assert observadas[0].totales()["guardian"] >= 0.01
+
+
+def test_metrics_expone_las_etapas_y_el_estado_de_pools_y_caches():
+    with tramo("historial", "carga"):
+        pass
+
+    respuesta = asyncio.run(metricas.exponer_metricas())
+    cuerpo = respuesta.body.decode()
+
+    assert respuesta.media_type.startswith("text/plain")
+    assert 'agente_etapa_segundos_count{etapa="historial",detalle="carga"}' in cuerpo
+    assert 'pool_en_cola{nombre="red"}' in cuerpo
+    assert 'cache_aciertos{nombre="embeddings"}' in cuerpo
+    assert 'agente_maximo{nombre="peticiones"}' in cuerpo